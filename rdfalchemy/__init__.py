@@ -7,12 +7,18 @@ from rdfalchemy.descriptors import (
     rdfMultiple,
     rdfList,
     rdfContainer,
+    rdfInverse,
+    rdfCount,
+    rdfSum,
+    rdfMin,
+    rdfMax,
     owlTransitive
 )
 from rdfalchemy.engine import (
     create_engine,
     engine_from_config
 )
+from rdfalchemy.session import Session
 
 __version__ = "0.3.akm"
 
@@ -25,12 +31,18 @@ __exports__ = [
     owlTransitive,
     RDF,
     rdfContainer,
+    rdfCount,
+    rdfInverse,
     rdfList,
+    rdfMax,
+    rdfMin,
     rdfMultiple,
     RDFS,
     rdfsClass,
     rdfSingle,
     rdfsSubject,
     rdfSubject,
+    rdfSum,
+    Session,
     URIRef
 ]
@@ -0,0 +1,195 @@
+# encoding: utf-8
+"""
+cache.py
+
+Where and for how long descriptors keep the values they read.
+
+Each descriptor takes a `cache` option:
+
+.. code-block:: python
+
+    class Quote(rdfSubject):
+        name = rdfSingle(OV.name)                        # kept until dropped
+        price = rdfSingle(OV.price, cache=30)            # 30 seconds
+        trades = rdfMultiple(OV.trade, cache='none')     # always from the store
+        history = rdfMultiple(OV.close, cache=LRUCache(1000))
+
+    Quote.price.cache_info()    # CacheInfo(hits=.., misses=.., policy=..)
+
+A policy that writes through keeps a value just set, otherwise the next
+read goes back to the store (where a SPARQL endpoint may have changed the
+value: datatypes, inference ...).  The version checks of an
+:class:`~rdfalchemy.events.ObservableGraph` apply whatever the policy.
+"""
+from collections import OrderedDict, namedtuple
+import logging
+import time
+import weakref
+
+__all__ = ["CacheInfo", "CachePolicy", "InstanceCache", "NoCache",
+           "TTLCache", "LRUCache", "cache_policy"]
+
+log = logging.getLogger(__name__)
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses policy')
+
+
+class CachePolicy:
+    """
+    Keeps nothing.  Subclasses store (value, version) pairs for a
+    descriptor on an instance.
+
+    :param write_through: keep the value just written by the descriptor,
+        otherwise a write drops the cached value
+    """
+
+    def __init__(self, write_through=True):
+        self.write_through = write_through
+
+    def __repr__(self):
+        return f"<{type(self).__name__}>"
+
+    def get(self, descriptor, obj):
+        """
+        (value, version) cached for `descriptor` on `obj` or `None`
+        """
+        return None
+
+    def put(self, descriptor, obj, value, version):
+        pass
+
+    def discard(self, descriptor, obj):
+        pass
+
+
+class NoCache(CachePolicy):
+    """
+    Every read goes to the store
+    """
+
+    def __init__(self):
+        super().__init__(write_through=False)
+
+
+class InstanceCache(CachePolicy):
+    """
+    The default, values live in the instance ``__dict__`` until they are
+    dropped or their version moves on
+
+    The value is ``obj.__dict__[descriptor.name]``, the version in
+    ``obj.__dict__['_cache_versions']``.
+    """
+
+    def get(self, descriptor, obj):
+        if descriptor.name not in obj.__dict__:
+            return None
+        return obj.__dict__[descriptor.name], obj.__dict__.get('_cache_versions', {}).get(descriptor.name)
+
+    def put(self, descriptor, obj, value, version):
+        obj.__dict__[descriptor.name] = value
+        if version is not None:
+            obj.__dict__.setdefault('_cache_versions', {})[descriptor.name] = version
+
+    def discard(self, descriptor, obj):
+        obj.__dict__.pop(descriptor.name, None)
+
+
+class TTLCache(InstanceCache):
+    """
+    Values expire `seconds` after they are read
+
+    :param clock: returns the time in seconds, :func:`time.monotonic`
+    """
+
+    def __init__(self, seconds, write_through=True, clock=time.monotonic):
+        super().__init__(write_through)
+        self.seconds = seconds
+        self.clock = clock
+
+    def __repr__(self):
+        return f"<TTLCache {self.seconds}s>"
+
+    def get(self, descriptor, obj):
+        expires = obj.__dict__.get('_cache_expires', {}).get(descriptor.name)
+        if expires is not None and self.clock() >= expires:
+            log.debug("expired cache %s for %s", descriptor.name, obj.n3())
+            self.discard(descriptor, obj)
+            return None
+        return super().get(descriptor, obj)
+
+    def put(self, descriptor, obj, value, version):
+        super().put(descriptor, obj, value, version)
+        obj.__dict__.setdefault('_cache_expires', {})[descriptor.name] = self.clock() + self.seconds
+
+    def discard(self, descriptor, obj):
+        super().discard(descriptor, obj)
+        obj.__dict__.get('_cache_expires', {}).pop(descriptor.name, None)
+
+
+class LRUCache(InstanceCache):
+    """
+    At most `maxsize` values, the least recently used are dropped first
+
+    One LRUCache given to the descriptors of a class bounds them together.
+    The instances are held by weak references only.
+    """
+
+    def __init__(self, maxsize, write_through=True):
+        super().__init__(write_through)
+        self.maxsize = maxsize
+        # (id(obj), name) -> weakref to obj, oldest first
+        self._order = OrderedDict()
+
+    def __repr__(self):
+        return f"<LRUCache {len(self._order)}/{self.maxsize}>"
+
+    def __len__(self):
+        return len(self._order)
+
+    def get(self, descriptor, obj):
+        entry = super().get(descriptor, obj)
+        if entry is not None:
+            key = (id(obj), descriptor.name)
+            if key in self._order:
+                self._order.move_to_end(key)
+        return entry
+
+    def put(self, descriptor, obj, value, version):
+        super().put(descriptor, obj, value, version)
+        key = (id(obj), descriptor.name)
+        order = self._order
+
+        def forget(ref, key=key):
+            if order.get(key) is ref:
+                del order[key]
+        order.pop(key, None)
+        order[key] = weakref.ref(obj, forget)
+        while len(order) > self.maxsize:
+            (_id, name), ref = order.popitem(last=False)
+            old = ref()
+            if old is not None:
+                old.__dict__.pop(name, None)
+
+    def discard(self, descriptor, obj):
+        super().discard(descriptor, obj)
+        self._order.pop((id(obj), descriptor.name), None)
+
+
+def cache_policy(cache):
+    """
+    The policy for the `cache` option of a descriptor
+
+    * `None` or ``'write-through'``: an :class:`InstanceCache`
+    * ``'none'`` or `False`: a :class:`NoCache`
+    * a number: a :class:`TTLCache` of that many seconds
+    * a :class:`CachePolicy`: itself
+    """
+    if isinstance(cache, CachePolicy):
+        return cache
+    if cache is None or cache == 'write-through':
+        return InstanceCache()
+    if cache is False or cache == 'none':
+        return NoCache()
+    if isinstance(cache, (int, float)) and not isinstance(cache, bool):
+        return TTLCache(cache)
+    raise ValueError(f"unknown cache policy {cache!r}")
@@ -0,0 +1,179 @@
+# encoding: utf-8
+"""
+closure.py
+
+In memory index of the transitive closure of a predicate, for the
+ancestors / descendants of taxonomies (rdfs:subClassOf, skos:broader, any
+owl:TransitiveProperty).
+
+Without an index each :class:`~rdfalchemy.descriptors.owlTransitive` read and
+each :attr:`~rdfalchemy.rdfsSubject.rdfsClass.transitive_subClassOf` walks the
+graph with one lookup per edge.  With one, the edges are read in a single
+call and the closure of a node is a dict lookup once it has been asked for.
+
+.. code-block:: python
+
+    db = ObservableGraph(ConjunctiveGraph())
+    build_closure(db, RDFS.subClassOf)
+    rdfsClass(uri).transitive_subClassOf   # from the index
+
+On an :class:`~rdfalchemy.events.ObservableGraph` the index follows the
+edges added and removed, and moves on the versions of the nodes whose
+closure changes so that their cached owlTransitive values are read again.
+Otherwise call :meth:`TransitiveClosure.build` after a change.
+"""
+import logging
+
+from rdfalchemy.events import ADD
+from rdfalchemy.store import graph_state
+
+__all__ = ["TransitiveClosure", "build_closure", "get_closure", "drop_closure"]
+
+log = logging.getLogger(__name__)
+
+
+class TransitiveClosure:
+    """
+    The edges of `predicate` in `db` and the closures computed from them
+
+    The closure of a node is worked out the first time it is asked for and
+    kept.  A change to an edge only forgets the closures it can affect.
+    """
+
+    def __init__(self, db, predicate):
+        self.db = db
+        self.predicate = predicate
+        self.build()
+
+    def build(self):
+        """
+        (Re)read all the edges with one call to the store
+        """
+        self._up = {}
+        self._down = {}
+        self._ancestors = {}
+        self._descendants = {}
+        for s, o in self.db.subject_objects(self.predicate):
+            self._up.setdefault(s, {})[o] = None
+            self._down.setdefault(o, {})[s] = None
+        log.debug("closure of %s: %d edges", self.predicate,
+                  sum(len(objs) for objs in self._up.values()))
+
+    def __len__(self):
+        return sum(len(objs) for objs in self._up.values())
+
+    def _closure(self, node, edges, memo):
+        found = memo.get(node)
+        if found is None:
+            found = {node: None}
+            todo = [node]
+            while todo:
+                for n in edges.get(todo.pop(), ()):
+                    if n in found:
+                        continue
+                    known = memo.get(n)
+                    if known is not None:
+                        # a closure already worked out is complete
+                        found.update(known)
+                    else:
+                        found[n] = None
+                        todo.append(n)
+            memo[node] = found
+        return found
+
+    def ancestors(self, node):
+        """
+        node and every node it reaches through the predicate, like
+        `db.transitive_objects(node, predicate)`
+        """
+        return list(self._closure(node, self._up, self._ancestors))
+
+    def descendants(self, node):
+        """
+        node and every node reaching it through the predicate, like
+        `db.transitive_subjects(predicate, node)`
+        """
+        return list(self._closure(node, self._down, self._descendants))
+
+    def _forget(self, s, o):
+        # the ancestors of s and of whatever reaches it, the descendants of
+        # o and of whatever it reaches
+        touch = getattr(self.db, 'touch', None)
+        for node in self._closure(s, self._down, {}):
+            self._ancestors.pop(node, None)
+            if touch is not None:
+                # the values cached for (node, predicate) are stale
+                touch(node, self.predicate)
+        for node in self._closure(o, self._up, {}):
+            self._descendants.pop(node, None)
+
+    def add_edge(self, s, o):
+        if o in self._up.get(s, ()):
+            return
+        self._up.setdefault(s, {})[o] = None
+        self._down.setdefault(o, {})[s] = None
+        self._forget(s, o)
+
+    def remove_edge(self, s, o):
+        if o not in self._up.get(s, ()):
+            return
+        self._forget(s, o)
+        del self._up[s][o]
+        del self._down[o][s]
+
+    def notify(self, event, triple):
+        """
+        Follow a change to the graph (an :class:`~rdfalchemy.events.ObservableGraph`
+        listener)
+        """
+        s, p, o = triple
+        if p is not None and p != self.predicate:
+            return
+        if event == ADD:
+            self.add_edge(s, o)
+        elif s is not None and o is not None:
+            self.remove_edge(s, o)
+        elif s is not None:
+            for obj in list(self._up.get(s, ())):
+                self.remove_edge(s, obj)
+        elif o is not None:
+            for subj in list(self._down.get(o, ())):
+                self.remove_edge(subj, o)
+        else:
+            self.build()
+
+
+def _closures(db):
+    return graph_state(db, 'closures', dict)
+
+
+def build_closure(db, predicate):
+    """
+    The closure index of `predicate` in `db`, built the first time
+
+    Reads to `db` through rdfalchemy use it from then on
+    """
+    closures = _closures(db)
+    index = closures.get(predicate)
+    if index is None:
+        index = closures[predicate] = TransitiveClosure(db, predicate)
+        subscribe = getattr(db, 'subscribe', None)
+        if subscribe:
+            subscribe(index.notify)
+    return index
+
+
+def get_closure(db, predicate):
+    """
+    The closure index of `predicate` in `db` or `None`
+    """
+    return _closures(db).get(predicate)
+
+
+def drop_closure(db, predicate):
+    """
+    Stop using and maintaining the closure index of `predicate`
+    """
+    index = _closures(db).pop(predicate, None)
+    if index is not None and hasattr(db, 'unsubscribe'):
+        db.unsubscribe(index.notify)
@@ -6,19 +6,31 @@ Created by Philip Cooper on 2008-02-03.
 Copyright (c) 2008 Openvest. All rights reserved.
 """
 from copy import copy
+import functools
 import logging
 import warnings
 
 from rdflib import URIRef, BNode
+from rdflib.paths import SequencePath, ZeroOrMore, MulPath
 from rdflib.term import Identifier
 from rdfalchemy import rdfSubject, Literal
 
+from rdfalchemy import store
+from rdfalchemy.cache import CacheInfo, cache_policy
+from rdfalchemy.closure import get_closure
+from rdfalchemy.inference import transitive
 from rdfalchemy.namespaces import RDF
+from rdfalchemy.rdf_subject import _apply_cascading
 
-__all__ = ["rdfSingle", "rdfMultiple", "rdfList", "rdfContainer", "owlTransitive", "rdfAbstract"]
+__all__ = ["rdfSingle", "rdfMultiple", "rdfList", "rdfContainer", "owlTransitive", "rdfAbstract",
+           "rdfInverse", "rdfAggregate", "rdfCount", "rdfSum", "rdfMin", "rdfMax",
+           "ListProxy", "LazyCollection"]
 
 log = logging.getLogger(__name__)
 
+# marks a value that is not in the cache
+_MISSING = object()
+
 
 # helper function, might be somewhere in rdflib I need to look for it there
 def get_list(sub, pred=None, db=None):
@@ -42,28 +54,22 @@ def get_list(sub, pred=None, db=None):
     if not isinstance(base, BNode):
         # Doesn't look like a items or a collection, just return
         # multiple values (or an error?)
-        return db.objects(sub, pred)[:]
-    members = []
-    first = db.value(base, RDF.first)
+        return list(db.objects(sub, pred))
     # OK let's work at returning a items if there is an RDF.first
-    if first:
-        while first:
-            members.append(first)
-            base = db.value(base, RDF.rest)
-            first = db.value(base, RDF.first)
+    # (a bnode label means nothing to a SPARQL endpoint, start from sub)
+    if pred:
+        _head, _cells, members = store.list_items(db, sub, pred)
+    else:
+        _head, _cells, members = store.list_items(db, base)
+    if members:
         return members
     else:
         # OK let's work at returning a Collection (Seq,Bag or Alt)
         # if was no RDF.first
-        i = 1
-        first = db.value(base, RDF._1)
-        if not first:
+        members = store.container_items(db, base)
+        if not members:
             raise AttributeError("Not a items, or collection but another type of BNode")
-        while first:
-            members.append(first)
-            i += 1
-            first = db.value(base, RDF[f'_{i}'])
-        return members
+        return [o for _i, o in members]
 
 
 def value2object(value):
@@ -91,11 +97,14 @@ class rdfAbstract:
     Descriptors are to map class instance variables to predicates
     optional cache_name is where to store items
     range_type is the rdf:type of the range of this predicate
+    cache is the cache policy (see :func:`rdfalchemy.cache.cache_policy`)
     """
-    def __init__(self, pred, cache_name=None, range_type=None):
+    def __init__(self, pred, cache_name=None, range_type=None, cache=None):
         self.pred = pred
         self.name = cache_name or pred
         self.range_type = range_type
+        self.cache = cache_policy(cache)
+        self.hits = self.misses = 0
 
     @property
     def range_class(self):
@@ -112,6 +121,143 @@ class rdfAbstract:
         else:
             return rdfSubject
 
+    #
+    # the cached value is kept by self.cache, by default in
+    # obj.__dict__[self.name]
+    # if obj.db keeps versions (see rdfalchemy.events.ObservableGraph)
+    # the version it was read at is kept with it
+
+    def _version(self, obj):
+        """
+        The version of the triples behind this descriptor for obj, `None`
+        if obj.db does not keep versions
+        """
+        version = getattr(obj.db, 'version', None)
+        if version is None:
+            return None
+        return version(obj.resUri, self.pred)
+
+    def _get_cache(self, obj):
+        """
+        The cached value for obj or `_MISSING`, a value whose version
+        has moved on is dropped
+        """
+        entry = self.cache.get(self, obj)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        val, cached_version = entry
+        version = self._version(obj)
+        if version is not None and cached_version != version:
+            log.debug("stale cache %s for %s", self.name, obj.n3())
+            self._drop_cache(obj)
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        return val
+
+    def _set_cache(self, obj, val):
+        self.cache.put(self, obj, val, self._version(obj))
+
+    def _depend(self, obj, nodes):
+        """
+        The value for obj was read through the triples of `nodes` too,
+        tie its version to them if obj.db keeps versions
+        """
+        depend = getattr(obj.db, 'depend', None)
+        if depend is not None:
+            depend(obj.resUri, self.pred, nodes)
+
+    def _cache_written(self, obj, val):
+        """
+        Cache `val` just written for obj if the policy writes through,
+        otherwise drop the cached value
+        """
+        if self.cache.write_through:
+            self._set_cache(obj, val)
+        else:
+            self._drop_cache(obj)
+
+    def _drop_cache(self, obj):
+        self.cache.discard(self, obj)
+
+    def cache_info(self):
+        """
+        The hits and misses of the cache of this descriptor and its policy
+        """
+        return CacheInfo(self.hits, self.misses, self.cache)
+
+    def _object2value(self, o):
+        """
+        The python value for the object `o` of a triple, the reverse of
+        :func:`value2object`
+        """
+        if isinstance(o, (BNode, URIRef)):
+            return self.range_class(o)
+        return o.toPython()
+
+    def _objects2values(self, objs):
+        """
+        :meth:`_object2value` for all of `objs`, the nodes are wrapped with
+        one call to `range_class.wrap_many` (one rdf:type fetch for an
+        :class:`~rdfalchemy.rdfsSubject.rdfsSubject`)
+        """
+        nodes = [o for o in objs if isinstance(o, (BNode, URIRef))]
+        wrapped = iter(self.range_class.wrap_many(nodes) if nodes else ())
+        return [next(wrapped) if isinstance(o, (BNode, URIRef)) else o.toPython()
+                for o in objs]
+
+    def _set_caches(self, found):
+        """
+        Cache the values of [(obj, [objects])] with the objects of all the
+        objs wrapped at once
+        """
+        values = iter(self._objects2values([o for _obj, objs in found for o in objs]))
+        for obj, objs in found:
+            self._set_cache(obj, [next(values) for _o in objs])
+
+    def _triples(self, node, value):
+        """
+        The triples that store `value` for a new subject `node`
+
+        Used to build instances in bulk (see :meth:`rdfSubject.bulk_create`)
+        """
+        if value is not None:
+            yield node, self.pred, value2object(value)
+
+    def _prefetch(self, objs):
+        """
+        Fill the cache of this descriptor for all of `objs`
+
+        Used for eager loading (see :meth:`rdfSubject.ClassInstances`).
+        This default just reads each value in turn, subclasses override it
+        to fetch the values for the whole batch from the store at once
+        """
+        for obj in objs:
+            self.__get__(obj, type(obj))
+
+    def _fetch_many(self, objs):
+        """
+        Generator over (obj, [objects]) for the objs without a cached value
+
+        All objects of self.pred are fetched with one call to
+        :meth:`_values_for` per graph
+        """
+        by_db = {}
+        for obj in objs:
+            if self._get_cache(obj) is _MISSING:
+                by_db.setdefault(id(obj.db), []).append(obj)
+        for todo in by_db.values():
+            values = self._values_for(todo[0].db, [obj.resUri for obj in todo])
+            for obj in todo:
+                yield obj, values.get(obj.resUri, [])
+
+    def _values_for(self, db, nodes):
+        """
+        {node: [nodes]} read from `db` for all of `nodes` at once
+        """
+        return store.objects_for(db, nodes, self.pred)
+
     def __delete__(self, obj):
         """
         deletes or removes from the database triples with:
@@ -124,8 +270,7 @@ class rdfAbstract:
         # be done ala get_list above
         log.debug("DELETE with descriptor for %s on %s", self.pred, obj.n3())
         # first drop the cached value
-        if self.name in obj.__dict__:
-            del obj.__dict__[self.name]
+        self._drop_cache(obj)
         # next, drop the triples
         obj.__delitem__(self.pred)
 
@@ -138,47 +283,75 @@ class rdfSingle(rdfAbstract):
     on Assignment will set that value to the
     ONLY triple with that subject,predicate pair
     """
-    def __init__(self, pred, cache_name=None, range_type=None):
-        super().__init__(pred, cache_name, range_type)
+    def __init__(self, pred, cache_name=None, range_type=None, cache=None):
+        super().__init__(pred, cache_name, range_type, cache)
 
     def __get__(self, obj, cls):
         if obj is None:
             return self
-        if self.name in obj.__dict__:
-            return obj.__dict__[self.name]
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
         log.debug("Getting with descriptor %s for %s", self.pred, obj.n3())
         val = obj.__getitem__(self.pred)
         if isinstance(val, (rdfSubject, BNode, URIRef)):
             val = self.range_class(val)
-        obj.__dict__[self.name] = val
+        self._set_cache(obj, val)
         return val
 
+    def _prefetch(self, objs):
+        found = [(obj, vals[:1]) for obj, vals in self._fetch_many(objs)]
+        values = iter(self._objects2values([vals[0] for _obj, vals in found if vals]))
+        for obj, vals in found:
+            self._set_cache(obj, next(values) if vals else None)
+
+    def _value(self, value):
+        """
+        The value written by `__set__` and `_triples`, a collection is
+        refused
+        """
+        if isinstance(value, (list, tuple, set)):
+            raise AttributeError("to set an rdfSingle you must pass in a single value")
+        return value
+
+    def _triples(self, node, value):
+        return super()._triples(node, self._value(value))
+
     def __set__(self, obj, value):
         log.debug("SET with descriptor value %s of type %s", value, type(value))
         # setattr(obj, self.name, value)  #this recurses indefinitely
-        if isinstance(value, (list, tuple, set)):
-            raise AttributeError("to set an rdfSingle you must pass in a single value")
+        value = self._value(value)
         if value is None:
             self.__delete__(obj)
         else:
-            obj.__dict__[self.name] = value
             o = value2object(value)
             obj.db.set((obj.resUri, self.pred, o))
+            self._cache_written(obj, value)
 
 
 class rdfMultiple(rdfAbstract):
     """
     This is a Descriptor
     Expects to return a items of values (could be a items of one)
+
+    :param lazy: return a :class:`LazyCollection` that leaves the values in
+        the store until they are used, for predicates with a huge number
+        of values
     """
-    def __init__(self, pred, cache_name=None, range_type=None):
-        super().__init__(pred, cache_name, range_type)
+    def __init__(self, pred, cache_name=None, range_type=None, lazy=False, cache=None):
+        super().__init__(pred, cache_name, range_type, cache)
+        self.lazy = lazy
 
     def __get__(self, obj, cls):
         if obj is None:
             return self
-        if self.name in obj.__dict__:
-            return obj.__dict__[self.name]
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
+        if self.lazy:
+            val = LazyCollection(obj, self)
+            self._set_cache(obj, val)
+            return val
         val = [o for o in obj.db.objects(obj.resUri, self.pred)]
         log.debug("Getting with descriptor %s for %s", self.pred, obj.n3())
         # check to see if this is a Container or Collection
@@ -190,34 +363,303 @@ class rdfMultiple(rdfAbstract):
                 obj.db.value(val[0], RDF.first
                              ) or obj.db.value(val[0], RDF._1)):
             val = get_list(obj, self.pred)
-        val = [(isinstance(v, (BNode, URIRef))
-                and self.range_class(v)
-                or v.toPython())
-               for v in val]
-        obj.__dict__[self.name] = val
+        val = self._objects2values(val)
+        self._set_cache(obj, val)
         return val
 
+    def _prefetch(self, objs):
+        if self.lazy:
+            # nothing to fetch ahead
+            return
+        found = []
+        single = {}
+        for obj, vals in self._fetch_many(objs):
+            if len(vals) == 1 and not isinstance(vals[0], Literal):
+                single.setdefault(id(obj.db), []).append((obj, vals))
+            else:
+                found.append((obj, vals))
+        # a single node might be a Collection or Container, checked for all
+        # of them at once, the collections are left to __get__
+        for todo in single.values():
+            db = todo[0][0].db
+            nodes = [vals[0] for _obj, vals in todo]
+            collections = (store.objects_for(db, nodes, RDF.first).keys()
+                           | store.objects_for(db, nodes, RDF._1).keys())
+            for obj, vals in todo:
+                if vals[0] in collections:
+                    self.__get__(obj, type(obj))
+                else:
+                    found.append((obj, vals))
+        self._set_caches(found)
+
+    def _triples(self, node, values):
+        for value in values or ():
+            yield node, self.pred, value2object(value)
+
     def __set__(self, obj, new_vals):
         log.debug("SET with descriptor value %s of type %s", new_vals, type(new_vals))
+        if new_vals is None:
+            self.__delete__(obj)
+            return
         if not isinstance(new_vals, (list, tuple)):
             raise AttributeError("to set a rdfMultiple you must pass in `a` items (it can be `a` items of one)")
+        # diff against what the store holds, the cache may be stale or empty
+        old = set(obj.db.objects(obj.resUri, self.pred))
+        new = dict.fromkeys(value2object(value) for value in new_vals)
+        removes = [(obj.resUri, self.pred, o) for o in old if o not in new]
+        adds = [(obj.resUri, self.pred, o) for o in new if o not in old]
+        log.debug("removing %d, adding %d values of %s for %s",
+                  len(removes), len(adds), self.pred, obj.n3())
+        if removes or adds:
+            store.apply_changes(obj.db, removes, adds)
+        if self.lazy:
+            self._drop_cache(obj)
+        else:
+            self._cache_written(obj, copy(new_vals))
+
+
+class LazyCollection:
+    """
+    The values of a lazy :class:`rdfMultiple`, read from the store as they
+    are used
+
+    * iteration streams the objects and wraps each one as it is reached
+    * `len` is counted by the store, and kept while the version of the
+      triples does not change on an :class:`~rdfalchemy.events.ObservableGraph`
+    * an index or a slice fetches that page only
+    * `in` checks for the one triple
+
+    The order is the order of the store (sorted on a SPARQL endpoint for
+    an index or a slice).
+    """
+
+    def __init__(self, obj, descriptor):
+        self._obj = obj
+        self._descriptor = descriptor
+        # (length, version it was counted at)
+        self._len = None
+
+    def _triple(self, o=None):
+        return self._obj.resUri, self._descriptor.pred, o
+
+    def _known_len(self):
+        # the length counted at the current version or None
+        if self._len is None:
+            return None
+        length, version = self._len
+        if version is None or version != self._descriptor._version(self._obj):
+            return None
+        return length
+
+    def __iter__(self):
+        for o in self._obj.db.objects(self._obj.resUri, self._descriptor.pred):
+            yield self._descriptor._object2value(o)
+
+    def __len__(self):
+        length = self._known_len()
+        if length is None:
+            version = self._descriptor._version(self._obj)
+            length = store.estimate(self._obj.db, self._triple(), limit=None)
+            self._len = length, version
+        return length
+
+    def __bool__(self):
+        length = self._known_len()
+        if length is not None:
+            return length > 0
+        return store.exists(self._obj.db, self._triple())
+
+    def __contains__(self, value):
+        return store.exists(self._obj.db, self._triple(value2object(value)))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.start, index.stop, index.step
+            if (step or 1) < 0:
+                # backwards: the page between the ends, read in reverse
+                positions = range(*index.indices(len(self)))
+                if not positions:
+                    return []
+                first = positions[-1]
+                page = store.objects_page(self._obj.db, self._obj.resUri,
+                                          self._descriptor.pred, first, positions[0] - first + 1)
+                return self._descriptor._objects2values(
+                    [page[i - first] for i in positions if i - first < len(page)])
+            if (start or 0) < 0 or (stop or 0) < 0:
+                # counting from the end needs the length
+                start, stop, step = index.indices(len(self))
+            start = start or 0
+            limit = None if stop is None else max(0, stop - start)
+            page = store.objects_page(self._obj.db, self._obj.resUri,
+                                      self._descriptor.pred, start, limit)
+            return self._descriptor._objects2values(page[::step])
+        if index < 0:
+            index += len(self)
+        page = store.objects_page(self._obj.db, self._obj.resUri,
+                                  self._descriptor.pred, index, 1) if index >= 0 else []
+        if not page:
+            raise IndexError("index out of range")
+        return self._descriptor._object2value(page[0])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"<LazyCollection {self._descriptor.pred} of {self._obj.n3()}>"
+
+
+class rdfInverse(rdfAbstract):
+    """
+    This is a Descriptor
+    Follows the predicate backwards: returns a items of the subjects of
+    the triples with the instance as object
+
+    .. code-block:: python
+
+        class Group(rdfSubject):
+            members = rdfInverse(FOAF.member, range_type=FOAF.Person)
+
+    Values are read from the object index of the store (``?s p <o>`` on a
+    SPARQL endpoint) and cached like the other descriptors, on an
+    :class:`~rdfalchemy.events.ObservableGraph` the cache follows the
+    version of (predicate, object).
+    """
+    def __init__(self, pred, cache_name=None, range_type=None, cache=None):
+        super().__init__(pred, cache_name or f"^{pred}", range_type, cache)
+
+    def _version(self, obj):
+        version = getattr(obj.db, 'inverse_version', None)
+        if version is None:
+            return None
+        return version(self.pred, obj.resUri)
+
+    def _values_for(self, db, nodes):
+        return store.subjects_for(db, nodes, self.pred)
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
+        log.debug("Getting with inverse descriptor %s for %s", self.pred, obj.n3())
+        subjects = self._values_for(obj.db, [obj.resUri]).get(obj.resUri, [])
+        val = self._objects2values(subjects)
+        self._set_cache(obj, val)
+        return val
+
+    def _prefetch(self, objs):
+        self._set_caches(list(self._fetch_many(objs)))
+
+    def _triples(self, node, values):
+        for value in values or ():
+            yield value2object(value), self.pred, node
+
+    def __set__(self, obj, new_vals):
+        log.debug("SET with inverse descriptor value %s of type %s", new_vals, type(new_vals))
         if new_vals is None:
             self.__delete__(obj)
             return
-        try:
-            old_vals = obj.__dict__[self.name]
-        except KeyError:
-            old_vals = []
-            obj.__dict__[self.name] = old_vals
-        for value in old_vals:
-            if value not in new_vals:
-                obj.db.remove((obj.resUri, self.pred, value2object(value)))
-                log.debug("removing: %s, %s, %s", obj.n3(), self.pred, value)
-        for value in new_vals:
-            if value not in old_vals:
-                obj.db.add((obj.resUri, self.pred, value2object(value)))
-                log.debug("adding: %s, %s, %s", obj.n3(), self.pred, value)
-        obj.__dict__[self.name] = copy(new_vals)
+        if not isinstance(new_vals, (list, tuple)):
+            raise AttributeError("to set a rdfInverse you must pass in `a` items (it can be `a` items of one)")
+        old = set(obj.db.subjects(self.pred, obj.resUri))
+        new = dict.fromkeys(value2object(value) for value in new_vals)
+        removes = [(s, self.pred, obj.resUri) for s in old if s not in new]
+        adds = [(s, self.pred, obj.resUri) for s in new if s not in old]
+        if removes or adds:
+            store.apply_changes(obj.db, removes, adds)
+        self._cache_written(obj, list(new_vals))
+
+    def __delete__(self, obj):
+        """
+        removes the triples with self.pred as predicate and obj.resUri as
+        object, the subjects are left alone
+        """
+        log.debug("DELETE with inverse descriptor for %s on %s", self.pred, obj.n3())
+        self._drop_cache(obj)
+        store.apply_changes(obj.db, [(None, self.pred, obj.resUri)])
+
+
+class rdfAggregate(rdfAbstract):
+    """
+    This is a Descriptor
+    Read only, the aggregate `function` (COUNT, SUM, MIN or MAX) of the
+    values of a predicate computed by the store
+
+    `pred` may be a property path, a tuple of predicates is followed one
+    after the other.  The value is cached like the other descriptors, on an
+    :class:`~rdfalchemy.events.ObservableGraph` only changes to the first
+    predicate of a path drop it (``del obj.attr`` to read it again).
+    """
+    function = None
+
+    def __init__(self, pred, cache_name=None, cache=None):
+        if isinstance(pred, (tuple, list)):
+            pred = pred[0] if len(pred) == 1 else SequencePath(*pred)
+        super().__init__(pred, cache_name or f"{self.function}({pred.n3()})", cache=cache)
+
+    def _version(self, obj):
+        version = getattr(obj.db, 'version', None)
+        if version is None:
+            return None
+        first = self.pred.args[0] if isinstance(self.pred, SequencePath) else self.pred
+        return version(obj.resUri, first)
+
+    def _values_for(self, db, nodes):
+        return store.aggregate_for(db, nodes, self.pred, self.function)
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
+        log.debug("%s with descriptor %s for %s", self.function, self.pred, obj.n3())
+        val = self._values_for(obj.db, [obj.resUri])[obj.resUri]
+        self._set_cache(obj, val)
+        return val
+
+    def _prefetch(self, objs):
+        for obj, val in self._fetch_many(objs):
+            self._set_cache(obj, val)
+
+    def _triples(self, node, value):
+        return ()
+
+    def __set__(self, obj, value):
+        raise AttributeError(f"{self.function} of {self.pred} is computed by the store, it cannot be set")
+
+    def __delete__(self, obj):
+        # only forget the value
+        self._drop_cache(obj)
+
+
+class rdfCount(rdfAggregate):
+    """
+    The number of values of a predicate, counted by the store
+    """
+    function = 'COUNT'
+
+
+class rdfSum(rdfAggregate):
+    """
+    The sum of the values of a predicate
+    """
+    function = 'SUM'
+
+
+class rdfMin(rdfAggregate):
+    """
+    The smallest value of a predicate, `None` without values
+    """
+    function = 'MIN'
+
+
+class rdfMax(rdfAggregate):
+    """
+    The largest value of a predicate, `None` without values
+    """
+    function = 'MAX'
 
 
 class rdfBest(rdfSingle):
@@ -231,16 +673,17 @@ class rdfBest(rdfSingle):
     like choices[0] if no "Best" is found
     """
 
-    def __init__(self, pred, select_fun=None, cache_name=None, range_type=None):
+    def __init__(self, pred, select_fun=None, cache_name=None, range_type=None, cache=None):
         if select_fun:
             self.select_fun = select_fun
-        super().__init__(pred, range_type)
+        super().__init__(pred, cache_name, range_type, cache)
 
     def __get__(self, obj, cls):
         if obj is None:
             return self
-        if self.name in obj.__dict__:
-            return obj.__dict__[self.name]
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
         log.debug("Getting with descriptor %s for %s", self.pred, obj.n3())
         vals = [o for o in obj.db.objects(obj.resUri, self.pred)]
         if vals:
@@ -248,20 +691,40 @@ class rdfBest(rdfSingle):
             val = isinstance(val, (BNode, URIRef)) and self.range_class(val) or val.toPython()
         else:
             val = None
-        obj.__dict__[self.name] = val
+        self._set_cache(obj, val)
         return val
 
+    def _prefetch(self, objs):
+        for obj, vals in self._fetch_many(objs):
+            self._set_cache(obj, self._object2value(self.select_fun(vals)) if vals else None)
+
+
+class _LanguageTable(dict):
+    """
+    {language: [objects]} of a (subject, predicate) in store order,
+    untagged values are under `None`.  `complete` is False when only some
+    languages were fetched.
+    """
+    def __init__(self, objects=(), complete=True):
+        super().__init__()
+        self.complete = complete
+        for o in objects:
+            self.setdefault(getattr(o, 'language', None), []).append(o)
+
 
 class rdfLocale(rdfBest):
     """
     This is like rdfBest with a predefined select_fun to select
     from multiple choices like labels or comments and select the one
     with the correct locale
+
+    The values of the predicate are cached once per instance in a table by
+    language shared by every rdfLocale over the same predicate (unless
+    given a `cache_name`), so `title_en` and `title_fr` cost one fetch.
     """
-    def __init__(self, pred, lang, cache_name=None):
+    def __init__(self, pred, lang, cache_name=None, cache=None):
         self.lang = lang
-        cache_name_lang = cache_name or f"{pred}@{lang}"
-        super().__init__(pred, cache_name=cache_name_lang)
+        super().__init__(pred, cache_name=cache_name or f"{pred}@", cache=cache)
 
     def select_fun(self, choices):
         for x in choices:
@@ -269,6 +732,81 @@ class rdfLocale(rdfBest):
                 return x
         return choices[0]
 
+    def _pick(self, table):
+        choices = table.get(self.lang)
+        if not choices:
+            if not table:
+                return None
+            # like select_fun, the first value whatever its language
+            choices = next(iter(table.values()))
+        return self._object2value(choices[0])
+
+    def _usable(self, table):
+        return table is not _MISSING and (table.complete or self.lang in table)
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        table = self._get_cache(obj)
+        if not self._usable(table):
+            log.debug("Getting with descriptor %s for %s", self.pred, obj.n3())
+            table = _LanguageTable(obj.db.objects(obj.resUri, self.pred))
+            self._set_cache(obj, table)
+        return self._pick(table)
+
+    def _prefetch(self, objs):
+        """
+        Fetch the values in this language for all of objs, remotely the
+        store filters on the language.  The objs without one get all their
+        values in a second batch.
+        """
+        by_db = {}
+        for obj in objs:
+            if not self._usable(self._get_cache(obj)):
+                by_db.setdefault(id(obj.db), []).append(obj)
+        for todo in by_db.values():
+            db = todo[0].db
+            if store.is_remote(db):
+                found = store.objects_for(db, [obj.resUri for obj in todo], self.pred, lang=self.lang)
+                for obj in todo:
+                    if obj.resUri in found:
+                        self._set_cache(obj, _LanguageTable(found[obj.resUri], complete=False))
+                todo = [obj for obj in todo if obj.resUri not in found]
+            values = store.objects_for(db, [obj.resUri for obj in todo], self.pred)
+            for obj in todo:
+                self._set_cache(obj, _LanguageTable(values.get(obj.resUri, ())))
+
+    def _value(self, value):
+        """
+        A string is written in the language of this descriptor
+        """
+        if isinstance(value, (list, tuple, set)):
+            raise AttributeError("to set an rdfLocale you must pass in a single value")
+        if isinstance(value, str) and not isinstance(value, Identifier):
+            value = Literal(value, lang=self.lang)
+        return value
+
+    def __set__(self, obj, value):
+        """
+        Replace the value in this language, the other languages stay
+        """
+        if value is None:
+            self.__delete__(obj)
+            return
+        value = self._value(value)
+        self.__delete__(obj)
+        store.apply_changes(obj.db, adds=[(obj.resUri, self.pred, value2object(value))])
+
+    def __delete__(self, obj):
+        """
+        Remove the values in this language only
+        """
+        removes = [(obj.resUri, self.pred, o)
+                   for o in obj.db.objects(obj.resUri, self.pred)
+                   if getattr(o, 'language', None) == self.lang]
+        store.apply_changes(obj.db, removes)
+        self._drop_cache(obj)
+
 
 class rdfList(rdfMultiple):
     """
@@ -277,74 +815,294 @@ class rdfList(rdfMultiple):
     `__set__` will set the predicate as a RDF List
     """
 
-    def __init__(self, pred, cache_name=None, range_type=None):
-        super().__init__(pred, cache_name, range_type)
+    def __init__(self, pred, cache_name=None, range_type=None, cache=None):
+        super().__init__(pred, cache_name, range_type, cache=cache)
+
+    # members are spread over several triples, read them one obj at a time
+    _prefetch = rdfAbstract._prefetch
 
     def __get__(self, obj, cls):
         if obj is None:
             return self
-        if self.name in obj.__dict__:
-            return obj.__dict__[self.name]
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
         # log.debug("Geting %s for %s" % (
         #    obj.db.qname(self.pred),obj.db.qname(obj.resUri)))
         log.debug("Getting %s for %s",  self.pred, obj.n3())
-        base = obj.db.value(obj.resUri, self.pred)
-        if not base or base == RDF.nil:
-            return []
-        members = []
-        first = obj.db.value(base, RDF.first)
-        # OK let's work at returning a items if there is an RDF.first
-        if not first:
+        # the whole chain in one go
+        version = self._version(obj)
+        base, cells, members = store.list_items(obj.db, obj.resUri, self.pred)
+        if base and base != RDF.nil and not members:
             raise AttributeError(f"expected node [{base.n3()}] to be a items but it's not.")
-        while first:
-            members.append(first)
-            base = obj.db.value(base, RDF.rest)
-            first = obj.db.value(base, RDF.first)
-
-        val = [
-            ((isinstance(v, BNode)
-                or isinstance(v, URIRef))
-                and self.range_class(v)
-                or v.toPython())
-            for v in members]
-        obj.__dict__[self.name] = val
+
+        val = ListProxy(obj, self, members, cells, version)
+        self._depend(obj, cells)
+        self._set_cache(obj, val)
         return val
 
+    @staticmethod
+    def _cells(values, tail=RDF.nil):
+        """
+        ([cells], triples) of a new RDF List holding values whose last
+        cell points to tail
+        """
+        cells = [BNode() for _value in values]
+        triples = []
+        for cell, rest, value in zip(cells, cells[1:] + [tail], values):
+            triples.append((cell, RDF.first, value2object(value)))
+            triples.append((cell, RDF.rest, rest))
+        return cells, triples
+
+    def _triples(self, node, values):
+        if values is None:
+            return
+        cells, triples = self._cells(values)
+        yield node, self.pred, cells[0] if cells else RDF.nil
+        yield from triples
+
     def __set__(self, obj, new_vals):
         log.debug("SET with descriptor value %s of type %s", new_vals, type(new_vals))
         if not isinstance(new_vals, (list, tuple)):
             raise AttributeError("to set a rdfList you must pass in `a` items (it can be `a` items of one)")
+        # the cells come from the store, not from the cache
+        self._drop_cache(obj)
         try:
-            old_vals = obj.__dict__[self.name]
-        except KeyError:
-            old_vals = []
-            obj.__dict__[self.name] = old_vals
-        old_head = obj.db.value(obj.resUri, self.pred)
-        # This is a stack style where retrieval is opposite of how
-        # it starts out
-        # newnode = RDF.nil
-        # for value in new_vals:
-        #     almostnewnode = newnode
-        #     newnode = BNode()
-        #     obj.db.add((newnode, RDF.first, value2object(value)))
-        #     obj.db.add((newnode, RDF.rest, almostnewnode))
-        if not new_vals:
-            new_head = RDF.nil
+            current = self.__get__(obj, type(obj))
+        except AttributeError:
+            # not a list, the splice replaces it
+            current = ListProxy(obj, self)
+        current._assign(new_vals)
+
+
+def _synced(method):
+    """
+    Bring the cells of the list up to date before a change (see
+    :meth:`ListProxy._sync`)
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._sync()
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ListProxy(list):
+    """
+    The value of an :class:`rdfList`: a list that writes its changes to the
+    RDF List in the store
+
+    Each change only touches the cells around it.  Appending to a long
+    list adds one cell and moves one link, replacing members in place (as
+    `sort` or `reverse` do) rewrites their rdf:first only.  Cells and
+    bnode members dropped from the list are deleted.
+
+    A list changed in the store since it was read is changed from what the
+    store holds.  On an :class:`~rdfalchemy.events.ObservableGraph` the
+    chain is only read again (one query) if its version moved on, on other
+    graphs before each change.
+    """
+
+    def __init__(self, obj, descriptor, members=(), cells=(), version=None):
+        super().__init__(descriptor._objects2values(members))
+        self._obj = obj
+        self._descriptor = descriptor
+        # the nodes of the store, the members are their values
+        self._members = list(members)
+        self._cells = list(cells)
+        # the version of the list the cells are those of, None if unknown
+        self._read_at = version
+
+    def _sync(self):
+        """
+        Make the cells and the members those of the store
+        """
+        obj, descriptor = self._obj, self._descriptor
+        version = descriptor._version(obj)
+        if version is not None and version == self._read_at:
+            return
+        base, cells, members = store.list_items(obj.db, obj.resUri, descriptor.pred)
+        if base and base != RDF.nil and not members:
+            # not a list, the splice replaces it
+            cells = []
+        if cells != self._cells or members != self._members:
+            log.debug("%s of %s changed in the store", descriptor.pred, obj.n3())
+            list.__setitem__(self, slice(None), descriptor._objects2values(members))
+            self._members = list(members)
+            self._cells = list(cells)
+            descriptor._depend(obj, cells)
+        self._read_at = version
+
+    def _anchors(self, first, last):
+        """
+        Triples of the store telling the cells [first, last] apart from
+        those of other lists, for a SPARQL endpoint (see
+        :func:`rdfalchemy.store.apply_changes`): a path from the subject to
+        the first cell, or if the cells are closer to the end of the list
+        a path from the last one to rdf:nil, then the links between them
+        """
+        obj, descriptor = self._obj, self._descriptor
+        cells = self._cells
+        if first <= len(cells) - 1 - last:
+            path = [descriptor.pred] + [RDF.rest] * first
+            anchors = [(obj.resUri, SequencePath(*path) if first else descriptor.pred, cells[first])]
         else:
-            new_head = BNode()
-            new_tail = new_head
-            old_tail = None
-            for value in new_vals:
-                if old_tail:
-                    obj.db.add((old_tail, RDF.rest, new_tail))
-                obj.db.add((new_tail, RDF.first, value2object(value)))
-                old_tail = new_tail
-                new_tail = BNode()
-            obj.db.add((old_tail, RDF.rest, RDF.nil))
-        obj.db.set((obj.resUri, self.pred, new_head))
-        if old_head:
-            rdfSubject(old_head)._remove(db=obj.db)
-        obj.__dict__[self.name] = copy(new_vals)
+            rest = [RDF.rest] * (len(cells) - last)
+            anchors = [(obj.resUri, SequencePath(descriptor.pred, MulPath(RDF.rest, ZeroOrMore)), cells[first]),
+                       (cells[last], SequencePath(*rest) if len(rest) > 1 else RDF.rest, RDF.nil)]
+        anchors.extend((cells[i], RDF.rest, cells[i + 1]) for i in range(first, last))
+        return anchors
+
+    def _splice(self, start, stop, values):
+        """
+        Replace the members in [start:stop] with values, in the store and
+        in this list
+        """
+        obj, descriptor = self._obj, self._descriptor
+        cells = self._cells
+        removes, adds = [], []
+        resized = stop - start != len(values)
+        # the cells changed or linked to, they are blank nodes
+        first = start - 1 if start and resized else start
+        last = stop if resized and stop < len(cells) else stop - 1
+        anchors = ()
+        if store.is_remote(obj.db) and first <= last:
+            anchors = self._anchors(first, last)
+        # the removes name what they remove, an endpoint inserts what goes
+        # on the same cells along (see rdfalchemy.sparql.anchored_update)
+        members = [value2object(value) for value in values]
+        if not resized:
+            # same length: a new rdf:first for the members that change
+            roots, cleared = (), []
+            new_cells = cells[start:stop]
+            for cell, old, new in zip(new_cells, self._members[start:stop], members):
+                if old != new:
+                    removes.append((cell, RDF.first, old))
+                    adds.append((cell, RDF.first, new))
+                    cleared.append((cell, RDF.first))
+        else:
+            after = cells[stop] if stop < len(cells) else RDF.nil
+            new_cells, triples = descriptor._cells(values, after)
+            adds.extend(triples)
+            link = new_cells[0] if new_cells else after
+            if start:
+                removes.append((cells[start - 1], RDF.rest, cells[start] if start < len(cells) else RDF.nil))
+                adds.append((cells[start - 1], RDF.rest, link))
+            else:
+                # the head, or what the predicate holds if it is not a list
+                removes.append((obj.resUri, descriptor.pred, cells[0] if cells else None))
+                adds.append((obj.resUri, descriptor.pred, link))
+            roots, cleared = cells[start:stop], ()
+        if removes or adds:
+            _apply_cascading(obj.db, removes, adds, roots, cleared, anchors=anchors)
+        list.__setitem__(self, slice(start, stop), values)
+        self._members[start:stop] = members
+        cells[start:stop] = new_cells
+        descriptor._depend(obj, new_cells)
+        # the store holds what was just written
+        self._read_at = descriptor._version(obj)
+        descriptor._cache_written(obj, self)
+
+    def _assign(self, values):
+        """
+        Make the list hold values, splicing only what lies between the
+        common head and tail
+        """
+        values = list(values)
+        n, m = len(self), len(values)
+        start = 0
+        while start < min(n, m) and value2object(self[start]) == value2object(values[start]):
+            start += 1
+        end = 0
+        while (end < min(n, m) - start
+               and value2object(self[n - 1 - end]) == value2object(values[m - 1 - end])):
+            end += 1
+        self._splice(start, n - end, values[start:m - end])
+
+    def _index(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("list index out of range")
+        return index
+
+    @_synced
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                self._splice(start, max(start, stop), list(value))
+            else:
+                values = list(self)
+                values[index] = value
+                self._assign(values)
+        else:
+            index = self._index(index)
+            self._splice(index, index + 1, [value])
+
+    @_synced
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                self._splice(start, max(start, stop), [])
+            else:
+                values = list(self)
+                del values[index]
+                self._assign(values)
+        else:
+            index = self._index(index)
+            self._splice(index, index + 1, [])
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    @_synced
+    def __imul__(self, n):
+        self._assign(list(self) * n)
+        return self
+
+    @_synced
+    def append(self, value):
+        self._splice(len(self), len(self), [value])
+
+    @_synced
+    def extend(self, values):
+        self._splice(len(self), len(self), list(values))
+
+    @_synced
+    def insert(self, index, value):
+        if index < 0:
+            index = max(0, index + len(self))
+        index = min(index, len(self))
+        self._splice(index, index, [value])
+
+    @_synced
+    def pop(self, index=-1):
+        if not self:
+            raise IndexError("pop from empty list")
+        index = self._index(index)
+        value = self[index]
+        self._splice(index, index + 1, [])
+        return value
+
+    @_synced
+    def remove(self, value):
+        index = self.index(value)
+        self._splice(index, index + 1, [])
+
+    @_synced
+    def clear(self):
+        self._splice(0, len(self), [])
+
+    @_synced
+    def sort(self, *, key=None, reverse=False):
+        self._assign(sorted(self, key=key, reverse=reverse))
+
+    @_synced
+    def reverse(self):
+        self._assign(list(reversed(self)))
 
 
 class rdfContainer(rdfMultiple):
@@ -359,58 +1117,79 @@ class rdfContainer(rdfMultiple):
                * rdf:Alt
 
     `__set__` will set the predicate as a RDF Container type
-    (defaults to rdf:Seq)
+    (defaults to rdf:Seq).  It only writes the rdf:_n positions whose
+    member changes, the position is the order: inserting at the front
+    rewrites every rdf:_n after it.
     """
 
-    def __init__(self, pred,  range_type=None, container_type="http://www.w3.org/1999/02/22-rdf-syntax-ns#Seq"):
-        super().__init__(pred,  range_type=range_type)
+    def __init__(self, pred,  range_type=None, container_type="http://www.w3.org/1999/02/22-rdf-syntax-ns#Seq",
+                 cache=None):
+        super().__init__(pred,  range_type=range_type, cache=cache)
         self.container_type = container_type
 
+    # members are spread over several triples, read them one obj at a time
+    _prefetch = rdfAbstract._prefetch
+
     def __get__(self, obj, cls):
         if obj is None:
             return self
-        if self.name in obj.__dict__:
-            return obj.__dict__[self.name]
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
         # log.debug("Geting %s for %s" % (
         #    obj.db.qname(self.pred),obj.db.qname(obj.resUri)))
         log.debug("Getting %s for %s", self.pred, obj.n3())
         base = obj.db.value(obj.resUri, self.pred)
         if not base:
             return []
-        members = []
-        i = 1
-        first = obj.db.value(base, RDF._1)
-        if not first:
+        # all the members in one scan
+        members = store.container_items(obj.db, base)
+        if not members:
             raise AttributeError(f"expected node [{base.n3()}] to be a items but it's not")
-        while first:
-            members.append(first)
-            i += 1
-            first = obj.db.value(base, RDF['_%d' % i])
-
-        val = [(isinstance(v, (BNode, URIRef))
-                and self.range_class(v)
-                or v.toPython())
-               for v in members]
-        obj.__dict__[self.name] = val
+
+        val = self._objects2values([v for _i, v in members])
+        self._depend(obj, [base])
+        self._set_cache(obj, val)
         return val
 
+    def _triples(self, node, values):
+        if values is None:
+            return
+        seq = BNode()
+        yield node, self.pred, seq
+        yield seq, RDF.type, URIRef(self.container_type)
+        for i, value in enumerate(values):
+            yield seq, RDF[f'_{i + 1}'], value2object(value)
+
     def __set__(self, obj, new_vals):
         log.debug("SET with descriptor value %s of type %s", new_vals, type(new_vals))
         if not isinstance(new_vals, (list, tuple)):
             raise AttributeError("to set a rdfList you must pass in `a` items (it can be `a` items of one)")
         seq = obj.db.value(obj.resUri, self.pred)
+        adds = []
         if not seq:
             seq = BNode()
-            obj.db.add((obj.resUri, self.pred, seq))
-            obj.db.add((seq, RDF.type, RDF.Seq))
-        for s, p, o in obj.db.triples((seq, None, None)):
-            if p.startswith(RDF['_']):
-                obj.db.remove((s, p, o))
-                if isinstance(o, BNode) and o not in new_vals:
-                    rdfSubject(o)._remove(db=obj.db)
-        for i in range(len(new_vals)):
-            obj.db.add((seq, RDF[f'_{i + 1}'], value2object(new_vals[i])))
-        obj.__dict__[self.name] = copy(new_vals)
+            adds.append((obj.resUri, self.pred, seq))
+            adds.append((seq, RDF.type, URIRef(self.container_type)))
+            old = {}
+        else:
+            old = dict(store.container_items(obj.db, seq))
+        new = {i + 1: value2object(value) for i, value in enumerate(new_vals)}
+        # only the positions that changed are written
+        removes, cleared = [], []
+        for i in sorted(old.keys() | new.keys()):
+            if old.get(i) == new.get(i):
+                continue
+            pred = RDF[f'_{i}']
+            if i in old:
+                removes.append((seq, pred, old[i]))
+                cleared.append((seq, pred))
+            if i in new:
+                adds.append((seq, pred, new[i]))
+        if removes or adds:
+            _apply_cascading(obj.db, removes, adds, cleared=cleared)
+        self._depend(obj, [seq])
+        self._cache_written(obj, copy(new_vals))
 
 
 #
@@ -420,15 +1199,31 @@ class owlTransitive(rdfMultiple):
     """
     owlTransitive is a descriptor based on a transitive predicate
     The predicate should be of type owl:TransitiveProperty
+
+    The closure comes from the triples materialized by a reasoner (see
+    :mod:`rdfalchemy.inference`) or the index of the predicate if there is
+    one (see :func:`rdfalchemy.closure.build_closure`)
     """
 
+    # the closure takes one lookup per edge, read them one obj at a time
+    _prefetch = rdfAbstract._prefetch
+
     def __get__(self, obj, cls):
         if obj is None:
             return self
-        if self.name in obj.__dict__:
-            return obj.__dict__[self.name]
+        val = self._get_cache(obj)
+        if val is not _MISSING:
+            return val
         log.debug("Getting with descriptor %s for %s", self.pred, obj.n3())
-        val = [self.range_class(o)
-               for o in obj.db.transitive_objects(obj.resUri, self.pred)]
-        obj.__dict__[self.name] = val
+        # materialized by a reasoner, from the closure index or walked
+        nodes = transitive(obj.db, obj.resUri, self.pred)
+        if nodes is None:
+            index = get_closure(obj.db, self.pred)
+            if index is not None:
+                nodes = index.ancestors(obj.resUri)
+            else:
+                nodes = list(obj.db.transitive_objects(obj.resUri, self.pred))
+                self._depend(obj, nodes)
+        val = self.range_class.wrap_many(list(nodes))
+        self._set_cache(obj, val)
         return val
@@ -0,0 +1,237 @@
+# encoding: utf-8
+"""
+events.py
+
+A graph wrapper that tells listeners about every change and keeps a version
+per (subject, predicate) and per (predicate, object).
+
+Descriptors cache their values on the instance.  When `obj.db` is an
+:class:`ObservableGraph` each cached value remembers the version of its
+(subject, predicate) and is dropped as soon as that version moves on, so
+long lived instances stay correct without throwing their cache away.  A
+value read through other nodes (the cells of an rdfList, the edges of a
+closure) is tied to them with :meth:`ObservableGraph.depend`.
+
+A version is the number of the last change to its key.  At most
+`max_versions` keys are remembered, the versions of the keys forgotten
+move on to the last forgotten change, which only costs cache misses.
+
+.. code-block:: python
+
+    rdfSubject.db = ObservableGraph(ConjunctiveGraph())
+
+    # changes made elsewhere (another process, a message queue ...)
+    # are pushed in with notify
+    rdfSubject.db.notify('remove', (uri, FOAF.surname, None))
+"""
+from collections import OrderedDict
+import logging
+
+from rdfalchemy import store
+
+__all__ = ["ObservableGraph"]
+
+log = logging.getLogger(__name__)
+
+ADD = 'add'
+REMOVE = 'remove'
+
+# number of keys with a version of their own
+MAX_VERSIONS = 100000
+
+
+class ObservableGraph:
+    """
+    Wraps a graph, sends ('add' | 'remove', triple) events to the listeners
+    and keeps versions of each (subject, predicate)
+
+    A `None` in the triple of a 'remove' event is a wildcard.
+    Everything that is not a write goes straight to the wrapped graph.
+
+    :param max_versions: the number of keys with a version of their own
+    """
+
+    def __init__(self, graph, max_versions=MAX_VERSIONS):
+        self.graph = graph
+        self.max_versions = max_versions
+        self._listeners = []
+        # listeners told about each triple removed, not the pattern
+        self._concrete = []
+        # number of the last change
+        self._clock = 0
+        # key -> number of its last change, oldest first.  The keys are
+        # ('sp', s, p), ('s', s) for a change to any predicate of s and
+        # the same read from the object side for inverse descriptors:
+        # ('po', p, o) and ('p', p)
+        self._stamps = OrderedDict()
+        # the last change of the keys dropped from _stamps
+        self._floor = 0
+        # last change to any subject / to any predicate
+        self._epoch = 0
+        self._inverse_epoch = 0
+        # node -> {(subject, predicate)} read through it, see depend
+        self._dependents = {}
+
+    def __repr__(self):
+        return f"<ObservableGraph on {self.graph!r}>"
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == 'graph':
+            raise AttributeError(name)
+        return getattr(self.graph, name)
+
+    def __iter__(self):
+        return iter(self.graph)
+
+    def __contains__(self, triple):
+        return triple in self.graph
+
+    def __len__(self):
+        return len(self.graph)
+
+    #
+    # listeners and versions
+
+    def subscribe(self, listener, concrete=False):
+        """
+        Call `listener(event, triple)` after every change
+
+        :param concrete: the triples matching a 'remove' pattern are looked
+            up before a write through this graph and `listener` is called
+            for each of them rather than once with the wildcards
+        """
+        (self._concrete if concrete else self._listeners).append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._concrete:
+            self._concrete.remove(listener)
+        else:
+            self._listeners.remove(listener)
+
+    def _matching(self, patterns):
+        # the triples behind remove patterns, only looked up when a
+        # listener needs them
+        if not self._concrete:
+            return None
+        return {triple: None for pattern in patterns for triple in self.graph.triples(pattern)}
+
+    def version(self, subject, predicate):
+        """
+        A number that changes whenever a triple with `subject` and
+        `predicate`, or a node it depends on, may have changed
+        """
+        stamps = self._stamps
+        return max(self._floor, self._epoch,
+                   stamps.get(('s', subject), 0),
+                   stamps.get(('sp', subject, predicate), 0))
+
+    def inverse_version(self, predicate, object):
+        """
+        A number that changes whenever a triple with `predicate` and
+        `object` may have changed
+        """
+        stamps = self._stamps
+        return max(self._floor, self._epoch, self._inverse_epoch,
+                   stamps.get(('p', predicate), 0),
+                   stamps.get(('po', predicate, object), 0))
+
+    def depend(self, subject, predicate, nodes):
+        """
+        The value of `predicate` for `subject` was read through the triples
+        of `nodes` as subjects: the version of (subject, predicate) moves
+        on with the next change to one of them
+        """
+        if len(self._dependents) > self.max_versions:
+            log.debug("forgetting the dependencies of %d nodes", len(self._dependents))
+            self._dependents.clear()
+            self._clock += 1
+            self._epoch = self._clock
+        key = (subject, predicate)
+        for node in nodes:
+            self._dependents.setdefault(node, set()).add(key)
+
+    def touch(self, subject, predicate):
+        """
+        Move the version of (subject, predicate) on without a change to
+        the graph, for values worked out from other triples (see
+        :class:`rdfalchemy.closure.TransitiveClosure`)
+        """
+        self._clock += 1
+        self._stamp(('sp', subject, predicate))
+
+    def _stamp(self, key):
+        stamps = self._stamps
+        stamps[key] = self._clock
+        stamps.move_to_end(key)
+        if len(stamps) > self.max_versions:
+            _key, self._floor = stamps.popitem(last=False)
+
+    def notify(self, event, triple, triples=None):
+        """
+        Record a change to `triple` and tell the listeners
+
+        Called for every write through this graph.  Call it yourself for
+        changes made to the store some other way.
+
+        :param triples: the triples matched by a 'remove' pattern, the
+            concrete listeners get the pattern itself without them
+        """
+        s, p, o = triple
+        self._clock += 1
+        if s is None:
+            self._epoch = self._clock
+            self._dependents.clear()
+        else:
+            self._stamp(('s', s) if p is None else ('sp', s, p))
+            for subject, predicate in self._dependents.pop(s, ()):
+                self._stamp(('sp', subject, predicate))
+        if p is None:
+            self._inverse_epoch = self._clock
+        else:
+            self._stamp(('p', p) if o is None else ('po', p, o))
+        for listener in self._listeners:
+            listener(event, triple)
+        for listener in self._concrete:
+            for t in ([triple] if triples is None else triples):
+                listener(event, t)
+
+    #
+    # writes
+
+    def add(self, triple):
+        self.graph.add(triple)
+        self.notify(ADD, triple)
+
+    def addN(self, quads):
+        quads = list(quads)
+        if store.is_remote(self.graph):
+            store.add_triples(self.graph, [(s, p, o) for s, p, o, _c in quads])
+        else:
+            self.graph.addN(quads)
+        for s, p, o, _c in quads:
+            self.notify(ADD, (s, p, o))
+
+    def remove(self, triple):
+        matching = self._matching([triple])
+        self.graph.remove(triple)
+        self.notify(REMOVE, triple, matching)
+
+    def set(self, triple):
+        s, p, o = triple
+        matching = self._matching([(s, p, None)])
+        self.graph.set(triple)
+        self.notify(REMOVE, (s, p, None), matching)
+        self.notify(ADD, triple)
+
+    def apply_changes(self, removes=(), adds=(), anchors=()):
+        """
+        Remove then add triples with one call to the wrapped graph
+        """
+        removes = list(removes)
+        adds = list(adds)
+        matching = [self._matching([triple]) for triple in removes]
+        store.apply_changes(self.graph, removes, adds, anchors)
+        for triple, triples in zip(removes, matching):
+            self.notify(REMOVE, triple, triples)
+        for triple in adds:
+            self.notify(ADD, triple)
@@ -0,0 +1,142 @@
+# encoding: utf-8
+"""
+identity.py
+
+Identity map of the rdfSubject instances for each graph.
+
+Wrapping the same node twice with the same class returns the same object,
+so the values cached by its descriptors are shared on a graph that keeps
+versions (a graph without them cannot tell them stale, a new wrap drops
+them).  Instances are held weakly, the `lru_size` most recently used ones
+are also held strongly so they (and their cached values) survive between
+requests while the memory used stays capped.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+from weakref import WeakValueDictionary
+
+from rdflib.term import Identifier
+
+from rdfalchemy.store import graph_state
+
+__all__ = ["IdentityMap", "identity_map"]
+
+log = logging.getLogger(__name__)
+
+# number of instances held strongly per graph
+DEFAULT_LRU_SIZE = 1000
+
+
+class IdentityMap:
+    """
+    {class: {node: instance}} for one graph
+
+    :param lru_size: number of recently used instances kept alive
+    """
+
+    def __init__(self, lru_size=DEFAULT_LRU_SIZE):
+        self._weak = {}
+        self._lru = OrderedDict()
+        self.lru_size = lru_size
+        # ids of the instances whose values are being loaded
+        self._loading = set()
+
+    def __len__(self):
+        return sum(len(objs) for objs in self._weak.values())
+
+    def _touch(self, key, obj):
+        if not self.lru_size:
+            return
+        self._lru[key] = obj
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, cls, node):
+        """
+        The instance of `cls` for `node` or `None`
+        """
+        objs = self._weak.get(cls)
+        obj = objs.get(node) if objs is not None else None
+        if obj is not None:
+            self._touch((cls, node), obj)
+        return obj
+
+    def add(self, cls, node, obj):
+        objs = self._weak.get(cls)
+        if objs is None:
+            objs = self._weak[cls] = WeakValueDictionary()
+        objs[node] = obj
+        self._touch((cls, node), obj)
+
+    @contextmanager
+    def loading(self, objs):
+        """
+        While the values of `objs` are read in bulk, wrapping their nodes
+        again keeps the values just cached on them (see
+        :meth:`rdfalchemy.rdfSubject.rdfSubject._rewrapped`)
+        """
+        ids = {id(obj) for obj in objs}
+        self._loading.update(ids)
+        try:
+            yield
+        finally:
+            self._loading.difference_update(ids)
+
+    def is_loading(self, obj):
+        return id(obj) in self._loading
+
+    def discard(self, node):
+        """
+        Forget every instance for node
+        """
+        for cls, objs in self._weak.items():
+            objs.pop(node, None)
+            self._lru.pop((cls, node), None)
+
+    def rename(self, mapping):
+        """
+        Move the instances of each old node of `mapping` to its new node,
+        all at once so that a -> b, b -> a swaps them.  Returns the
+        (instance, new node) pairs, the caller updates their `resUri`
+        """
+        moved = []
+        for cls, objs in self._weak.items():
+            found = []
+            for old, new in mapping.items():
+                obj = objs.pop(old, None)
+                self._lru.pop((cls, old), None)
+                # an rdfsSubject is its node, it cannot follow
+                if obj is not None and not isinstance(obj, Identifier):
+                    found.append((obj, new))
+            for obj, new in found:
+                objs[new] = obj
+                self._touch((cls, new), obj)
+            moved.extend(found)
+        return moved
+
+    def values(self):
+        """
+        The live instances
+        """
+        return [obj for objs in self._weak.values() for obj in objs.values()]
+
+    def resize(self, lru_size):
+        """
+        Change the number of instances held strongly
+        """
+        self.lru_size = lru_size
+        while len(self._lru) > lru_size:
+            self._lru.popitem(last=False)
+
+    def clear(self):
+        self._weak = {}
+        self._lru = OrderedDict()
+
+
+def identity_map(db):
+    """
+    The :class:`IdentityMap` of graph `db`
+    """
+    return graph_state(db, 'identity_map', IdentityMap)
@@ -0,0 +1,355 @@
+# encoding: utf-8
+"""
+inference.py
+
+Forward chaining of a subset of RDFS and OWL RL into a context of its own,
+so that reads of inferred facts are plain index lookups.
+
+The rules:
+
+* rdfs:subClassOf and rdfs:subPropertyOf are transitive
+* an instance of a class is an instance of its superclasses
+* a triple with a property holds for its superproperties
+* rdfs:domain and rdfs:range give the rdf:type of the subject and object
+* owl:inverseOf, owl:SymmetricProperty and owl:TransitiveProperty
+
+.. code-block:: python
+
+    db = ObservableGraph(ConjunctiveGraph())
+    materialize(db)
+    Animal.ClassInstances()           # dogs included, no subClassOf walk
+
+Evaluation is semi-naive: each new triple is only joined with the triples
+already there.  On an :class:`~rdfalchemy.events.ObservableGraph` the
+inferred context follows the changes, additions are chained forward and
+removals use delete and rederive (DRed): everything inferred from the
+removed triples is deleted, then what can still be derived is put back.
+Otherwise call :meth:`Reasoner.rebuild` after a change.
+
+The graph must hold contexts (a ConjunctiveGraph or Dataset), a SPARQL
+endpoint does its own inference.
+"""
+import logging
+
+from rdflib import Literal, RDFS, URIRef
+
+from rdfalchemy.events import ADD, REMOVE, ObservableGraph
+from rdfalchemy.exceptions import RDFAlchemyError
+from rdfalchemy.namespaces import OWL, RDF
+from rdfalchemy.store import graph_state, is_remote
+
+__all__ = ["Reasoner", "materialize", "get_reasoner", "drop_reasoner", "transitive",
+           "INFERRED"]
+
+log = logging.getLogger(__name__)
+
+# identifier of the context the inferred triples go to
+INFERRED = URIRef('urn:rdfalchemy:inferred')
+
+TYPE = RDF.type
+SUBCLASS = RDFS.subClassOf
+SUBPROPERTY = RDFS.subPropertyOf
+DOMAIN = RDFS.domain
+RANGE = RDFS.range
+INVERSE = OWL.inverseOf
+SYMMETRIC = OWL.SymmetricProperty
+TRANSITIVE = OWL.TransitiveProperty
+
+
+def _consequences(triple, lookup):
+    """
+    The triples following from `triple` with one rule, joined with the
+    triples given by `lookup(pattern)` (every pattern has a predicate)
+    """
+    s, p, o = triple
+
+    def holds(t):
+        return any(True for _t in lookup(t))
+
+    # the schema triples
+    if p == SUBCLASS:
+        for _o, _p, z in lookup((o, SUBCLASS, None)):
+            yield s, SUBCLASS, z
+        for x, _p, _s in lookup((None, SUBCLASS, s)):
+            yield x, SUBCLASS, o
+        for x, _p, _s in lookup((None, TYPE, s)):
+            yield x, TYPE, o
+    elif p == SUBPROPERTY:
+        for _o, _p, z in lookup((o, SUBPROPERTY, None)):
+            yield s, SUBPROPERTY, z
+        for x, _p, _s in lookup((None, SUBPROPERTY, s)):
+            yield x, SUBPROPERTY, o
+        for x, _p, y in lookup((None, s, None)):
+            yield x, o, y
+    elif p == DOMAIN:
+        for x, _p, _y in lookup((None, s, None)):
+            yield x, TYPE, o
+    elif p == RANGE:
+        for _x, _p, y in lookup((None, s, None)):
+            yield y, TYPE, o
+    elif p == INVERSE:
+        for x, _p, y in lookup((None, s, None)):
+            yield y, o, x
+        for x, _p, y in lookup((None, o, None)):
+            yield y, s, x
+    elif p == TYPE:
+        for _o, _p, z in lookup((o, SUBCLASS, None)):
+            yield s, TYPE, z
+        if o == SYMMETRIC:
+            for x, _p, y in lookup((None, s, None)):
+                yield y, s, x
+        elif o == TRANSITIVE:
+            for x, _p, y in lookup((None, s, None)):
+                for _y, _p, z in lookup((y, s, None)):
+                    yield x, s, z
+
+    # the triple as data for the rules of its predicate
+    for _p, _sp, q in lookup((p, SUBPROPERTY, None)):
+        yield s, q, o
+    for _p, _d, c in lookup((p, DOMAIN, None)):
+        yield s, TYPE, c
+    for _p, _r, c in lookup((p, RANGE, None)):
+        yield o, TYPE, c
+    for _p, _i, q in lookup((p, INVERSE, None)):
+        yield o, q, s
+    for q, _i, _p in lookup((None, INVERSE, p)):
+        yield o, q, s
+    if holds((p, TYPE, SYMMETRIC)):
+        yield o, p, s
+    if holds((p, TYPE, TRANSITIVE)):
+        for _o, _p, z in lookup((o, p, None)):
+            yield s, p, z
+        for x, _p, _s in lookup((None, p, s)):
+            yield x, p, o
+
+
+def _derivable(triple, lookup):
+    """
+    True if `triple` follows with one rule from the triples of `lookup`,
+    the rules of :func:`_consequences` read backwards
+    """
+    s, p, o = triple
+
+    def holds(t):
+        return any(True for _t in lookup(t))
+
+    if p in (SUBCLASS, SUBPROPERTY):
+        for _s, _p, z in lookup((s, p, None)):
+            if z != o and holds((z, p, o)):
+                return True
+    if p == TYPE:
+        for _s, _p, c in lookup((s, TYPE, None)):
+            if c != o and holds((c, SUBCLASS, o)):
+                return True
+        for q, _d, _o in lookup((None, DOMAIN, o)):
+            if holds((s, q, None)):
+                return True
+        for q, _r, _o in lookup((None, RANGE, o)):
+            if holds((None, q, s)):
+                return True
+    for q, _sp, _p in lookup((None, SUBPROPERTY, p)):
+        if q != p and holds((s, q, o)):
+            return True
+    for _p, _i, q in lookup((p, INVERSE, None)):
+        if holds((o, q, s)):
+            return True
+    for q, _i, _p in lookup((None, INVERSE, p)):
+        if holds((o, q, s)):
+            return True
+    if holds((p, TYPE, SYMMETRIC)) and (o, p, s) != triple and holds((o, p, s)):
+        return True
+    if holds((p, TYPE, TRANSITIVE)):
+        for _s, _p, z in lookup((s, p, None)):
+            if z != o and z != s and holds((z, p, o)):
+                return True
+    return False
+
+
+class Reasoner:
+    """
+    The triples inferred from `db`, kept in the context `context`
+
+    :param db: a graph with contexts, or an
+        :class:`~rdfalchemy.events.ObservableGraph` on one to follow the
+        changes
+    """
+
+    def __init__(self, db, context=INFERRED):
+        if is_remote(db):
+            raise RDFAlchemyError("inference needs a local graph with contexts")
+        self.db = db
+        self.base = db.graph if isinstance(db, ObservableGraph) else db
+        if not hasattr(self.base, 'get_context'):
+            raise RDFAlchemyError(f"inference needs a graph with contexts, not {self.base!r}")
+        self.context = context
+        self.inferred = self.base.get_context(context)
+        self._busy = False
+
+    def __len__(self):
+        return len(self.inferred)
+
+    #
+    # reading and writing the store
+
+    def _lookup(self, pattern):
+        return self.base.triples(pattern)
+
+    def _asserted(self, triple):
+        return any(c.identifier != self.context for c in self.base.contexts(triple))
+
+    def _write(self, event, triple):
+        if event == ADD:
+            self.inferred.add(triple)
+        else:
+            self.inferred.remove(triple)
+        self._notify(event, triple)
+
+    def _notify(self, event, triple):
+        if self.db is not self.base:
+            # the caches of the descriptors follow, this reasoner does not
+            # listen to itself
+            self._busy = True
+            try:
+                self.db.notify(event, triple)
+            finally:
+                self._busy = False
+
+    #
+    # materialization
+
+    def rebuild(self):
+        """
+        Infer everything again from the asserted triples
+        """
+        self.inferred.remove((None, None, None))
+        self._notify(REMOVE, (None, None, None))
+        self._insert(list(self.base.triples((None, None, None))))
+        log.debug("%d triples inferred", len(self.inferred))
+
+    def _insert(self, todo):
+        # semi-naive: each triple taken from todo is joined with the store
+        # which holds every triple found before it
+        while todo:
+            for t in list(_consequences(todo.pop(), self._lookup)):
+                if isinstance(t[0], Literal) or t in self.base:
+                    continue
+                self._write(ADD, t)
+                todo.append(t)
+
+    def added(self, triples):
+        """
+        Chain forward from triples added to the store
+        """
+        triples = list(triples)
+        for t in triples:
+            # asserted now, the store still holds it without the copy
+            if t in self.inferred:
+                self.inferred.remove(t)
+        self._insert(triples)
+
+    def removed(self, triples):
+        """
+        Delete and rederive after triples were removed from the store
+        """
+        removed = {}
+        for t in triples:
+            removed.setdefault(t[1], {})[t] = None
+
+        def old_lookup(pattern):
+            # the store before the removal
+            yield from self._lookup(pattern)
+            s, p, o = pattern
+            for t in list(removed.get(p, ())):
+                if (s is None or s == t[0]) and (o is None or o == t[2]):
+                    yield t
+
+        # overdelete everything that followed from a removed triple
+        todo = [t for ts in removed.values() for t in ts]
+        deleted = []
+        while todo:
+            # the consequences are all found before the store changes
+            for t in list(_consequences(todo.pop(), old_lookup)):
+                if t in removed.get(t[1], ()) or t not in self.inferred or self._asserted(t):
+                    continue
+                removed.setdefault(t[1], {})[t] = None
+                self._write(REMOVE, t)
+                deleted.append(t)
+                todo.append(t)
+        # rederive what still follows from the rest, and chain from it
+        back = [t for ts in removed.values() for t in ts
+                if t not in self.base and _derivable(t, self._lookup)]
+        for t in back:
+            if t not in self.base:
+                self._write(ADD, t)
+        self._insert(back)
+        log.debug("%d inferred triples removed, %d derived again", len(deleted), len(back))
+
+    def notify(self, event, triple):
+        """
+        Follow a change to the graph (a concrete listener of an
+        :class:`~rdfalchemy.events.ObservableGraph`)
+        """
+        if self._busy:
+            return
+        if None in triple:
+            # the triples behind the pattern are gone already
+            log.debug("rebuilding the inferred triples after removing %s", triple)
+            self.rebuild()
+        elif event == ADD:
+            self.added([triple])
+        else:
+            self.removed([triple])
+
+
+def materialize(db, context=INFERRED):
+    """
+    Infer the triples following from `db` into `context`, the first time
+
+    On an :class:`~rdfalchemy.events.ObservableGraph` the inferred triples
+    follow the changes from then on.
+    """
+    reasoner = get_reasoner(db)
+    if reasoner is None:
+        reasoner = Reasoner(db, context)
+        reasoner.rebuild()
+        graph_state(db, 'reasoner', dict)['reasoner'] = reasoner
+        if isinstance(db, ObservableGraph):
+            db.subscribe(reasoner.notify, concrete=True)
+    return reasoner
+
+
+def get_reasoner(db):
+    """
+    The reasoner materializing into `db` or `None`
+    """
+    return graph_state(db, 'reasoner', dict).get('reasoner')
+
+
+def drop_reasoner(db):
+    """
+    Remove the inferred triples and stop following the changes
+    """
+    reasoner = graph_state(db, 'reasoner', dict).pop('reasoner', None)
+    if reasoner is not None:
+        if isinstance(db, ObservableGraph):
+            db.unsubscribe(reasoner.notify)
+        reasoner.inferred.remove((None, None, None))
+
+
+def transitive(db, node, predicate, inverse=False):
+    """
+    `node` and every node it reaches through `predicate` (every node
+    reaching it if `inverse`) read from the materialized triples with one
+    lookup, `None` without a reasoner on `db` or if `predicate` is not
+    transitive
+    """
+    reasoner = get_reasoner(db)
+    if reasoner is None:
+        return None
+    if predicate not in (SUBCLASS, SUBPROPERTY) and (predicate, TYPE, TRANSITIVE) not in reasoner.base:
+        return None
+    if inverse:
+        nodes = reasoner.base.subjects(predicate, node)
+    else:
+        nodes = reasoner.base.objects(node, predicate)
+    return list(dict.fromkeys([node, *nodes]))
@@ -11,6 +11,7 @@ import warnings
 
 from rdfalchemy.rdf_subject import rdfSubject
 from rdfalchemy.descriptors import rdfAbstract
+from rdfalchemy.registry import type_registry
 
 log = logging.getLogger(__name__)
 
@@ -40,6 +41,9 @@ def mapper(*classes):
     """
     if not classes:
         classes = all_sub(rdfSubject)
+    for cl in classes:
+        # picks up an rdf_type set after the class was created
+        type_registry.register(cl)
     class_dict = {str(cl.rdf_type): cl for cl in classes}
     for cl in classes:  # for each class
         for v in cl.__dict__.values():  # for each descriptor
@@ -0,0 +1,326 @@
+# encoding: utf-8
+"""
+query.py
+
+Planning and evaluation of the class queries behind
+:meth:`rdfSubject.filter_by` and :meth:`rdfSubject.get_by`.
+
+:class:`Query` is the chainable form returned by ``MyClass.query``:
+
+.. code-block:: python
+
+    page = Person.query.filter_by(last='Cooper').order_by('first')
+    print(page.count())
+    for p in page.offset(20).limit(10):
+        print(p.first)
+"""
+import heapq
+from itertools import islice
+import logging
+
+from rdflib import RDF, RDFS
+
+from rdfalchemy import store
+
+__all__ = ["Query", "plan", "match_subjects", "count_subjects", "compile_select"]
+
+log = logging.getLogger(__name__)
+
+
+def plan(db, filters):
+    """
+    Order the (pred, obj) filters cheapest first
+
+    :returns: a list of (estimate, (pred, obj)) sorted by the estimated
+        number of subjects matching each filter
+    """
+    estimates = [(store.estimate(db, (None, pred, obj)), i, (pred, obj))
+                 for i, (pred, obj) in enumerate(filters)]
+    estimates.sort()
+    log.debug("Query plan: %s", estimates)
+    return [(est, f) for est, _i, f in estimates]
+
+
+def _where(filters):
+    return " ".join(
+        "?s %s %s ." % (pred.n3(), '?o%d' % i if obj is None else obj.n3())
+        for i, (pred, obj) in enumerate(filters))
+
+
+def compile_select(filters, limit=None, offset=0, order=None, types=None):
+    """
+    Compile (pred, obj) filters to a single SPARQL query selecting ``?s``
+
+    >>> from rdflib import RDF, URIRef, Literal
+    >>> compile_select([(RDF.type, URIRef('urn:A')), (URIRef('urn:p'), Literal('x'))])
+    'SELECT DISTINCT ?s WHERE { ?s <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <urn:A> . ?s <urn:p> "x" . }'
+
+    :param limit: ``LIMIT`` of the query
+    :param offset: ``OFFSET`` of the query
+    :param order: a (pred, reverse) tuple, sort on the value of pred
+    :param types: a (types, subclasses) tuple, only the subjects with one
+        of the types (see :func:`rdfalchemy.store.types_where`)
+    """
+    where = _where(filters)
+    if types:
+        where = (where + " " + store.types_where(*types)).strip()
+    if order:
+        pred, reverse = order
+        where += " OPTIONAL { ?s %s ?sort }" % pred.n3()
+    query = "SELECT DISTINCT ?s WHERE { %s }" % where
+    if order:
+        query += " ORDER BY %s" % (reverse and "DESC(?sort)" or "?sort")
+    if limit is not None:
+        query += " LIMIT %d" % limit
+    if offset:
+        query += " OFFSET %d" % offset
+    return query
+
+
+def match_subjects(db, filters, limit=None, offset=0, order=None, types=None):
+    """
+    Generator over the subjects meeting all (pred, obj) filters
+
+    On a SPARQL endpoint the filters are sent as one ``SELECT DISTINCT``
+    query (see :func:`compile_select`) and the subjects are streamed back.
+
+    On a local graph the most selective filter drives the query.  Every
+    other filter is then applied to the candidates by intersecting with its
+    own subject set when that set is smaller than the candidates, or by a
+    triple lookup per candidate when it is not.  The cost is close to the
+    size of the smallest match set rather than the size of the class.
+
+    :param limit: stop after this many subjects
+    :param offset: skip this many subjects first
+    :param order: a (pred, reverse) tuple, sort on the value of pred
+    :param types: a (types, subclasses) tuple, only the subjects with one
+        of the types as rdf:type (see :func:`rdfalchemy.store.typed_subjects`)
+    """
+    if store.is_remote(db):
+        for (s,) in db.query(compile_select(filters, limit, offset, order, types)):
+            yield s
+        return
+    subjects = _match_local(db, filters, types)
+    if order:
+        subjects = _sort_local(db, subjects, order, limit and offset + limit)
+    stop = None if limit is None else offset + limit
+    yield from islice(subjects, offset, stop)
+
+
+def count_subjects(db, filters, types=None):
+    """
+    The number of subjects meeting all (pred, obj) filters (and `types`,
+    see :func:`match_subjects`)
+
+    Nothing is wrapped in an rdfSubject, a SPARQL endpoint answers with a
+    ``COUNT`` and a single filter on a local graph is counted on the index
+    """
+    if store.is_remote(db):
+        where = _where(filters)
+        if types:
+            where = (where + " " + store.types_where(*types)).strip()
+        query = "SELECT (COUNT(DISTINCT ?s) AS ?n) WHERE { %s }" % where
+        for (n,) in db.query(query):
+            return int(n)
+        return 0
+    if types:
+        return sum(1 for _s in _match_local(db, filters, types))
+    if len(filters) == 1:
+        (pred, obj), = filters
+        if obj is not None:
+            return sum(1 for _triple in db.triples((None, pred, obj)))
+    return sum(1 for _s in _match_local(db, filters))
+
+
+def _sort_local(db, subjects, order, top=None):
+    """
+    subjects sorted on their value of pred, subjects without a value first
+    (as in SPARQL).  Only the first `top` are sorted if given.
+    """
+    pred, reverse = order
+    subjects = list(subjects)
+    values = store.objects_for(db, subjects, pred)
+
+    def key(s):
+        vals = values.get(s)
+        return (1, vals[0]) if vals else (0,)
+    if top is not None:
+        pick = reverse and heapq.nlargest or heapq.nsmallest
+        return pick(top, subjects, key=key)
+    return sorted(subjects, key=key, reverse=reverse)
+
+
+def _match_local(db, filters, types=None):
+    if types:
+        rdf_types, subclasses = types
+        if not filters:
+            yield from store.typed_subjects(db, rdf_types, subclasses)
+            return
+        wanted = set(rdf_types)
+        if subclasses:
+            wanted.update(t for rdf_type in rdf_types
+                          for t in db.transitive_subjects(RDFS.subClassOf, rdf_type))
+        for s in _match_local(db, filters):
+            if any(t in wanted for t in db.objects(s, RDF.type)):
+                yield s
+        return
+    if len(filters) == 1:
+        (pred, obj), = filters
+        yield from dict.fromkeys(db.subjects(pred, obj))
+        return
+    steps = plan(db, filters)
+    _est, (pred, obj) = steps[0]
+    candidates = dict.fromkeys(db.subjects(pred, obj))
+    for est, (pred, obj) in steps[1:]:
+        if not candidates:
+            return
+        if est < len(candidates) and est < store.ESTIMATE_LIMIT:
+            matches = set(db.subjects(pred, obj))
+            candidates = dict.fromkeys(s for s in candidates if s in matches)
+        else:
+            candidates = dict.fromkeys(
+                s for s in candidates if (s, pred, obj) in db)
+    yield from candidates
+
+
+class Query:
+    """
+    Chainable query over the instances of a mapped class
+
+    Each method returns a new Query, nothing is sent to the store until the
+    query is iterated, counted or sliced.  Get one from ``MyClass.query``.
+
+    The instances are those of ``MyClass.ClassInstances()``: the subjects
+    with the rdf:type of the class or, if the class gives them (see
+    ``_instance_types``), one of the types of its subclasses.
+    """
+
+    def __init__(self, cls, filters=None, limit=None, offset=0, order=None, load=(), types=None):
+        self.cls = cls
+        if filters is None:
+            types = cls._instance_types()
+            filters = [] if types else [(RDF.type, cls.rdf_type)]
+        self.filters = filters
+        self.types = types
+        self._limit = limit
+        self._offset = offset
+        self._order = order
+        self._load = load
+
+    def _clone(self, **kwargs):
+        args = dict(filters=self.filters, limit=self._limit, offset=self._offset,
+                    order=self._order, load=self._load, types=self.types)
+        args.update(kwargs)
+        return Query(self.cls, **args)
+
+    def __repr__(self):
+        return f"<Query {self.cls.__name__} {self.filters}>"
+
+    def __call__(self):
+        # MyClass.query() used to return the class itself
+        return self
+
+    def filter_by(self, **kwargs):
+        """
+        Narrow the query with descriptor=value keywords
+        """
+        filters = list(self.filters)
+        for f in self.cls._filters(kwargs):
+            if f not in filters:
+                filters.append(f)
+        return self._clone(filters=filters)
+
+    def get_by(self, **kwargs):
+        return self.cls.get_by(**kwargs)
+
+    def limit(self, limit):
+        """
+        At most `limit` instances
+        """
+        return self._clone(limit=limit)
+
+    def offset(self, offset):
+        """
+        Skip the first `offset` instances
+        """
+        return self._clone(offset=offset)
+
+    def order_by(self, key, reverse=False):
+        """
+        Sort on the value of a descriptor
+
+        :param key: a descriptor of the class or its name
+        :param reverse: sort in descending order
+        """
+        if isinstance(key, str):
+            key = self.cls._get_descriptor(key)
+        return self._clone(order=(key.pred, reverse))
+
+    def load(self, *names):
+        """
+        Eager load the named descriptors (see
+        :meth:`rdfSubject.ClassInstances`)
+        """
+        return self._clone(load=self._load + names)
+
+    def subjects(self):
+        """
+        Generator over the matching nodes
+        """
+        return match_subjects(self.cls.db, self.filters, self._limit,
+                              self._offset, self._order, self.types)
+
+    def __iter__(self):
+        return self.cls._load_instances(self.subjects(), self._load)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("Query slices do not take a step")
+            start = self._offset + (index.start or 0)
+            stop = index.stop
+            limit = self._limit
+            if stop is not None:
+                limit = stop - (index.start or 0)
+                if self._limit is not None:
+                    limit = min(limit, self._limit)
+            return self._clone(offset=start, limit=max(limit, 0) if limit is not None else None)
+        for obj in self[index:index + 1]:
+            return obj
+        raise IndexError(index)
+
+    def all(self):
+        return list(self)
+
+    def first(self):
+        """
+        The first instance or `None`
+        """
+        for obj in self.limit(1):
+            return obj
+        return None
+
+    def count(self):
+        """
+        The number of matching instances, counted in the store
+        """
+        if self._limit is None and not self._offset:
+            return count_subjects(self.cls.db, self.filters, self.types)
+        return sum(1 for _s in self.subjects())
+
+    def exists(self):
+        """
+        True if there is at least one matching instance
+        """
+        for _s in match_subjects(self.cls.db, self.filters, limit=1, types=self.types):
+            return True
+        return False
+
+
+class QueryProperty:
+    """
+    Class attribute returning a fresh :class:`Query` for the class
+    """
+
+    def __get__(self, obj, cls):
+        return Query(cls)
@@ -6,15 +6,19 @@ Requires rdflib <http://www.rdflib.net/> version 2.3 ??.
 
 """
 from functools import total_ordering
+from itertools import chain
 import re
 import logging
-import warnings
 
 from rdflib import ConjunctiveGraph
 from rdflib import BNode, RDF, URIRef
 from rdflib.term import Identifier
 from rdfalchemy.exceptions import RDFAlchemyError
 from rdfalchemy.literal import Literal
+from rdfalchemy import store
+from rdfalchemy.identity import identity_map
+from rdfalchemy.query import match_subjects, QueryProperty
+from rdfalchemy.registry import type_registry
 
 log = logging.getLogger(__name__)
 
@@ -24,6 +28,98 @@ re_ns_n = re.compile('(.*[/#])(.*)')
 # Note: Non data descriptors (get only) lookup in obj.__dict__ first
 #       Data descriptors (get and set) use the __get__ first
 
+# the nodes a cascade may delete
+_CASCADE_KINDS = {
+    'none': (),
+    'bnode': (BNode,),
+    'all': (BNode, URIRef),
+}
+
+
+def _cascade(db, roots, cleared, cascade, keep=()):
+    """
+    The closure of nodes deleted along with `roots`
+
+    A node is deleted when it is of a kind deleted by `cascade` and every
+    triple referencing it goes away: its subject is deleted or its
+    (subject, predicate) is in `cleared`.  The references of each node are
+    looked up once.  A node still referenced is parked and checked again
+    when no other work is left, another node deleted later may have been
+    its last reference.  No recursion, so long lists and deep trees are ok.
+
+    :param roots: nodes whose triples are all removed
+    :param cleared: (subject, predicate) pairs whose triples are removed
+    :param keep: nodes never deleted (e.g. referenced by triples about
+        to be added)
+    :returns: the set of deleted nodes, `roots` included, and the triples
+        leading to the deleted blank nodes
+    """
+    kinds = _CASCADE_KINDS[cascade]
+    deleted = set(roots)
+    links = []
+    if not kinds:
+        return deleted, links
+    cleared = set(cleared)
+    keep = set(keep)
+    todo = [o for s, p in cleared for o in db.objects(s, p)]
+    for node in deleted:
+        todo.extend(db.objects(node, None))
+    refs = {}
+    parked = set()
+
+    def unreferenced(node):
+        return all(s in deleted or (s, p) in cleared for s, p in refs[node])
+
+    while todo:
+        node = todo.pop()
+        if node not in deleted and node not in keep and isinstance(node, kinds):
+            if node not in refs:
+                refs[node] = list(db.subject_predicates(node))
+            if unreferenced(node):
+                deleted.add(node)
+                parked.discard(node)
+                if isinstance(node, BNode):
+                    links.extend((s, p, node) for s, p in refs[node])
+                todo.extend(db.objects(node, None))
+            else:
+                parked.add(node)
+        if not todo:
+            todo = [node for node in parked if unreferenced(node)]
+    return deleted, links
+
+
+def _apply_cascading(db, removes=(), adds=(), roots=(), cleared=(), cascade='bnode', anchors=()):
+    """
+    Remove then add triples in one batch (see
+    :func:`rdfalchemy.store.apply_changes`, which takes the `anchors`)
+    together with the nodes deleted by the cascade from `roots` and
+    `cleared` (see :func:`_cascade`).  What the added triples point to is
+    kept.
+
+    :returns: the set of deleted nodes
+    """
+    adds = list(adds)
+    nodes, links = _cascade(db, roots, cleared, cascade, keep=[o for _s, _p, o in adds])
+    removes = list(removes)
+    if store.is_remote(db):
+        # a SPARQL endpoint finds a blank node through the triples leading
+        # to it (see rdfalchemy.sparql.anchored_update), without wildcard
+        # so that an insert along goes in once
+        removes.extend(links)
+        removes.extend(triple for node in nodes if isinstance(node, BNode)
+                       for triple in db.triples((node, None, None)))
+        nodes_left = [node for node in nodes if not isinstance(node, BNode)]
+    else:
+        nodes_left = nodes
+    removes.extend((node, None, None) for node in nodes_left)
+    store.apply_changes(db, removes, adds, anchors)
+    # a later wrap of the nodes starts afresh
+    idmap = identity_map(db)
+    for node in nodes:
+        idmap.discard(node)
+    return nodes
+
+
 #
 # define our Base Class for all "subjects" in python
 #
@@ -48,7 +144,69 @@ class rdfSubject:
     # rdf:type of instances of this class
     rdf_type = None
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        type_registry.register(cls)
+
+    def __new__(cls, resUri=None, **kwargs):
+        # wrapping a node again gives back the live instance for it
+        # (see rdfalchemy.identity)
+        if isinstance(resUri, rdfSubject):
+            node, db = resUri.resUri, resUri.db
+        else:
+            node, db = cls._parse_node(resUri), cls.db
+        if node is not None:
+            obj = identity_map(db).get(cls, node)
+            if obj is not None:
+                obj._rewrapped()
+                return obj
+        return super().__new__(cls)
+
     def __init__(self, resUri=None, **kwargs):
+        # an instance from the identity map is already set up
+        if 'resUri' not in self.__dict__:
+            self._setup(resUri)
+            identity_map(self.db).add(type(self), self.resUri, self)
+        if kwargs:
+            self._set_with_dict(kwargs)
+
+    def _rewrapped(self):
+        """
+        This instance is given back for a new wrap of its node: the values
+        cached on it are kept if obj.db keeps versions (see
+        :class:`~rdfalchemy.events.ObservableGraph`), a stale one is dropped
+        when read, otherwise they are read again from the store
+        """
+        if getattr(self.db, 'version', None) is None and not identity_map(self.db).is_loading(self):
+            self._expire()
+
+    def _expire(self):
+        """
+        Drop the values cached by the descriptors on this instance
+        """
+        for kls in type(self).mro():
+            for descriptor in kls.__dict__.values():
+                if not isinstance(descriptor, type) and hasattr(descriptor, '_drop_cache'):
+                    descriptor._drop_cache(self)
+
+    @staticmethod
+    def _parse_node(resUri):
+        """
+        The BNode or URIRef for the resUri argument of the constructor,
+        `None` if a new BNode is needed (or it cannot be parsed)
+        """
+        if not resUri:
+            return None
+        if isinstance(resUri, (BNode, URIRef)):
+            return resUri
+        if isinstance(resUri, str):
+            if resUri[0] == "<" and resUri[-1] == ">":
+                return URIRef(resUri[1:-1])
+            elif resUri.startswith("_:"):
+                return BNode(resUri[2:])
+        return None
+
+    def _setup(self, resUri):
         if not resUri:  # create a bnode
             self.resUri = BNode()
             if self.rdf_type:
@@ -64,11 +222,10 @@ class rdfSubject:
             self.resUri = resUri.resUri
             self.db = resUri.db
 
-        elif isinstance(resUri, (str, str)):  # create one from a <uri> or
-            if resUri[0] == "<" and resUri[-1] == ">":  # _:bnode string
-                self.resUri = URIRef(resUri[1:-1])
-            elif resUri.startswith("_:"):
-                self.resUri = BNode(resUri[2:])
+        elif isinstance(resUri, str):  # create one from a <uri> or
+            node = self._parse_node(resUri)   # _:bnode string
+            if node is not None:
+                self.resUri = node
 
             if self.rdf_type:
                 self.db.add((self.resUri, RDF.type, self.rdf_type))
@@ -76,9 +233,6 @@ class rdfSubject:
         else:
             raise AttributeError(f"cannot construct rdfSubject from {resUri}")
 
-        if kwargs:
-            self._set_with_dict(kwargs)
-
     def n3(self):
         """
         n3 repr of this node
@@ -98,11 +252,9 @@ class rdfSubject:
                 return kls.__dict__[key]
         raise AttributeError(f"descriptor {key} not found for class {cls}")
 
-    # short term hack.  Need to go to a sqlalchemy 0.4 style query method
-    # obj.query.get_by should map to obj.get_by  ..same for fetch_by
-    @classmethod
-    def query(cls):
-        return cls
+    # sqlalchemy style query: MyClass.query.filter_by(...).limit(10)
+    # see rdfalchemy.query.Query
+    query = QueryProperty()
 
     @classmethod
     def get_by(cls, **kwargs):
@@ -123,27 +275,86 @@ class rdfSubject:
         if len(kwargs) != 1:
             raise ValueError(f"get_by wanted exactly 1 but got {len(kwargs)} args\nMaybe you wanted filter_by")
         key, value = next(iter(kwargs.items()))
-        if isinstance(value, (URIRef, BNode, Literal)):
-            o = value
-        else:
-            o = Literal(value)
-        pred = cls._get_descriptor(key).pred
-        uri = cls.db.value(None, pred, o)
+        uri = next(match_subjects(cls.db, cls._filters(kwargs), limit=1), None)
         if uri:
             return cls(uri)
         else:
             raise LookupError(f"{key} = {value} not found")
 
     @classmethod
-    def filter_by(cls, **kwargs):
-        """Class method returns a generator over classs instances
-        meeting the kwargs conditions.
+    def bulk_create(cls, rows, fields=None, chunk_size=store.DEFAULT_BATCH_SIZE):
+        """
+        Class method that writes many new instances of this class to the
+        store at once.  Returns the number of rows.
 
-        Each keyword must be a class descriptor
+        No instances are built and nothing is looked up: the triples are
+        generated row by row and sent to the store in chunks (one `addN`
+        locally, one INSERT DATA or transaction of whole rows per about
+        `chunk_size` triples on a SPARQL or sesame store, see
+        :func:`rdfalchemy.store.add_rows`)
 
-        filter by RDF.type == cls.rdf_type is implicit
+        .. code-block:: python
+
+            Company.bulk_create(
+                (row for row in csv.reader(feed)),
+                fields=['symbol', 'companyName', 'industry'])
+
+        :param rows: dicts of {descriptor name: value} or tuples of values
+            named by `fields`.  A `resUri` entry gives the node as for the
+            constructor, without it a BNode is made
+        :param fields: the descriptor names for tuple rows
+
+        The names in `fields`, or else those of the first row, are checked
+        before anything is written.  A later row with an unknown name, a
+        `resUri` that cannot be parsed or a value its descriptor refuses
+        (e.g. a list for an rdfSingle) raises when its chunk is built, the
+        chunks before it are written.  The values are written as the
+        descriptors set them (an rdfLocale tags a string with its language).
+        """
+        count = 0
+        descriptors = {}
+
+        def descriptor(key):
+            try:
+                return descriptors[key]
+            except KeyError:
+                found = descriptors[key] = cls._get_descriptor(key)
+                return found
+
+        def row_triples(rows):
+            nonlocal count
+            for row in rows:
+                count += 1
+                if fields is not None:
+                    row = dict(zip(fields, row))
+                node = None
+                if row.get('resUri'):
+                    node = cls._parse_node(row['resUri'])
+                    if node is None:
+                        raise AttributeError(f"cannot construct rdfSubject from {row['resUri']}")
+                node = node or BNode()
+                triples = []
+                if cls.rdf_type:
+                    triples.append((node, RDF.type, cls.rdf_type))
+                for key, value in row.items():
+                    if key != 'resUri':
+                        triples.extend(descriptor(key)._triples(node, value))
+                yield triples
+
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+        for key in (fields if fields is not None else first):
+            if key != 'resUri':
+                descriptor(key)
+        store.add_rows(cls.db, row_triples(chain([first], rows)), chunk_size)
+        return count
 
-        Order helps, the first keyword should be the most restrictive
+    @classmethod
+    def _filters(cls, kwargs):
+        """
+        (pred, obj) pairs for the descriptor=value keywords in kwargs
         """
         filters = []
         for key, value in kwargs.items():
@@ -151,47 +362,144 @@ class rdfSubject:
             # try to make the value be OK for the triple query as an object
             if isinstance(value, Identifier):
                 obj = value
+            elif isinstance(value, rdfSubject):
+                obj = value.resUri
             else:
                 obj = Literal(value)
             filters.append((pred, obj))
-        # make sure we filter by type
-        if not (RDF.type, cls.rdf_type) in filters:
-            filters.append((RDF.type, cls.rdf_type))
-        pred, obj = filters[0]
-        log.debug("Checking %s, %s", pred, obj)
-        for sub in cls.db.subjects(pred, obj):
-            log.debug("maybe %s", sub)
-            for pred, obj in filters[1:]:
-                log.debug("Checking %s, %s", pred, obj)
-                try:
-                    cls.db.triples((sub, pred, obj)).next()
-                except:
-                    warnings.warn(f"No {sub}")
-                    break
-            else:
-                yield cls(sub)
+        return filters
+
+    @classmethod
+    def filter_by(cls, load=None, **kwargs):
+        """Class method returns a generator over classs instances
+        meeting the kwargs conditions.
+
+        Each keyword must be a class descriptor
+
+        filter by RDF.type == cls.rdf_type is implicit
+
+        The order of the keywords does not matter, the most selective
+        filter is picked from estimates of the store.  On a SPARQL
+        endpoint all the filters go to the store as a single query (see
+        :func:`rdfalchemy.query.match_subjects`)
+
+        :param load: optional list of descriptor names to eager load
+            for the instances returned (see :meth:`ClassInstances`)
+        """
+        query = cls.query.filter_by(**kwargs)
+        if load:
+            query = query.load(*load)
+        return iter(query)
 
     @classmethod
-    def ClassInstances(cls):
+    def count(cls, **kwargs):
+        """
+        Class method returns the number of instances meeting the kwargs
+        conditions (all instances if none given).  The counting is done by
+        the store, no instances are built.
+        """
+        return cls.query.filter_by(**kwargs).count()
+
+    @classmethod
+    def exists(cls, **kwargs):
+        """
+        Class method returns True if there is an instance meeting the
+        kwargs conditions
+        """
+        return cls.query.filter_by(**kwargs).exists()
+
+    @classmethod
+    def ClassInstances(cls, load=None):
         """
         return a generator for instances of this rdf:type
         you can look in MyClass.rdf_type to see the predicate being used
+
+        :param load: optional list of descriptor names to eager load.
+            The values are fetched for a whole batch of instances at once
+            and cached on each instance before it is yielded e.g.:
+
+            .. code-block:: python
+
+                for p in Person.ClassInstances(load=['last', 'knows']):
+                    print(p.last)  # no further call to the store
+        """
+        return cls._load_instances(cls._distinct_subjects(), load)
+
+    @classmethod
+    def _instance_types(cls):
+        """
+        (types, subclasses) for :func:`rdfalchemy.store.typed_subjects`
+        when the instances are not just the subjects of cls.rdf_type,
+        `None` here
+        """
+        return None
+
+    @classmethod
+    def _distinct_subjects(cls):
+        """
+        generator over the distinct subjects of this rdf:type
         """
         been_there = set()
         for i in cls.db.subjects(RDF.type, cls.rdf_type):
             log.info('ClassInstances: %s, seen: %s', i, i in been_there)
             if i not in been_there:
-                yield cls(i)
+                yield i
                 been_there.add(i)
 
+    @classmethod
+    def wrap_many(cls, nodes):
+        """
+        instances of cls for all of nodes, like ``[cls(node) for node in nodes]``
+        """
+        return [cls(node) for node in nodes]
+
+    @classmethod
+    def _from_typed(cls, node):
+        """
+        an instance for a node the store already knows to be a cls.rdf_type
+
+        skips the rdf:type lookup done by `__init__`
+        """
+        idmap = identity_map(cls.db)
+        obj = idmap.get(cls, node)
+        if obj is None:
+            obj = cls.__new__(cls)
+            obj.resUri = node
+            idmap.add(cls, node, obj)
+        else:
+            obj._rewrapped()
+        return obj
+
+    @classmethod
+    def _load_instances(cls, nodes, load=None):
+        """
+        generator over instances of cls built from nodes
+
+        :param load: descriptor names whose values are prefetched one batch
+            of instances at a time (see :func:`rdfalchemy.store.batch_size`)
+        """
+        if not load:
+            for node in nodes:
+                yield cls._from_typed(node)
+            return
+        descriptors = [cls._get_descriptor(key) for key in load]
+        for batch in store.batched(nodes, store.batch_size(cls.db, scan=True)):
+            instances = [cls._from_typed(node) for node in batch]
+            with identity_map(cls.db).loading(instances):
+                for descriptor in descriptors:
+                    descriptor._prefetch(instances)
+            yield from instances
+
     @classmethod
     def GetRandom(cls):
         """
         for develoment just returns a random instance of this class
+
+        counts the instances in the store and fetches the one at a random
+        offset, so no more than one instance is built
         """
-        from random import choice
-        xii = list(cls.ClassInstances())
-        return choice(xii)
+        from random import randrange
+        return cls.query[randrange(cls.count())]
 
     def __hash__(self):
         return hash("ranD0Mi$h_" + self.n3())
@@ -225,13 +533,11 @@ class rdfSubject:
 
     def __delitem__(self, pred):
         log.debug("Deleting with __delitem__ %s for %s", pred, self)
-        for s, p, o in self.db.triples((self.resUri, pred, None)):
-            self.db.remove((s, p, o))
-            # finally if the object in the triple was a bnode
-            # cascade delete the thing it referenced
-            # ?? FIXME Do we really want to cascade if it's an rdfSubject??
-            if isinstance(o, (BNode, rdfSubject)):
-                rdfSubject(o)._remove(db=self.db, cascade='bnode')
+        # if an object of pred is a bnode no longer referenced
+        # cascade delete the thing it referenced
+        # ?? FIXME Do we really want to cascade if it's an rdfSubject??
+        _apply_cascading(self.db, removes=[(self.resUri, pred, None)],
+                         cleared=[(self.resUri, pred)])
 
     def _set_with_dict(self, kv):
         """
@@ -279,40 +585,12 @@ class rdfSubject:
             for s, p, o in db.triples((None, None, node_ref)):
                 raise RDFAlchemyError(f"Cannot delete BNode {node_ref.n3()} because {s.n3()} still references it")
 
-        # determine an appropriate test for cascade decisions
-        if cascade == 'bnode':
-            # we cannot delete a bnode if there are still references to it
-            def test(node):
-                if isinstance(node, (URIRef, Literal)):
-                    return False
-                for _triple in db.triples((None, None, node)):
-                    return False
-                return True
-        elif cascade == 'none':
-            def f1(node):
-                return False
-
-            test = f1
-        elif cascade == 'all':
-            def f2(node):
-                if isinstance(node, Literal):
-                    return False
-                for s, p, o in db.triples((None, None, node)):
-                    return False
-                return True
-
-            test = f2
-        else:
+        if cascade not in _CASCADE_KINDS:
             raise AttributeError("unknown cascade argument")
 
-        for s, p, o in db.triples((node_ref, None, None)):
-            db.remove((s, p, o))
-            if test(o):
-                rdfSubject(o)._remove(db=db, cascade=cascade)
-
-        if object_cascade:
-            for s, p, o in db.triples((None, None, node_ref)):
-                db.remove((s, p, o))
+        # every node to delete first, then all their triples in one batch
+        removes = [(None, None, node_ref)] if object_cascade else []
+        _apply_cascading(db, removes, roots=[node_ref], cascade=cascade)
 
     def _rename(self, name, db=None):
         """
@@ -322,13 +600,33 @@ class rdfSubject:
             db = self.db
         if not (isinstance(name, (BNode, URIRef))):
             raise AttributeError(f"cannot rename to {name}")
-        for s, p, o in db.triples((self.resUri, None, None)):
-            db.remove((s, p, o))
-            db.add((name, p, o))
-        for s, p, o in db.triples((None, None, self.resUri)):
-            db.set((s, p, name))
+        self.bulk_rename({self.resUri: name}, db=db)
+        # self may live in the identity map of another graph
         self.resUri = name
 
+    @classmethod
+    def bulk_rename(cls, mapping, db=None, chunk_size=store.DEFAULT_BATCH_SIZE, progress=None):
+        """
+        Class method that renames many nodes at once, for URI migrations
+
+        Every triple with an old node as subject or object is rewritten
+        (see :func:`rdfalchemy.store.rename_nodes`, one update request per
+        chunk on a SPARQL endpoint) and the live instances of the old nodes
+        follow their new node.
+
+        :param mapping: a dict of {old: new} BNodes or URIRefs
+        :param db: the graph, defaults to cls.db
+        :param progress: called as `progress(done, total)` after each chunk
+        """
+        if db is None:
+            db = cls.db
+        for new in mapping.values():
+            if not isinstance(new, (BNode, URIRef)):
+                raise AttributeError(f"cannot rename to {new}")
+        store.rename_nodes(db, mapping, chunk_size, progress)
+        for obj, new in identity_map(db).rename(mapping):
+            obj.resUri = new
+
     def _ppo(self, db=None):
         """
         Like pretty print...
@@ -12,14 +12,18 @@ Copyright (c) 2008 Openvest. All rights reserved.
 """
 import re
 import logging
-from weakref import WeakValueDictionary
 
 from rdflib.term import Identifier
 
 from rdfalchemy import rdfSubject, RDF, RDFS, BNode, URIRef
+from rdfalchemy import store
+from rdfalchemy.closure import get_closure
 from rdfalchemy.descriptors import rdfSingle, rdfMultiple, owlTransitive
+from rdfalchemy.identity import identity_map
+from rdfalchemy.inference import get_reasoner, transitive
 from rdfalchemy.namespaces import OWL
 from rdfalchemy.orm import mapper, all_sub
+from rdfalchemy.registry import type_registry
 
 log = logging.getLogger(__name__)
 
@@ -32,9 +36,8 @@ re_ns_n = re.compile(r'(.*[/#])(.*)')
 
 
 class rdfsSubject(rdfSubject, Identifier):
-    _weakrefs = WeakValueDictionary()
 
-    def __new__(cls, resUri=None, schemaGraph=None, *args, **kwargs):
+    def __new__(cls, resUri=None, schemaGraph=None, *args, rdf_types=None, **kwargs):
         #  create a bnode
         if not resUri or isinstance(resUri, BNode) or issubclass(cls, BNode):
             obj = BNode.__new__(cls, resUri)
@@ -59,37 +62,41 @@ class rdfsSubject(rdfSubject, Identifier):
             raise AttributeError(
                 "cannot construct rdfSubject from %s" % (str(resUri)))
 
-        # At this point we have an obj to return...but we might want to look
-        # deeper if there is an RDF:type entry on the Graph, find the mapped
-        # subclass and return an object of that new type
-        if resUri:
-            rdf_type = obj[RDF.type]
-            if rdf_type:
-                class_dict = dict(
-                    [(str(cl.rdf_type), cl)
-                     for cl in all_sub(cls) if cl.rdf_type])
-                subclass = class_dict.get(str(rdf_type.resUri), cls)
-            else:
-                subclass = cls
-        else:
-            subclass = cls
-
-        # improve this do do some kind of hash with classname??
-        # this uses _weakrefs to allow us to return an existing object
-        # rather than copies
-        md5id = obj.n3()
-        new_obj = rdfsSubject._weakrefs.get(md5id, None)
-        log.debug("looking for weakref %s found %s", md5id, new_obj)
-        if new_obj:
+        # an existing object rather than a copy, before any lookup in the
+        # graph.  The key is the plain node, an rdfsSubject is not equal to
+        # the URIRef with the same value
+        idmap = identity_map(cls.db)
+        node = obj.resUri
+        new_obj = idmap.get(rdfsSubject, node)
+        log.debug("looking for %s in the identity map found %s", node, new_obj)
+        if new_obj is not None:
+            new_obj._rewrapped()
             return new_obj
-        new_obj = super(rdfSubject, obj).__new__(subclass, obj.resUri)
-        log.debug("add a weakref %s", new_obj)
+
+        # At this point we have an obj to return...but we might want to look
+        # deeper if there are rdf:type entries on the Graph, find the mapped
+        # subclass and return an object of that new type.  The caller may
+        # already know the types (rdf_types), saving the lookup
+        if rdf_types is None:
+            rdf_types = list(cls.db.objects(node, RDF.type)) if resUri else []
+        subclass = type_registry.resolve(cls, rdf_types)
+
+        new_obj = super(rdfSubject, obj).__new__(subclass, node)
+        log.debug("add %s to the identity map", new_obj)
         new_obj._nodetype = obj._nodetype
-        rdfsSubject._weakrefs[new_obj.n3()] = new_obj
+        # for __init__, no need to look again
+        new_obj._rdf_types = rdf_types
+        idmap.add(rdfsSubject, node, new_obj)
         return new_obj
 
-    def __init__(self, resUri=None, **kwargs):
-        if not self[RDF.type] and self.rdf_type:
+    def __init__(self, resUri=None, rdf_types=None, **kwargs):
+        if rdf_types is None:
+            rdf_types = self.__dict__.pop('_rdf_types', None)
+        else:
+            self.__dict__.pop('_rdf_types', None)
+        if rdf_types is None:
+            rdf_types = list(self.db.objects(self.resUri, RDF.type))
+        if not rdf_types and self.rdf_type:
             self.db.add((self.resUri, RDF.type, self.rdf_type))
         if kwargs:
             self._set_with_dict(kwargs)
@@ -98,43 +105,117 @@ class rdfsSubject(rdfSubject, Identifier):
     def resUri(self):
         return self._nodetype(self)
 
+    @classmethod
+    def _from_typed(cls, node):
+        # __new__ picks the mapped subclass, it needs the lookup
+        return cls(node)
+
+    @classmethod
+    def wrap_many(cls, nodes):
+        """
+        instances for all of nodes, each of the subclass mapped to its
+        rdf:type like ``cls(node)``
+
+        The rdf:type of every node is read at once (a VALUES query on a
+        SPARQL endpoint, one sweep of the type triples of a large local
+        graph) rather than once per node
+        """
+        nodes = [node.resUri if isinstance(node, rdfSubject) else node for node in nodes]
+        types = store.objects_for(cls.db, list(dict.fromkeys(nodes)), RDF.type)
+        return [cls(node, rdf_types=types.get(node, [])) for node in nodes]
+
     def _split_name(self):
         return re.match(r'(.*[/#])(.*)', self.resUri).groups()
 
     @classmethod
-    def ClassInstances(cls):
+    def _instance_types(cls):
+        """
+        (types, subclasses) for :func:`rdfalchemy.store.typed_subjects`:
+        the rdf:type of cls and of its python subclasses, with the
+        subclasses in the db unless the reasoner or the closure index
+        already gives them
+        """
+        if not cls.rdf_type:
+            return None
+        types = [cls.rdf_type]
+        types.extend(sorted(sub.rdf_type for sub in all_sub(cls) if sub.rdf_type))
+        index = get_closure(cls.db, RDFS.subClassOf)
+        if get_reasoner(cls.db) is not None:
+            # the instances of the db subclasses have the type too
+            return types, False
+        if index is not None and not store.is_remote(cls.db):
+            types.extend(t for rdf_type in list(types) for t in index.descendants(rdf_type))
+            return types, False
+        return types, True
+
+    @classmethod
+    def ClassInstances(cls, load=None):
         """
         return a generator for instances of this rdf:type
         you can look in MyClass.rdf_type to see the predicate being used
+
+        Instances of the python subclasses and of the subclasses in the
+        db (rdfs:subClassOf) are included, each once, with one pass over
+        the store.  Each is an instance of the python class mapped to its
+        rdf:type (see :meth:`wrap_many`)
+
+        :param load: optional list of descriptor names to eager load (see
+            :meth:`rdfalchemy.rdfSubject.rdfSubject.ClassInstances`)
         """
-        # Start with all things of "my" type in the db
-        been_there = set()
-        for i in cls.db.subjects(RDF.type, cls.rdf_type):
-            if i not in been_there:
-                yield cls(i)
-                been_there.add(i)
-
-        # for all subclasses of me in python do the same (recursivly)
-        py_sub_classes = all_sub(cls)
-        for sub in py_sub_classes:
-            for i in sub.ClassInstances():
-                if i not in been_there:
-                    yield i
-                    been_there.add(i)
-
-        # not done yet, for all db subclasses that I have not processed
-        # already...get them too
-        db_sub_classes = rdfsClass(cls.rdf_type).transitive_subClasses
-        more_sub_classes = [
-            dbsub.resUri for dbsub in db_sub_classes
-            if dbsub.resUri not in [
-                pysub.rdf_type for pysub in py_sub_classes]]
-        for sub in more_sub_classes:
-            for i in cls.db.subjects(RDF.type, sub):
-                # akm: TODO: unreachable?
-                if '' and i not in been_there:
-                    yield i
-                    been_there.add(i)
+        types = cls._instance_types()
+        if types is None:
+            nodes = cls._distinct_subjects()
+        else:
+            nodes = store.typed_subjects(cls.db, *types)
+        descriptors = [cls._get_descriptor(key) for key in load or ()]
+        # bounded batches keep the memory flat, locally small enough for
+        # the types to come from index lookups unless the batch is read
+        # with a scan of each predicate to load
+        for batch in store.batched(nodes, store.batch_size(cls.db, scan=bool(descriptors))):
+            instances = cls.wrap_many(batch)
+            with identity_map(cls.db).loading(instances):
+                for descriptor in descriptors:
+                    descriptor._prefetch(instances)
+            yield from instances
+
+
+class _DomainIndex:
+    """
+    {class: [properties]} read from the rdfs:domain triples of a graph with
+    one call, read again after a change to them (on an
+    :class:`~rdfalchemy.events.ObservableGraph`)
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._domains = None
+
+    def properties(self, cls):
+        if self._domains is None:
+            self._domains = {}
+            for prop, domain in self.db.subject_objects(RDFS.domain):
+                self._domains.setdefault(domain, []).append(prop)
+        return self._domains.get(cls, ())
+
+    def notify(self, event, triple):
+        if triple[1] is None or triple[1] == RDFS.domain:
+            self._domains = None
+
+
+def _make_domain_index(db):
+    index = _DomainIndex(db)
+    db.subscribe(index.notify)
+    return index
+
+
+def _domain_index(db):
+    """
+    The domain index of db, kept with a local graph that tells about
+    changes, otherwise `None`
+    """
+    if hasattr(db, 'subscribe') and not store.is_remote(db):
+        return store.graph_state(db, 'domains', lambda: _make_domain_index(db))
+    return None
 
 
 class rdfsClass(rdfsSubject):
@@ -148,8 +229,18 @@ class rdfsClass(rdfsSubject):
     label = rdfSingle(RDFS.label)
     subClassOf = rdfMultiple(RDFS.subClassOf, range_type=RDFS.Class)
 
+    # both read the triples materialized by a reasoner (see
+    # rdfalchemy.inference) or use the closure index of rdfs:subClassOf if
+    # there is one (see rdfalchemy.closure)
+
     @property
     def transitive_subClassOf(self):
+        nodes = transitive(self.db, self.resUri, RDFS.subClassOf)
+        if nodes is not None:
+            return [rdfsClass(s) for s in nodes]
+        index = get_closure(self.db, RDFS.subClassOf)
+        if index is not None:
+            return [rdfsClass(s) for s in index.ancestors(self.resUri)]
         return [
             rdfsClass(s)
             for s in self.db.transitive_objects(
@@ -157,6 +248,12 @@ class rdfsClass(rdfsSubject):
 
     @property
     def transitive_subClasses(self):
+        nodes = transitive(self.db, self.resUri, RDFS.subClassOf, inverse=True)
+        if nodes is not None:
+            return [rdfsClass(s) for s in nodes]
+        index = get_closure(self.db, RDFS.subClassOf)
+        if index is not None:
+            return [rdfsClass(s) for s in index.descendants(self.resUri)]
         return [
             rdfsClass(s)
             for s in self.db.transitive_subjects(
@@ -164,11 +261,27 @@ class rdfsClass(rdfsSubject):
 
     @property
     def properties(self):
-        # this doesn't get the rdfsProperty subclasses
-        # return items(rdfsProperty.filter_by(domain=self.resUri))
-        # TODO: why iterate all rdfsProperty subclasses
-        #       try self.db.subjects(RDFS.domain,self.resUri)
-        return [x for x in rdfsProperty.ClassInstances() if x.domain == self]
+        return self.get_properties()
+
+    def get_properties(self, inherited=False):
+        """
+        The properties with this class as rdfs:domain, from the domain index
+        of the graph (see :func:`_domain_index`) or, without one, looked up
+        for these classes only
+
+        :param inherited: also the properties of the classes this one is
+            an rdfs:subClassOf
+        """
+        index = _domain_index(self.db)
+        classes = [cl.resUri for cl in (self.transitive_subClassOf if inherited else [self])]
+        if index is not None:
+            found = {cl: index.properties(cl) for cl in classes}
+        else:
+            found = store.subjects_for(self.db, classes, RDFS.domain)
+        nodes = list(dict.fromkeys(p for cl in classes for p in found.get(cl, ())))
+        # anything with a domain is a property, no rdf:type is added
+        types = store.objects_for(self.db, nodes, RDF.type)
+        return [rdfsProperty(node, rdf_types=types.get(node) or [RDF.Property]) for node in nodes]
 
     def _emit_rdfSubject(self, visitedNS=None, visitedClass=None):
         """
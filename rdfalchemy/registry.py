@@ -0,0 +1,100 @@
+# encoding: utf-8
+"""
+registry.py
+
+rdf:type -> python class registry used to pick the class of an instance
+from the types of its node (see :meth:`rdfalchemy.rdfsSubject.rdfsSubject.__new__`).
+
+Each subclass of :class:`~rdfalchemy.rdfSubject.rdfSubject` is registered
+when it is created and again by :func:`~rdfalchemy.orm.mapper`, so a change
+to the `rdf_type` of an existing class is picked up by calling `mapper()`.
+Choosing the class for a set of types is worked out once and kept until
+the registry changes.
+"""
+from itertools import count
+import logging
+import weakref
+
+__all__ = ["TypeRegistry", "type_registry"]
+
+log = logging.getLogger(__name__)
+
+
+class TypeRegistry:
+    """
+    {str(rdf_type): [classes]} with the classes held weakly
+    """
+
+    def __init__(self):
+        # str(rdf_type) -> {weakref(cls): registration number}
+        self._by_type = {}
+        # cls -> str(rdf_type) it is registered under
+        self._types = weakref.WeakKeyDictionary()
+        # (weakref(base), frozenset(types)) -> weakref(cls), a class
+        # collected clears it
+        self._resolved = {}
+        self._counter = count()
+
+    def register(self, cls):
+        """
+        (Re)register cls under its current `rdf_type`
+        """
+        rdf_type = str(cls.rdf_type) if cls.rdf_type else None
+        if rdf_type is not None and self._types.get(cls) == rdf_type:
+            return
+        self.unregister(cls)
+        if rdf_type is None:
+            return
+        self._types[cls] = rdf_type
+        self._by_type.setdefault(rdf_type, {})[weakref.ref(cls, self._collected)] = next(self._counter)
+        self._resolved.clear()
+
+    def unregister(self, cls):
+        rdf_type = self._types.pop(cls, None)
+        if rdf_type is not None:
+            self._by_type.get(rdf_type, {}).pop(weakref.ref(cls), None)
+            self._resolved.clear()
+
+    def _collected(self, ref):
+        for classes in self._by_type.values():
+            classes.pop(ref, None)
+        self._resolved.clear()
+
+    def classes_for(self, rdf_type):
+        """
+        The classes registered for `rdf_type`, oldest first
+        """
+        classes = self._by_type.get(str(rdf_type), {})
+        return [cls for cls in (ref() for ref in sorted(classes, key=classes.get))
+                if cls is not None]
+
+    def resolve(self, base, rdf_types):
+        """
+        The class to build for a node of `rdf_types` asked for as `base`
+
+        The most derived of the subclasses of `base` (itself included)
+        registered for one of the types.  Between classes where neither
+        derives from the other the one of the smallest type IRI wins, then
+        the one registered first, whatever the order of `rdf_types`.
+        Without one `base` is returned.
+        """
+        key = (weakref.ref(base, self._collected), frozenset(str(t) for t in rdf_types))
+        found = self._resolved.get(key)
+        found = found() if found is not None else None
+        if found is None:
+            candidates = []
+            for rdf_type in sorted(key[1]):
+                for cls in self.classes_for(rdf_type):
+                    if issubclass(cls, base) and cls not in candidates:
+                        candidates.append(cls)
+            most_derived = [cls for cls in candidates
+                            if not any(other is not cls and issubclass(other, cls)
+                                       for other in candidates)]
+            found = most_derived[0] if most_derived else base
+            if len(most_derived) > 1:
+                log.debug("types %s match %s, using %s", sorted(key[1]), most_derived, found)
+            self._resolved[key] = weakref.ref(found)
+        return found
+
+
+type_registry = TypeRegistry()
@@ -1,5 +1,5 @@
 import os
-from rdfalchemy import rdfSingle, rdfMultiple
+from rdfalchemy import rdfSingle, rdfMultiple, rdfCount, rdfMax
 from rdfalchemy.namespaces import DOAP, FOAF
 from rdfalchemy.rdf_subject import rdfSubject
 from rdfalchemy.orm import mapper
@@ -15,6 +15,9 @@ class Project(rdfSubject):
     homepage = rdfSingle(DOAP.homepage)
     shortdesc = rdfMultiple(DOAP.shortdesc)
     releases = rdfMultiple(DOAP.release, range_type=DOAP.Version)
+    # counted and compared by the store, the releases are not loaded
+    release_count = rdfCount(DOAP.release)
+    last_release = rdfMax((DOAP.release, DOAP.created))
     language = rdfSingle(
         DOAP['programming-language'])  # because of the hyphen we can't use
                                        # DOAP.programming-language
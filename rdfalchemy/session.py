@@ -0,0 +1,369 @@
+# encoding: utf-8
+"""
+session.py
+
+An opt-in unit of work for rdfSubject writes, along the lines of the
+SQLAlchemy Session.
+
+.. code-block:: python
+
+    session = Session(Person.db)
+    session.bind(Person)
+    for p in Person.ClassInstances():
+        p.last = p.last.upper()
+    session.commit()    # one addN locally, one request on sesame
+
+Descriptors write to `obj.db` so a class (or an instance) is put in the
+session by making the session its `db`.  Changes are kept in memory as a
+net triple delta until :meth:`Session.flush`.
+"""
+import logging
+
+from rdflib import RDF
+
+from rdfalchemy import store
+from rdfalchemy.identity import identity_map
+
+__all__ = ["Session"]
+
+log = logging.getLogger(__name__)
+
+
+class Session:
+    """
+    Graph-like wrapper that collects adds and removes and sends the net
+    change to the wrapped graph on :meth:`flush` / :meth:`commit`
+
+    Reads go to the wrapped graph with the pending changes applied.
+
+    :param graph: the graph to write to (an rdflib graph, a
+        :class:`~rdfalchemy.sparql.SPARQLGraph` or
+        :class:`~rdfalchemy.sparql.sesame2.SesameGraph`)
+    :param autoflush: flush before a query is sent to a SPARQL endpoint so
+        the store sees the pending changes
+    """
+
+    def __init__(self, graph, autoflush=True):
+        self.graph = graph
+        self.autoflush = autoflush
+        # pending changes indexed on (subject, predicate)
+        self._added = {}
+        self._removed = {}
+        self._cleared = {}
+        # triples leading to the blank nodes removed, see apply_changes
+        self._anchors = {}
+        self._bound = {}
+        # graphs whose identity maps may hold instances writing through
+        # this session (those of the classes bound to it)
+        self._graphs = {id(graph): graph}
+
+    def __repr__(self):
+        return f"<Session on {self.graph!r}>"
+
+    def __getattr__(self, name):
+        # anything we don't track (qname, namespaces, parse, ...)
+        if name.startswith('__') or name == 'graph':
+            raise AttributeError(name)
+        return getattr(self.graph, name)
+
+    #
+    # identity map and instances
+
+    def get(self, cls, resUri):
+        """
+        The instance of `cls` for `resUri` in this session
+
+        Returns the same object for the same node as long as it is in use
+        """
+        obj = identity_map(self).get(cls, resUri)
+        if obj is None:
+            # a new object, __init__ puts it in the identity map of obj.db
+            obj = cls.__new__(cls)
+            obj.db = self
+            obj.__init__(resUri)
+        return obj
+
+    def add_instance(self, obj):
+        """
+        Make obj write through this session and track it
+        """
+        obj.db = self
+        identity_map(self).add(type(obj), obj.resUri, obj)
+        return obj
+
+    def bind(self, *classes):
+        """
+        Point `cls.db` at this session for each of `classes`,
+        :meth:`close` puts the old graphs back
+        """
+        for cls in classes:
+            if cls.db is not self:
+                # the instances made before keep their identity map
+                self._graphs.setdefault(id(cls.db), cls.db)
+            self._bound.setdefault(cls, cls.__dict__.get('db'))
+            cls.db = self
+
+    def instances(self):
+        """
+        The live instances writing through this session: those made in it
+        and those of the bound classes made before the binding
+        """
+        found = {id(obj): obj for obj in identity_map(self).values()}
+        for graph in self._graphs.values():
+            for obj in identity_map(graph).values():
+                if obj.db is self:
+                    found.setdefault(id(obj), obj)
+        return list(found.values())
+
+    @property
+    def dirty(self):
+        """
+        The tracked instances with pending changes
+        """
+        subjects = {s for s, p in self._added}
+        subjects.update(s for s, p in self._removed)
+        subjects.update(s for s, p in self._cleared)
+        return {obj for obj in self.instances() if obj.resUri in subjects}
+
+    @property
+    def pending(self):
+        """
+        True if there are changes not yet sent to the graph
+        """
+        return bool(self._added or self._removed or self._cleared)
+
+    #
+    # writes are recorded
+
+    def add(self, triple):
+        s, p, o = triple
+        removed = self._removed.get((s, p))
+        if removed:
+            removed.pop(o, None)
+        self._added.setdefault((s, p), {})[o] = None
+
+    def addN(self, quads):
+        for s, p, o, _c in quads:
+            self.add((s, p, o))
+
+    def remove(self, triple):
+        s, p, o = triple
+        if s is not None and p is not None and o is None:
+            self._added.pop((s, p), None)
+            self._removed.pop((s, p), None)
+            self._cleared[(s, p)] = None
+        elif None in triple:
+            for t in list(self.triples(triple)):
+                self.remove(t)
+        else:
+            added = self._added.get((s, p))
+            if added:
+                added.pop(o, None)
+            self._removed.setdefault((s, p), {})[o] = None
+
+    def apply_changes(self, removes=(), adds=(), anchors=()):
+        """
+        Record the removes then the adds, the `anchors` (see
+        :func:`rdfalchemy.store.apply_changes`) go with the next flush
+        """
+        for triple in removes:
+            self.remove(triple)
+        for triple in adds:
+            self.add(triple)
+        self._anchors.update(dict.fromkeys(anchors))
+
+    def set(self, triple):
+        """
+        Replace every value of (subject, predicate) with object.
+        Setting the same attribute again just replaces the pending value.
+        """
+        s, p, o = triple
+        self.remove((s, p, None))
+        self.add((s, p, o))
+
+    #
+    # reads see the pending changes
+
+    def _hidden(self, triple):
+        s, p, o = triple
+        if (s, p) in self._cleared:
+            return True
+        return o in self._removed.get((s, p), ()) or o in self._added.get((s, p), ())
+
+    def _pending_adds(self, triple):
+        s, p, o = triple
+        if s is not None and p is not None:
+            items = [((s, p), self._added.get((s, p), {}))]
+        else:
+            items = self._added.items()
+        for (ss, pp), objs in items:
+            if (s is None or s == ss) and (p is None or p == pp):
+                for oo in objs:
+                    if o is None or o == oo:
+                        yield ss, pp, oo
+
+    def triples(self, triple):
+        """
+        Generator over the triples matching `triple` including the
+        pending changes
+        """
+        for t in self.graph.triples(triple):
+            if not self._hidden(t):
+                yield t
+        yield from self._pending_adds(triple)
+
+    def __iter__(self):
+        return self.triples((None, None, None))
+
+    def __contains__(self, triple):
+        for _t in self.triples(triple):
+            return True
+        return False
+
+    def __len__(self):
+        return sum(1 for _t in self)
+
+    def subjects(self, predicate=None, object=None):
+        for s, p, o in self.triples((None, predicate, object)):
+            yield s
+
+    def predicates(self, subject=None, object=None):
+        for s, p, o in self.triples((subject, None, object)):
+            yield p
+
+    def objects(self, subject=None, predicate=None):
+        for s, p, o in self.triples((subject, predicate, None)):
+            yield o
+
+    def subject_objects(self, predicate=None):
+        for s, p, o in self.triples((None, predicate, None)):
+            yield s, o
+
+    def subject_predicates(self, object=None):
+        for s, p, o in self.triples((None, None, object)):
+            yield s, p
+
+    def predicate_objects(self, subject=None):
+        for s, p, o in self.triples((subject, None, None)):
+            yield p, o
+
+    def value(self, subject=None, predicate=RDF.value, object=None, default=None, any=True):
+        """
+        A single value for the two criteria given (see rdflib `Graph.value`)
+        """
+        if object is None:
+            values = self.objects(subject, predicate)
+        elif subject is None:
+            values = self.subjects(predicate, object)
+        else:
+            values = self.predicates(subject, object)
+        return next(values, default)
+
+    def transitive_objects(self, subject, property, remember=None):
+        if remember is None:
+            remember = {}
+        if subject in remember:
+            return
+        remember[subject] = 1
+        yield subject
+        for obj in self.objects(subject, property):
+            yield from self.transitive_objects(obj, property, remember)
+
+    def transitive_subjects(self, predicate, object, remember=None):
+        if remember is None:
+            remember = {}
+        if object in remember:
+            return
+        remember[object] = 1
+        yield object
+        for subject in self.subjects(predicate, object):
+            yield from self.transitive_subjects(predicate, subject, remember)
+
+    def query(self, *args, **kwargs):
+        """
+        Run a query on the wrapped graph, flushing first if `autoflush`
+        """
+        if self.autoflush and self.pending:
+            self.flush()
+        return self.graph.query(*args, **kwargs)
+
+    #
+    # unit of work
+
+    def flush(self):
+        """
+        Send the net change to the graph
+
+        A local graph gets its removes and one `addN`, a SPARQL endpoint
+        one update request and sesame one transaction.  Split over several
+        requests (see :func:`rdfalchemy.store.add_triples`) the triples
+        sharing a blank node are sent together.
+        """
+        removes = [(s, p, None) for s, p in self._cleared]
+        removes.extend((s, p, o) for (s, p), objs in self._removed.items()
+                       for o in objs)
+        adds = [(s, p, o) for (s, p), objs in self._added.items()
+                for o in objs]
+        log.debug("flush: %d removes, %d adds", len(removes), len(adds))
+        self._added = {}
+        anchors = list(self._anchors)
+        self._removed = {}
+        self._cleared = {}
+        self._anchors = {}
+        if removes or adds:
+            store.apply_changes(self.graph, removes, adds, anchors)
+
+    def commit(self):
+        """
+        Flush and commit the wrapped graph if it is transactional
+        """
+        self.flush()
+        commit = getattr(self.graph, 'commit', None)
+        if commit:
+            commit()
+
+    def rollback(self):
+        """
+        Forget the pending changes and the values cached on the tracked
+        instances
+        """
+        self._added = {}
+        self._removed = {}
+        self._cleared = {}
+        self._anchors = {}
+        for obj in self.instances():
+            self.expire(obj)
+        rollback = getattr(self.graph, 'rollback', None)
+        if rollback:
+            rollback()
+
+    def expire(self, obj):
+        """
+        Drop the descriptor values cached on obj
+        """
+        obj._expire()
+
+    def close(self):
+        """
+        Forget pending changes and unbind the classes from :meth:`bind`
+        """
+        self._added = {}
+        self._removed = {}
+        self._cleared = {}
+        self._anchors = {}
+        for cls, db in self._bound.items():
+            if db is None:
+                del cls.db
+            else:
+                cls.db = db
+        self._bound = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        self.close()
@@ -2,6 +2,7 @@
 """
 import logging
 import re
+from itertools import chain
 from urllib.request import urlopen, Request
 from urllib.error import HTTPError
 from urllib.parse import urlencode
@@ -9,6 +10,7 @@ from urllib.parse import urlencode
 from rdflib import URIRef, Literal, BNode, RDF, RDFS
 from rdfalchemy.exceptions import (
     MalformedQueryError,
+    RDFAlchemyError,
     UniquenessError,
     # QueryEvaluationError,
 )
@@ -25,6 +27,135 @@ __all__ = ["SPARQLGraph"]
 log = logging.getLogger(__name__)
 
 
+def triple_pattern(triple):
+    """
+    SPARQL triple pattern for an rdflib style (s, p, o) triple
+    where `None` is a wildcard
+    """
+    s, p, o = triple
+    return "%s %s %s" % (
+        '?s' if s is None else s.n3(),
+        '?p' if p is None else p.n3(),
+        '?o' if o is None else o.n3())
+
+
+def bnode_groups(triples):
+    """
+    `triples` split in lists that share no blank node
+
+    The label of a blank node only holds within one update request, the
+    triples of a list sharing one must be sent together.  A triple
+    without a blank node is a list of its own.
+    """
+    groups = {}
+    # group number -> its blank nodes, blank node -> group number
+    members = {}
+    owner = {}
+    for number, triple in enumerate(triples):
+        bnodes = {n for n in (triple[0], triple[2]) if isinstance(n, BNode)}
+        found = sorted({owner[n] for n in bnodes if n in owner})
+        if found:
+            number = found[0]
+            for other in found[1:]:
+                groups[number].extend(groups.pop(other))
+                moved = members.pop(other)
+                for n in moved:
+                    owner[n] = number
+                members[number].update(moved)
+        else:
+            groups[number] = []
+            members[number] = set()
+        groups[number].append(triple)
+        members[number].update(bnodes)
+        for n in bnodes:
+            owner[n] = number
+    return list(groups.values())
+
+
+def anchored_update(triples, anchors=(), adds=()):
+    """
+    A SPARQL Update removing `triples`, which share blank nodes
+
+    The label of a blank node means nothing to the store, each one is a
+    variable bound by the removed triples ``(s, p, bnode)`` leading to it
+    from a named node: ``<urn:a> <urn:knows> ?b0`` and not ``?b0`` alone,
+    which would match the data of every subject.  A `None` in a triple is
+    a wildcard, it only removes what its blank node has.
+
+    :param anchors: triples of the store that are not removed, they lead
+        to the blank nodes too and must all match (the predicate may be
+        a property path e.g. ``<urn:a> <urn:list>/rdf:rest ?b0``)
+    :param adds: triples to insert along, the blank nodes reached stand
+        for those of the store, the others are new
+    :raises RDFAlchemyError: if a blank node is not reached from a named
+        node (a remove on a blank node alone cannot be told from the same
+        triple of any other subject), or for `adds` with wildcard removes
+        (they would be inserted once for each match)
+    """
+    anchors = list(anchors)
+    # subject -> the triples from it to a blank node
+    links = {}
+    for s, p, o in anchors + list(triples):
+        if s is not None and p is not None and isinstance(o, BNode):
+            links.setdefault(s, []).append((s, p, o))
+    path = []
+    reached = set()
+    todo = [s for s in links if not isinstance(s, BNode)]
+    while todo:
+        for s, p, o in links.get(todo.pop(), ()):
+            if o not in reached:
+                reached.add(o)
+                path.append((s, p, o))
+                todo.append(o)
+    for triple in triples:
+        for node in (triple[0], triple[2]):
+            if isinstance(node, BNode) and node not in reached:
+                raise RDFAlchemyError(
+                    "Cannot remove %s from a SPARQL endpoint, blank node %s is not "
+                    "reached from a named node by the triples removed" % (
+                        triple_pattern(triple), node.n3()))
+    names = {}
+
+    def term(node):
+        if isinstance(node, BNode) and node in reached:
+            return names.setdefault(node, "?b%d" % len(names))
+        return node.n3()
+
+    template = []
+    branches = []
+    for s, p, o in triples:
+        if None in (s, p, o):
+            n = len(branches)
+            pattern = "%s %s %s" % (
+                "?s%d" % n if s is None else term(s),
+                "?p%d" % n if p is None else term(p),
+                "?o%d" % n if o is None else term(o))
+            branches.append("{ %s }" % pattern)
+        else:
+            pattern = "%s %s %s" % (term(s), term(p), term(o))
+        template.append("%s ." % pattern)
+    if adds and branches:
+        raise RDFAlchemyError(
+            "Cannot insert %s on a SPARQL endpoint along with a wildcard remove "
+            "on a blank node" % triple_pattern(adds[0]))
+    path = anchors + [t for t in path if t not in anchors]
+    where = ["%s %s %s ." % (term(s), term(p), term(o)) for s, p, o in path]
+    if branches:
+        # the empty branch removes the triples without wildcard when a
+        # wildcard matches nothing
+        where.append(" UNION ".join(["{ }"] + branches))
+    update = []
+    if template:
+        update.append("DELETE { %s }" % " ".join(template))
+    if adds:
+        # a blank node of the template is new for each solution, the one
+        # solution of the anchors
+        update.append("INSERT { %s }" % " ".join(
+            "%s %s %s ." % (term(s), term(p), term(o)) for s, p, o in adds))
+    update.append("WHERE { %s }" % " ".join(where))
+    return " ".join(update)
+
+
 class DumpSink(object):
 
     def __init__(self):
@@ -44,18 +175,24 @@ class SPARQLGraph:
     """
     Provides (some) RDFLib API via http to a SPARQL endpoint.
 
-    Gives 'read-only' access to the graph.
+    Gives 'read-only' access to the graph through the rdflib API.
+    Changes can be sent with :meth:`update` and :meth:`apply_changes` if
+    the endpoint accepts SPARQL 1.1 Update.
 
     Constructor takes http endpoint and repository name
 
     e.g.  SPARQLGraph('http://localhost:2020/sparql')
+
+    :param update_url: *optional* url of the SPARQL Update service,
+        defaults to `url`
     """
 
     parsers = {'xml': _XMLSPARQLHandler, 'json': _JSONSPARQLHandler}
 
-    def __init__(self, url, context=None):
+    def __init__(self, url, context=None, update_url=None):
         self.url = url
         self.context = context
+        self.update_url = update_url or url
 
     def construct(self, strOrTriple, initBindings=None, initNs=None):
         """
@@ -379,6 +516,94 @@ class SPARQLGraph:
             '|'.join(init_bindings.keys())))
         return re_qvars.sub(varval, query)
 
+    def update(self, update_str):
+        """
+        Executes a SPARQL 1.1 Update against `self.update_url`
+
+        :param update_str: the update request e.g.
+            ``'DELETE DATA { <urn:a> <urn:b> "c" }'``
+        """
+        log.debug("Update: %s", update_str)
+        data = urlencode(dict(update=update_str)).encode('utf-8')
+        req = Request(self.update_url, data=data)
+        req.add_header('Content-Type', 'application/x-www-form-urlencoded')
+        try:
+            return urlopen(req).read()
+        except HTTPError as e:
+            # 204 is actually the "success" code
+            if e.code == 204:
+                return
+            if e.code == 400:
+                raise MalformedQueryError(e.fp.read())
+            raise
+
+    def apply_changes(self, removes=(), adds=(), anchors=()):
+        """
+        Remove then add triples with a single SPARQL Update request
+
+        DELETE DATA takes no blank node: each group of removes sharing
+        blank nodes (see :func:`bnode_groups`) becomes one
+        :func:`anchored_update`, sent before the other removes as they may
+        take away the triples the blank nodes are reached through.  With
+        `anchors`, or adds on the blank nodes of the store, all of them are
+        one :func:`anchored_update`: an anchor may go through a triple
+        removed for another group and the adds are inserted by it.
+
+        :param removes: triples to remove, a `None` in a triple is a
+            wildcard (so ``(s, p, None)`` drops every value of p for s)
+        :param adds: triples to add
+        :param anchors: triples of the store leading to the blank nodes
+            of `removes`, they stay
+        :raises RDFAlchemyError: for a blank node that cannot be reached
+            from a named node through the removes, or for an add on a blank
+            node of the store that a wildcard remove would take away again,
+            nothing is sent
+        """
+        parts = []
+        wildcards = []
+        ground = []
+        with_bnodes = []
+        for triple in removes:
+            if isinstance(triple[0], BNode) or isinstance(triple[2], BNode):
+                with_bnodes.append(triple)
+            elif None in triple:
+                wildcards.append(triple)
+            else:
+                ground.append(triple)
+        # the blank nodes of the store, an add on one of them goes with
+        # the update that finds it (with the adds sharing its blank nodes)
+        known = {node for s, _p, o in chain(with_bnodes, anchors)
+                 for node in (s, o) if isinstance(node, BNode)}
+        linked = []
+        for group in bnode_groups(list(adds)):
+            if any(isinstance(node, BNode) and node in known
+                   for s, _p, o in group for node in (s, o)):
+                linked.extend(group)
+        if linked:
+            moved = set(linked)
+            adds = [triple for triple in adds if triple not in moved]
+        for s, p, o in linked:
+            for wildcard in wildcards:
+                if all(w is None or w == t for w, t in zip(wildcard, (s, p, o))):
+                    raise RDFAlchemyError(
+                        "Cannot insert %s on a SPARQL endpoint, the remove of %s "
+                        "comes after it" % (triple_pattern((s, p, o)),
+                                            triple_pattern(wildcard)))
+        if linked or (anchors and with_bnodes):
+            parts.append(anchored_update(with_bnodes, anchors, linked))
+        else:
+            for group in bnode_groups(with_bnodes):
+                parts.append(anchored_update(group))
+        parts.extend("DELETE WHERE { %s }" % triple_pattern(t) for t in wildcards)
+        if ground:
+            parts.append("DELETE DATA { %s }" % " ".join(
+                "%s ." % triple_pattern(t) for t in ground))
+        if adds:
+            parts.append("INSERT DATA { %s }" % " ".join(
+                "%s ." % triple_pattern(t) for t in adds))
+        if parts:
+            return self.update(" ;\n".join(parts))
+
     def describe(self, s_or_po, init_bindings=None, init_ns=None):
         """
         Executes a SPARQL describe of resource
@@ -5,6 +5,9 @@ import os
 from urllib.error import HTTPError
 from urllib.parse import urlencode, urlparse
 from urllib.request import urlopen, Request
+from xml.sax.saxutils import escape, quoteattr
+
+from rdflib import URIRef, BNode
 
 # from rdfalchemy import Literal, BNode, Namespace, URIRef
 from rdfalchemy.sparql import SPARQLGraph, DumpSink
@@ -21,6 +24,24 @@ __all__ = ["SesameGraph"]
 log = logging.getLogger(__name__)
 
 
+def _transaction_value(node):
+    """
+    xml element for a node in a sesame transaction document
+    """
+    if node is None:
+        return "<null/>"
+    if isinstance(node, URIRef):
+        return "<uri>%s</uri>" % escape(node)
+    if isinstance(node, BNode):
+        return "<bnode>%s</bnode>" % escape(node)
+    attrs = ""
+    if node.datatype:
+        attrs += " datatype=%s" % quoteattr(node.datatype)
+    if node.language:
+        attrs += " xml:lang=%s" % quoteattr(node.language)
+    return "<literal%s>%s</literal>" % (attrs, escape(node))
+
+
 class SesameGraph(SPARQLGraph):
 
     """
@@ -37,7 +58,7 @@ class SesameGraph(SPARQLGraph):
                'brtr': _BRTRSPARQLHandler}
 
     def __init__(self, url, context=None):
-        super().__init__(url, context)
+        super().__init__(url, context, update_url=url + '/statements')
         self._namespaces = None
         self._contexts = None
 
@@ -143,6 +164,50 @@ class SesameGraph(SPARQLGraph):
 
         return result
 
+    def _transaction(self, removes=(), adds=()):
+        """
+        The sesame transaction document (application/x-rdftransaction)
+        removing then adding triples
+
+        A `None` in a removed triple is a wildcard
+        """
+        doc = ["<transaction>"]
+        for triple in removes:
+            doc.append("<remove>%s</remove>" % "".join(
+                _transaction_value(n) for n in triple))
+        ctx = self.context and _transaction_value(URIRef(self.context)) or ""
+        for triple in adds:
+            doc.append("<add>%s%s</add>" % ("".join(
+                _transaction_value(n) for n in triple), ctx))
+        doc.append("</transaction>")
+        return "\n".join(doc)
+
+    def apply_changes(self, removes=(), adds=(), anchors=()):
+        """
+        Remove then add triples in a single sesame transaction
+
+        :param removes: triples to remove, a `None` in a triple is a
+            wildcard
+        :param adds: triples to add
+        :param anchors: not needed by a transaction, ignored
+        """
+        removes = list(removes)
+        adds = list(adds)
+        if not (removes or adds):
+            return
+        req = Request(self.url + '/statements')
+        req.data = self._transaction(removes, adds).encode('utf-8')
+        req.add_header('Content-Type', 'application/x-rdftransaction')
+        log.debug("Transaction: %d removes, %d adds", len(removes), len(adds))
+        try:
+            return urlopen(req).read()
+        except HTTPError as e:
+            # 204 is actually the "success" code
+            if e.code == 204:
+                return
+            log.error(e)
+            raise
+
     def triples(self, triple_pattern, context=None):
         """
         Generator over the triple store
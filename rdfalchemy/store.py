@@ -0,0 +1,590 @@
+# encoding: utf-8
+"""
+store.py
+
+Helpers that talk to the backing store in batches.
+
+Each helper takes the graph an rdfSubject is bound to (``obj.db``) and picks
+the cheapest way to answer: index lookups on a local rdflib graph or a
+single SPARQL query against a
+:class:`~rdfalchemy.sparql.SPARQLGraph` / :class:`~rdfalchemy.sparql.sesame2.SesameGraph`.
+"""
+from itertools import islice
+import logging
+from numbers import Number
+
+from rdflib import BNode, Graph, Literal, RDF, RDFS, URIRef
+
+from rdfalchemy.exceptions import RDFAlchemyError
+from rdfalchemy.sparql import SPARQLGraph, bnode_groups, triple_pattern
+
+__all__ = ["is_remote", "batched", "batched_rows", "batch_size", "objects_for", "subjects_for",
+           "aggregate_for", "types_where", "typed_subjects", "estimate", "exists", "objects_page",
+           "add_triples", "add_rows", "apply_changes", "rename_nodes", "list_items", "container_items", "graph_state"]
+
+log = logging.getLogger(__name__)
+
+# number of nodes sent in one VALUES block to a remote store
+DEFAULT_BATCH_SIZE = 500
+
+# below this many subjects a local lookup per subject beats a predicate scan
+SMALL_BATCH = 64
+
+# instances eager loaded together from a local graph, each descriptor
+# reads them with one predicate scan
+LOCAL_BATCH_SIZE = 10000
+
+# cardinality estimates stop counting here
+ESTIMATE_LIMIT = 1000
+
+
+# attribute of a graph holding its state, see graph_state
+_STATE_ATTR = '_rdfalchemy_state'
+
+# id(db) -> {key: state} for the graphs without attributes
+_graph_state = {}
+
+
+def graph_state(db, key, factory):
+    """
+    State kept for a graph (identity map, indexes ...) as long as it lives
+
+    The state is an attribute of the graph: the instances it holds may
+    hold the graph, the cycle goes away with the graph.
+
+    :param db: the graph
+    :param key: name of the state
+    :param factory: called with no args to make the state the first time
+    """
+    try:
+        # not getattr, a wrapper would hand it on to the graph it wraps
+        attrs = vars(db)
+    except TypeError:
+        log.debug("%r has no attributes, state kept", db)
+        attrs = _graph_state.setdefault(id(db), {})
+    state = attrs.get(_STATE_ATTR)
+    if state is None:
+        state = attrs[_STATE_ATTR] = {}
+    try:
+        return state[key]
+    except KeyError:
+        value = state[key] = factory()
+        return value
+
+
+def backend(db):
+    """
+    The graph at the bottom of `db`
+
+    Wrappers like :class:`~rdfalchemy.session.Session` keep the graph
+    they wrap in a `graph` attribute
+    """
+    while not isinstance(db, (Graph, SPARQLGraph)) and hasattr(db, 'graph'):
+        db = db.graph
+    return db
+
+
+def is_remote(db):
+    """
+    True if `db` is answered over http by a SPARQL endpoint
+    """
+    return isinstance(backend(db), SPARQLGraph)
+
+
+def batch_size(db, scan=False):
+    """
+    The number of nodes to gather before going to the store.
+
+    Remote stores get :data:`DEFAULT_BATCH_SIZE` nodes per request.  Local
+    stores :data:`SMALL_BATCH` (a lookup per node) or, if `scan`,
+    :data:`LOCAL_BATCH_SIZE` so that :func:`objects_for` reads a batch
+    with one scan of the predicate.  Results are streamed with bounded
+    memory either way.
+    """
+    if is_remote(db):
+        return DEFAULT_BATCH_SIZE
+    return LOCAL_BATCH_SIZE if scan else SMALL_BATCH
+
+
+def batched(iterable, size):
+    """
+    Generator over lists of at most `size` items from `iterable`
+
+    If `size` is `None` yields a single list of all the items
+    """
+    iterable = iter(iterable)
+    while True:
+        chunk = list(islice(iterable, size))
+        if not chunk:
+            return
+        yield chunk
+        if size is None:
+            return
+
+
+def batched_rows(rows, size):
+    """
+    Generator over lists of the triples of whole `rows` (lists of
+    triples), at most `size` triples unless a row alone is bigger
+    """
+    chunk = []
+    for row in rows:
+        if chunk and len(chunk) + len(row) > size:
+            yield chunk
+            chunk = []
+        chunk.extend(row)
+    if chunk:
+        yield chunk
+
+
+def values_block(var, nodes):
+    """
+    SPARQL ``VALUES`` clause binding ``?var`` to each node in `nodes`
+    """
+    return "VALUES ?%s { %s }" % (var, " ".join(n.n3() for n in nodes))
+
+
+def objects_for(db, subjects, predicate, lang=None):
+    """
+    Fetch the objects of `predicate` for many subjects at once
+
+    :param db: the graph to query
+    :param subjects: a list of subject nodes
+    :param predicate: the predicate to follow
+    :param lang: only the literals in this language (filtered by the
+        store on a SPARQL endpoint)
+    :returns: a dict of {subject: [objects]}, subjects without a value are
+        missing from the dict
+    """
+    result = {}
+    if not subjects:
+        return result
+    if is_remote(db):
+        lang_filter = ' FILTER(lang(?o) = "%s")' % lang if lang else ""
+        for chunk in batched(subjects, DEFAULT_BATCH_SIZE):
+            query = "SELECT ?s ?o WHERE { %s ?s %s ?o%s }" % (
+                values_block('s', chunk), predicate.n3(), lang_filter)
+            for s, o in db.query(query):
+                result.setdefault(s, []).append(o)
+        return result
+    if len(subjects) <= SMALL_BATCH:
+        for s in subjects:
+            objs = list(db.objects(s, predicate))
+            if objs:
+                result[s] = objs
+    else:
+        wanted = set(subjects)
+        for s, o in db.subject_objects(predicate):
+            if s in wanted:
+                result.setdefault(s, []).append(o)
+    if lang:
+        result = {s: objs for s, objs in
+                  ((s, [o for o in objs if getattr(o, 'language', None) == lang])
+                   for s, objs in result.items()) if objs}
+    return result
+
+
+def subjects_for(db, objects, predicate):
+    """
+    Fetch the subjects of `predicate` for many objects at once, the
+    reverse of :func:`objects_for`
+
+    :returns: a dict of {object: [subjects]}, objects without a subject
+        are missing from the dict
+    """
+    result = {}
+    if not objects:
+        return result
+    if is_remote(db):
+        for chunk in batched(objects, DEFAULT_BATCH_SIZE):
+            query = "SELECT ?s ?o WHERE { %s ?s %s ?o }" % (
+                values_block('o', chunk), predicate.n3())
+            for s, o in db.query(query):
+                result.setdefault(o, []).append(s)
+        return result
+    if len(objects) <= SMALL_BATCH:
+        for o in objects:
+            subjs = list(db.subjects(predicate, o))
+            if subjs:
+                result[o] = subjs
+    else:
+        wanted = set(objects)
+        for s, o in db.subject_objects(predicate):
+            if o in wanted:
+                result.setdefault(o, []).append(s)
+    return result
+
+
+def types_where(types, subclasses=False):
+    """
+    SPARQL graph pattern for the ``?s`` with one of `types` as rdf:type
+    (or a type reaching one of them through rdfs:subClassOf if
+    `subclasses`)
+    """
+    if subclasses:
+        where = "%s ?t %s* ?root ." % (values_block('root', types), RDFS.subClassOf.n3())
+    else:
+        where = values_block('t', types)
+    return "%s ?s %s ?t ." % (where, RDF.type.n3())
+
+
+def typed_subjects(db, types, subclasses=False):
+    """
+    Generator over the distinct subjects with one of `types` as rdf:type
+
+    A SPARQL endpoint answers one ``SELECT DISTINCT`` query.  Locally the
+    subjects of each type are streamed and a subject is skipped if it has
+    one of the types before, so nothing is kept to remove duplicates.
+
+    :param types: the rdf:type nodes, the most common first is cheapest
+    :param subclasses: also the types reaching one of `types` through
+        rdfs:subClassOf (followed by the store on a SPARQL endpoint)
+    """
+    types = list(dict.fromkeys(types))
+    if not types:
+        return
+    if is_remote(db):
+        query = "SELECT DISTINCT ?s WHERE { %s }" % types_where(types, subclasses)
+        for (s,) in db.query(query):
+            yield s
+        return
+    if subclasses:
+        for rdf_type in list(types):
+            types.extend(t for t in db.transitive_subjects(RDFS.subClassOf, rdf_type)
+                         if t not in types)
+    for i, rdf_type in enumerate(types):
+        earlier = types[:i]
+        for s in db.subjects(RDF.type, rdf_type):
+            if not any((s, RDF.type, t) in db for t in earlier):
+                yield s
+
+
+def _numbers(values):
+    """
+    The numeric values, all floats if one is (decimals and floats do not
+    add up in python)
+    """
+    numbers = [v for v in values if isinstance(v, Number) and not isinstance(v, bool)]
+    if any(isinstance(v, float) for v in numbers):
+        return [float(v) for v in numbers]
+    return numbers
+
+
+def _comparable(values):
+    """
+    The values MIN and MAX choose from: the numbers if there are some,
+    otherwise those of the type of the first value
+    """
+    numbers = _numbers(values)
+    if numbers or not values:
+        return numbers
+    kind = type(values[0])
+    return [v for v in values if type(v) is kind]
+
+
+# the local versions of the SPARQL aggregates, over python values: the
+# values that cannot be added or compared with the others are skipped
+_AGGREGATES = {
+    'SUM': lambda values: sum(_numbers(values)),
+    'MIN': lambda values: min(_comparable(values), default=None),
+    'MAX': lambda values: max(_comparable(values), default=None),
+}
+
+
+def aggregate_for(db, subjects, path, function):
+    """
+    ``COUNT``, ``SUM``, ``MIN`` or ``MAX`` of the objects of `path` for
+    many subjects at once, computed by the store
+
+    A SPARQL endpoint gets one ``GROUP BY`` query per batch.  A local
+    graph counts a single predicate in its index without building the
+    terms, the other aggregates read the objects of each subject and skip
+    those they cannot add up or compare (see :func:`_comparable`).
+
+    :param path: a predicate or an rdflib property path
+    :returns: a dict of {subject: value}, a COUNT or SUM without values
+        is 0, a MIN or MAX is `None`
+    """
+    function = function.upper()
+    empty = 0 if function in ('COUNT', 'SUM') else None
+    result = dict.fromkeys(subjects, empty)
+    if not subjects:
+        return result
+    if is_remote(db):
+        for chunk in batched(subjects, DEFAULT_BATCH_SIZE):
+            query = "SELECT ?s (%s(?o) AS ?v) WHERE { %s ?s %s ?o } GROUP BY ?s" % (
+                function, values_block('s', chunk), path.n3())
+            for s, v in db.query(query):
+                if v is not None:
+                    result[s] = v.toPython()
+        return result
+    for s in subjects:
+        if function == 'COUNT':
+            if isinstance(path, URIRef):
+                result[s] = estimate(db, (s, path, None), limit=None)
+            else:
+                result[s] = sum(1 for _o in db.objects(s, path))
+        else:
+            values = [o.toPython() for o in db.objects(s, path) if isinstance(o, Literal)]
+            result[s] = _AGGREGATES[function](values)
+    return result
+
+
+def list_items(db, subject, predicate=None):
+    """
+    The members of an RDF List in order
+
+    A SPARQL endpoint sends the whole chain back for one
+    ``rdf:rest*`` query, a local graph is walked with one subject index
+    lookup per cell (instead of a `value` call for rdf:first and another
+    one for rdf:rest)
+
+    :param subject: the head of the list or, with `predicate`, the
+        subject pointing to it
+    :returns: (head, [cells], [members]), head is `None` if there is no
+        object for `predicate` and the members are empty if head is not
+        a list
+    """
+    cells = {}
+    if is_remote(db):
+        if predicate is None:
+            head, start, where = subject, subject.n3(), ""
+        else:
+            head, start = None, "?head"
+            where = "%s %s ?head ." % (subject.n3(), predicate.n3())
+        query = ("SELECT ?head ?cell ?first ?rest WHERE { %s OPTIONAL { "
+                 "%s %s* ?cell . ?cell %s ?first OPTIONAL { ?cell %s ?rest } } }" % (
+                     where, start, RDF.rest.n3(), RDF.first.n3(), RDF.rest.n3()))
+        for row in db.query(query):
+            if head is None:
+                head = row[0]
+            cell, first, rest = row[1:]
+            if cell is not None and first is not None:
+                cells[cell] = (first, rest)
+
+        def lookup(cell):
+            return cells.get(cell)
+    else:
+        head = subject if predicate is None else db.value(subject, predicate)
+
+        def lookup(cell):
+            first = rest = None
+            for p, o in db.predicate_objects(cell):
+                if p == RDF.first:
+                    first = o
+                elif p == RDF.rest:
+                    rest = o
+            return None if first is None else (first, rest)
+
+    chain = []
+    members = []
+    seen = set()
+    cell = head
+    # stop at the end, at a broken link or at a loop
+    while cell is not None and cell != RDF.nil and cell not in seen:
+        entry = lookup(cell)
+        if entry is None:
+            break
+        seen.add(cell)
+        chain.append(cell)
+        first, cell = entry
+        members.append(first)
+    return head, chain, members
+
+
+def container_items(db, seq):
+    """
+    The (index, member) pairs of an rdf:Seq, rdf:Bag or rdf:Alt sorted on
+    the rdf:_n index
+
+    One `predicate_objects` call, rather than a lookup for each index
+    """
+    prefix = str(RDF) + '_'
+    items = []
+    for p, o in db.predicate_objects(seq):
+        if p.startswith(prefix) and p[len(prefix):].isdigit():
+            items.append((int(p[len(prefix):]), o))
+    items.sort(key=lambda item: item[0])
+    return items
+
+
+def estimate(db, triple, limit=ESTIMATE_LIMIT):
+    """
+    Estimate the number of triples matching `triple`
+
+    Counting stops at `limit` so the cost of an estimate is bounded
+    whatever the size of the store.  An estimate below `limit` is exact,
+    with `limit=None` everything is counted.
+    """
+    if is_remote(db):
+        if limit is None:
+            query = "SELECT (COUNT(*) AS ?n) WHERE { %s }" % triple_pattern(triple)
+        else:
+            query = "SELECT (COUNT(*) AS ?n) WHERE { SELECT * WHERE { %s } LIMIT %d }" % (
+                triple_pattern(triple), limit)
+        for (n,) in db.query(query):
+            return int(n)
+        return 0
+    return sum(1 for _triple in islice(db.triples(triple), limit))
+
+
+def exists(db, triple):
+    """
+    True if a triple matches `triple`, without fetching it
+    """
+    return estimate(db, triple, limit=1) > 0
+
+
+def objects_page(db, subject, predicate, offset=0, limit=None):
+    """
+    The objects of (subject, predicate) from `offset`, at most `limit` of
+    them, in the order of the store.  A SPARQL endpoint only sends the page,
+    sorted so that the pages of several requests do not overlap.
+    """
+    if is_remote(db):
+        query = "SELECT ?o WHERE { %s %s ?o } ORDER BY ?o" % (subject.n3(), predicate.n3())
+        if limit is not None:
+            query += " LIMIT %d" % limit
+        if offset:
+            query += " OFFSET %d" % offset
+        return [o for (o,) in db.query(query)]
+    stop = None if limit is None else offset + limit
+    return list(islice(db.objects(subject, predicate), offset, stop))
+
+
+def add_triples(db, triples, chunk_size=DEFAULT_BATCH_SIZE):
+    """
+    Add many triples to `db` in bulk
+
+    Local graphs get a single `addN`, remote stores one request per
+    `chunk_size` triples or so: the triples sharing a blank node go in the
+    same request (see :func:`rdfalchemy.sparql.bnode_groups`)
+    """
+    if isinstance(db, SPARQLGraph):
+        add_rows(db, bnode_groups(triples), chunk_size)
+        return
+    graph = backend(db)
+    context = getattr(graph, 'default_context', graph)
+    db.addN((s, p, o, context) for s, p, o in triples)
+
+
+def add_rows(db, rows, chunk_size=DEFAULT_BATCH_SIZE):
+    """
+    Add the triples of `rows` (lists of triples) to `db` in bulk
+
+    A remote store gets whole rows in each request of about `chunk_size`
+    triples so that the blank nodes of a row stay the same nodes.
+    """
+    if isinstance(db, SPARQLGraph):
+        for chunk in batched_rows(rows, chunk_size):
+            db.apply_changes(adds=chunk)
+        return
+    add_triples(db, (triple for row in rows for triple in row))
+
+
+def apply_changes(db, removes=(), adds=(), anchors=()):
+    """
+    Remove then add triples in one go
+
+    :param removes: triples to remove, `None` is a wildcard
+    :param adds: triples to add
+    :param anchors: triples left alone that lead from a named node to the
+        blank nodes of `removes`, a SPARQL endpoint needs them (see
+        :func:`rdfalchemy.sparql.anchored_update`)
+    """
+    # graphs that can do it in one go (looked up on the class so that a
+    # Session does not hand it on to the graph it wraps)
+    if getattr(type(db), 'apply_changes', None):
+        if anchors:
+            db.apply_changes(removes, adds, anchors=anchors)
+        else:
+            db.apply_changes(removes, adds)
+        return
+    # a store with a batch remove, rdflib graphs remove one pattern at a time
+    removeN = getattr(db, 'removeN', None)
+    if removeN:
+        removeN(removes)
+    else:
+        for triple in removes:
+            db.remove(triple)
+    add_triples(db, adds)
+
+
+def _rename_groups(mapping):
+    """
+    The (old, new) pairs of `mapping` in lists to rename in the same chunk:
+    those of a chain or a cycle (a -> b, b -> a), split between chunks the
+    nodes renamed by one would be renamed again by the next
+    """
+    parent = {}
+
+    def root(node):
+        while parent.get(node, node) != node:
+            node = parent[node] = parent.get(parent[node], parent[node])
+        return node
+
+    for old, new in mapping.items():
+        if new in mapping:
+            a, b = root(old), root(new)
+            if a != b:
+                parent[a] = b
+    groups = {}
+    for old, new in mapping.items():
+        groups.setdefault(root(old), []).append((old, new))
+    return list(groups.values())
+
+
+def rename_nodes(db, mapping, chunk_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Rewrite the subject and object positions of every triple for the
+    old -> new node pairs in `mapping`
+
+    Locally each old node costs one lookup in the subject index and one in
+    the object index.  A SPARQL endpoint gets one update request per
+    `chunk_size` nodes, also through a wrapper: a
+    :class:`~rdfalchemy.session.Session` is flushed first and an
+    :class:`~rdfalchemy.events.ObservableGraph` told about the nodes.  The
+    pairs of a chain or a cycle of renames go in the same chunk, whatever
+    its size.
+
+    :param mapping: a dict of {old: new}
+    :param progress: called as `progress(done, total)` after each chunk
+    :raises RDFAlchemyError: for a blank node to rename on a SPARQL
+        endpoint, its label means nothing there
+    """
+    total = len(mapping)
+    done = 0
+    remote = is_remote(db)
+    if remote:
+        for node in (n for pair in mapping.items() for n in pair):
+            if isinstance(node, BNode):
+                raise RDFAlchemyError(
+                    "Cannot rename %s on a SPARQL endpoint, it is a blank node" % node.n3())
+        if getattr(db, 'pending', False):
+            # the update goes past the pending changes of a session
+            db.flush()
+    for chunk in batched_rows(_rename_groups(mapping), chunk_size):
+        if remote:
+            rows = " ".join("(%s %s)" % (old.n3(), new.n3()) for old, new in chunk)
+            backend(db).update(
+                "DELETE { ?old ?p ?o } INSERT { ?new ?p ?o } "
+                "WHERE { VALUES (?old ?new) { %s } ?old ?p ?o } ;\n"
+                "DELETE { ?s ?p ?old } INSERT { ?s ?p ?new } "
+                "WHERE { VALUES (?old ?new) { %s } ?s ?p ?old }" % (rows, rows))
+            notify = getattr(db, 'notify', None)
+            if notify is not None:
+                for node in (n for pair in chunk for n in pair):
+                    notify('remove', (node, None, None))
+                    notify('remove', (None, None, node))
+        else:
+            # a triple between two renamed nodes is found twice
+            removes = {}
+            for old, _new in chunk:
+                removes.update(dict.fromkeys(db.triples((old, None, None))))
+                removes.update(dict.fromkeys(db.triples((None, None, old))))
+            adds = [(mapping.get(s, s), p, mapping.get(o, o)) for s, p, o in removes]
+            apply_changes(db, list(removes), adds)
+        done += len(chunk)
+        log.debug("rename_nodes: %d of %d", done, total)
+        if progress:
+            progress(done, total)
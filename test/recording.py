@@ -0,0 +1,72 @@
+"""
+SPARQLGraphs for the tests that do not go over http: one keeps what it is
+sent, the other answers from a local graph
+"""
+from rdflib import BNode, Graph
+
+from rdfalchemy.sparql import SPARQLGraph
+
+
+class RecordingGraph(SPARQLGraph):
+    """
+    A SPARQLGraph that answers every query with `rows` and keeps the
+    queries, the updates and the changes (removes, adds) sent to it
+
+    :param found: `triples` finds the triple asked for (every rdf:type
+        check passes), otherwise the graph is empty
+    """
+    def __init__(self, rows=(), found=True):
+        super().__init__('http://example.com/sparql')
+        self.rows = rows
+        self.found = found
+        self.queries = []
+        self.updates = []
+        self.changes = []
+
+    def query(self, str_or_query, *args, **kwargs):
+        self.queries.append(str_or_query)
+        return iter(self.rows)
+
+    def triples(self, triple, method='CONSTRUCT'):
+        return iter([triple] if self.found else [])
+
+    def update(self, update_str):
+        self.updates.append(update_str)
+
+    def apply_changes(self, removes=(), adds=(), anchors=()):
+        removes, adds = list(removes), list(adds)
+        self.changes.append((removes, adds))
+        return super().apply_changes(removes, adds, anchors)
+
+    @property
+    def inserts(self):
+        """
+        The triples added by each change
+        """
+        return [adds for _removes, adds in self.changes]
+
+
+class EndpointGraph(SPARQLGraph):
+    """
+    A SPARQLGraph answering from the local rdflib `graph`, the updates
+    sent are run on it
+
+    The label of a blank node of `graph` would be a new blank node for a
+    real endpoint, an update naming one fails.
+    """
+    def __init__(self, graph=None):
+        super().__init__('http://example.com/sparql')
+        self.graph = Graph() if graph is None else graph
+        self.updates = []
+
+    def query(self, str_or_query, *args, **kwargs):
+        return iter(self.graph.query(str_or_query))
+
+    def triples(self, triple, method='CONSTRUCT'):
+        return self.graph.triples(triple)
+
+    def update(self, update_str):
+        self.updates.append(update_str)
+        for node in self.graph.all_nodes():
+            assert not (isinstance(node, BNode) and node.n3() in update_str), node
+        self.graph.update(update_str)
@@ -0,0 +1,101 @@
+from decimal import Decimal
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, Literal, URIRef
+
+import rdfalchemy
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.namespaces import DOAP
+from rdfalchemy.samples.doap import Project, Release
+from rdfalchemy.orm import mapper
+
+from recording import RecordingGraph
+
+
+class AggregateTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Project.db = Release.db = ConjunctiveGraph()
+        Project.total = rdfalchemy.rdfSum((DOAP.release, DOAP.revision))
+        Project.first_release = rdfalchemy.rdfMin((DOAP.release, DOAP.created))
+        mapper()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        del Project.db, Release.db
+
+    def _project(self, releases):
+        p = Project(name="rdfalchemy")
+        p.releases = [Release(name=i, created=2000 + i) for i in releases]
+        return p
+
+    def test_aggregates(self):
+        p = self._project([3, 1, 2])
+        assert p.release_count == 3
+        assert p.total == 6
+        assert p.first_release == 2001
+        assert p.last_release == 2003
+
+    def test_no_values(self):
+        p = Project(name="rdfalchemy")
+        assert p.release_count == 0
+        assert p.total == 0
+        assert p.last_release is None
+
+    def test_mixed_literals(self):
+        p = self._project([1, 2])
+        release = p.releases[0]
+        for value in [Literal("n/a"), Literal(2.5), Literal(Decimal("0.5")), Literal(True)]:
+            p.db.add((release.resUri, DOAP.revision, value))
+            p.db.add((release.resUri, DOAP.created, value))
+        # what is not a number is skipped
+        assert p.total == 6.0
+        assert p.first_release == 0.5
+        assert p.last_release == 2002
+        # without numbers the values of one type
+        p = Project(name="dated")
+        p.releases = [Release(created="2001-05"), Release(created="2003-01")]
+        assert p.last_release == "2003-01"
+
+    def test_read_only(self):
+        p = self._project([1])
+        with self.assertRaises(AttributeError):
+            p.release_count = 4
+
+    def test_cached(self):
+        p = self._project([1, 2])
+        assert p.release_count == 2
+        p.db.add((p.resUri, DOAP.release, URIRef("urn:release:3")))
+        assert p.release_count == 2
+        del p.release_count
+        assert p.release_count == 3
+
+    def test_cache_follows_changes(self):
+        Project.db = Release.db = ObservableGraph(Project.db)
+        p = self._project([1, 2])
+        assert p.release_count == 2
+        p.releases = [Release(name=5, created=2005)]
+        assert p.release_count == 1
+        assert p.last_release == 2005
+
+    def test_prefetch(self):
+        for i in range(5):
+            self._project(range(i))
+        found = list(Project.ClassInstances(load=['release_count']))
+        assert sorted(p.__dict__["COUNT(%s)" % DOAP.release.n3()] for p in found) == [0, 1, 2, 3, 4]
+
+    def test_remote(self):
+        uri = URIRef("urn:project:rdfalchemy")
+        Project.db = db = RecordingGraph([(uri, Literal(12))])
+        p = Project(uri)
+        assert p.release_count == 12
+        assert "COUNT(?o)" in db.queries[-1]
+        assert "GROUP BY ?s" in db.queries[-1]
+        assert p.last_release == 12
+        assert "MAX(?o)" in db.queries[-1]
+        assert "%s/%s" % (DOAP.release.n3(), DOAP.created.n3()) in db.queries[-1]
@@ -0,0 +1,129 @@
+import gc
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, Literal
+
+import rdfalchemy
+from rdfalchemy.cache import InstanceCache, LRUCache, NoCache, TTLCache
+from rdfalchemy.identity import identity_map
+from rdfalchemy.samples.doap import FOAF
+from rdfalchemy.samples.foaf import Person
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# the attributes of the shared Person class the tests replace
+_REPLACED = ('db', 'nick', 'mbox', 'm')
+_MISSING = object()
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        self._saved = {name: vars(Person).get(name, _MISSING) for name in _REPLACED}
+        Person.db = ConjunctiveGraph()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        for name, value in self._saved.items():
+            if value is _MISSING:
+                if name in vars(Person):
+                    delattr(Person, name)
+            else:
+                setattr(Person, name, value)
+
+    def _behind_the_back(self, p, value):
+        Person.db.set((p.resUri, FOAF.nick, Literal(value)))
+
+    def test_default(self):
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick)
+        assert isinstance(Person.nick.cache, InstanceCache)
+        p = Person(nick="phil")
+        self._behind_the_back(p, "pc")
+        assert p.nick == "phil"
+        assert Person.nick.cache_info()[:2] == (1, 0)
+
+    def test_no_cache(self):
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick, cache='none')
+        assert isinstance(Person.nick.cache, NoCache)
+        p = Person(nick="phil")
+        assert p.nick == "phil"
+        self._behind_the_back(p, "pc")
+        assert p.nick == "pc"
+        assert Person.nick.cache_info()[:2] == (0, 2)
+
+    def test_ttl(self):
+        clock = Clock()
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick, cache=TTLCache(10, clock=clock))
+        p = Person(nick="phil")
+        self._behind_the_back(p, "pc")
+        clock.now = 9
+        assert p.nick == "phil"
+        clock.now = 10
+        assert p.nick == "pc"
+
+    def test_ttl_discard(self):
+        clock = Clock()
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick, cache=TTLCache(10, clock=clock))
+        p = Person(nick="phil")
+        assert FOAF.nick in p.__dict__['_cache_expires']
+        Person.nick._drop_cache(p)
+        assert FOAF.nick not in p.__dict__['_cache_expires']
+
+    def test_ttl_from_number(self):
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick, cache=30)
+        assert isinstance(Person.nick.cache, TTLCache)
+        assert Person.nick.cache.seconds == 30
+
+    def test_lru(self):
+        lru = LRUCache(2)
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick, cache=lru)
+        Person.mbox = rdfalchemy.rdfSingle(FOAF.mbox, cache=lru)
+        p1, p2 = Person(nick="a"), Person(nick="b")
+        p1.mbox = "a@example.com"
+        assert len(lru) == 2
+        assert FOAF.nick not in p1.__dict__
+        assert p1.nick == "a"
+        assert FOAF.nick not in p2.__dict__
+        assert len(lru) == 2
+
+    def test_lru_weak(self):
+        lru = LRUCache(10)
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick, cache=lru)
+        p = Person(nick="a")
+        assert len(lru) == 1
+        # the identity map holds recent instances too
+        identity_map(Person.db).clear()
+        del p
+        gc.collect()
+        assert len(lru) == 0
+
+    def test_not_write_through(self):
+        Person.nick = rdfalchemy.rdfSingle(FOAF.nick, cache=InstanceCache(write_through=False))
+        p = Person()
+        p.nick = "phil"
+        assert FOAF.nick not in p.__dict__
+        assert p.nick == "phil"
+        assert FOAF.nick in p.__dict__
+
+    def test_multiple(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi, cache='none')
+        p = Person()
+        p.m = ['a', 'b']
+        Person.db.remove((p.resUri, FOAF.multi, Literal('a')))
+        assert p.m == ['b']
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            rdfalchemy.rdfSingle(FOAF.nick, cache='forever')
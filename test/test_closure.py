@@ -0,0 +1,104 @@
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, Namespace, RDFS
+
+import rdfalchemy
+from rdfalchemy.closure import build_closure, drop_closure, get_closure
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.rdfs_subject import rdfsClass
+from rdfalchemy.samples.foaf import Person
+
+NS = Namespace('http://example.com/taxonomy/')
+
+
+class ClosureTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        self.db = ObservableGraph(ConjunctiveGraph())
+        # a tree of 3 levels and a diamond below it
+        for i in range(3):
+            self.db.add((NS['c%d' % i], RDFS.subClassOf, NS.root))
+            for j in range(3):
+                self.db.add((NS['c%d%d' % (i, j)], RDFS.subClassOf, NS['c%d' % i]))
+        self.db.add((NS.leaf, RDFS.subClassOf, NS.c00))
+        self.db.add((NS.leaf, RDFS.subClassOf, NS.c10))
+        self.index = build_closure(self.db, RDFS.subClassOf)
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+
+    def check(self):
+        nodes = set(self.db.subjects(RDFS.subClassOf)) | set(self.db.objects(None, RDFS.subClassOf))
+        for node in nodes:
+            assert set(self.index.ancestors(node)) == set(
+                self.db.transitive_objects(node, RDFS.subClassOf)), node
+            assert set(self.index.descendants(node)) == set(
+                self.db.transitive_subjects(RDFS.subClassOf, node)), node
+
+    def test_closure(self):
+        assert build_closure(self.db, RDFS.subClassOf) is self.index
+        assert set(self.index.ancestors(NS.leaf)) == {NS.leaf, NS.c00, NS.c10, NS.c0, NS.c1, NS.root}
+        assert len(self.index.descendants(NS.root)) == 14
+        self.check()
+
+    def test_incremental(self):
+        self.check()
+        self.db.add((NS.c2, RDFS.subClassOf, NS.c11))
+        self.check()
+        self.db.remove((NS.leaf, RDFS.subClassOf, NS.c00))
+        self.check()
+        # a cycle
+        self.db.add((NS.root, RDFS.subClassOf, NS.leaf))
+        self.check()
+        self.db.remove((NS.c1, None, None))
+        self.check()
+        self.db.remove((None, RDFS.subClassOf, NS.c2))
+        self.check()
+        self.db.remove((None, None, None))
+        self.check()
+        assert len(self.index) == 0
+
+    def test_rdfs_class(self):
+        db = rdfsClass.db
+        rdfsClass.db = self.db
+        try:
+            assert {c.resUri for c in rdfsClass(NS.c01).transitive_subClassOf} == {NS.c01, NS.c0, NS.root}
+            assert len(rdfsClass(NS.c1).transitive_subClasses) == 5
+        finally:
+            rdfsClass.db = db
+
+    def test_owl_transitive(self):
+        Person.db = self.db
+        Person.ancestors = rdfalchemy.owlTransitive(RDFS.subClassOf)
+        try:
+            p = Person(NS.leaf)
+            assert len(p.ancestors) == 6
+            drop_closure(self.db, RDFS.subClassOf)
+            assert get_closure(self.db, RDFS.subClassOf) is None
+            Person.ancestors._drop_cache(p)
+            assert len(p.ancestors) == 6
+        finally:
+            del Person.ancestors, Person.db
+
+    def test_owl_transitive_follows_edges(self):
+        Person.db = self.db
+        Person.ancestors = rdfalchemy.owlTransitive(RDFS.subClassOf)
+        try:
+            p = Person(NS.c00)
+            assert len(p.ancestors) == 3
+            # an edge above the node, (c00, subClassOf) does not change
+            self.db.add((NS.root, RDFS.subClassOf, NS.top))
+            assert len(p.ancestors) == 4
+            self.db.remove((NS.c0, RDFS.subClassOf, NS.root))
+            assert {a.resUri for a in p.ancestors} == {NS.c00, NS.c0}
+        finally:
+            del Person.ancestors, Person.db
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,15 @@ import logging
 import sys
 import unittest
 
-from rdflib import ConjunctiveGraph
+from rdflib import ConjunctiveGraph, Literal, URIRef
 
 import rdfalchemy
+from rdfalchemy.events import ObservableGraph
 from rdfalchemy.samples.doap import FOAF
 from rdfalchemy.samples.foaf import Person
+from rdfalchemy.orm import mapper
+
+from recording import RecordingGraph
 
 
 class CountTest(unittest.TestCase):
@@ -67,3 +71,94 @@ class CountTest(unittest.TestCase):
 
         p.c = ['things', 44]
         assert len(Person.db) == 16, len(Person.db)
+
+    def test_multi_against_store(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi)
+        p = Person(last="Cooper")
+        p.m = ['a', 'b']
+        # added behind the back of the cache
+        Person.db.add((p.resUri, FOAF.multi, rdfalchemy.Literal('z')))
+        p.m = ['a', 'c']
+        assert set(Person.db.objects(p.resUri, FOAF.multi)) == {
+            rdfalchemy.Literal('a'), rdfalchemy.Literal('c')}
+
+    def test_multi_batched(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi)
+        p = Person(last="Cooper")
+        p.m = list(range(5000))
+        writes = []
+        Person.db = events = ObservableGraph(Person.db)
+        events.subscribe(lambda event, triple: writes.append(event))
+        p.m = list(range(1, 5001))
+        assert sorted(writes) == ['add', 'remove']
+        p.m = None
+        assert len(Person.db) == 2
+
+    def test_lazy(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi, lazy=True)
+        p = Person(last="Cooper")
+        p.m = list(range(1000))
+        values = p.m
+        assert isinstance(values, rdfalchemy.descriptors.LazyCollection)
+        assert len(values) == 1000
+        assert 999 in values
+        assert 1000 not in values
+        assert len(values[10:20]) == 10
+        assert values[-1] in values
+        assert sorted(values) == list(range(1000))
+        p.m = ['a']
+        assert list(p.m) == ['a']
+        del p.m
+        assert not p.m
+
+    def test_lazy_wraps_on_access(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi, range_type=FOAF.Person, lazy=True)
+        mapper()
+        p = Person(last="Cooper")
+        friends = [Person(first=str(i)) for i in range(3)]
+        p.m = friends
+        wrapped = []
+        original = Person.m._object2value
+
+        def counting(o):
+            wrapped.append(o)
+            return original(o)
+        Person.m._object2value = counting
+        try:
+            first = next(iter(p.m))
+            assert isinstance(first, Person)
+            assert len(wrapped) == 1
+            assert len(p.m) == 3
+            assert len(wrapped) == 1
+        finally:
+            del Person.m._object2value
+
+    def test_lazy_remote(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi, lazy=True)
+        Person.db = db = RecordingGraph([(Literal(100000),)])
+        p = Person(URIRef("urn:people:cooper"))
+        assert len(p.m) == 100000
+        assert "COUNT(*)" in db.queries[-1]
+        assert "LIMIT" not in db.queries[-1]
+        p.m[500:510]
+        assert db.queries[-1].endswith("ORDER BY ?o LIMIT 10 OFFSET 500")
+
+    def test_lazy_backwards(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi, lazy=True)
+        p = Person(last="Cooper")
+        p.m = list(range(10))
+        forwards = list(p.m)
+        assert p.m[5:1:-1] == forwards[5:1:-1]
+        assert p.m[::-3] == forwards[::-3]
+        assert p.m[1:5:-1] == []
+
+    def test_lazy_len_follows_writes(self):
+        Person.m = rdfalchemy.rdfMultiple(FOAF.multi, lazy=True)
+        for db in (ConjunctiveGraph(), ObservableGraph(ConjunctiveGraph())):
+            Person.db = db
+            p = Person(last="Cooper")
+            p.m = list(range(10))
+            values = p.m
+            assert len(values) == 10
+            db.add((p.resUri, FOAF.multi, Literal(10)))
+            assert len(values) == 11
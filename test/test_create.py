@@ -0,0 +1,113 @@
+import logging
+import sys
+import unittest
+
+from rdflib import BNode, ConjunctiveGraph, Literal, URIRef
+
+import rdfalchemy
+from rdfalchemy.descriptors import rdfLocale
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.samples.company import Company
+from rdfalchemy.samples.foaf import Person
+from rdfalchemy.sparql import bnode_groups
+
+from recording import RecordingGraph
+
+
+class BulkCreateTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Company.db = ConjunctiveGraph()
+        Person.db = ConjunctiveGraph()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        del Company.db, Person.db
+
+    def test_dict_rows(self):
+        rows = ({'symbol': 'SYM%d' % i, 'companyName': 'Company %d' % i,
+                 'stock': ['A', 'B']} for i in range(100))
+        assert Company.bulk_create(rows) == 100
+        assert Company.count() == 100
+        c = Company.get_by(symbol='SYM42')
+        assert c.companyName == 'Company 42'
+        assert sorted(c.stock) == ['A', 'B']
+
+    def test_bad_rows(self):
+        db = Company.db = RecordingGraph()
+        rows = [{'resUri': '<urn:company:ibm>', 'symbol': 'IBM'},
+                {'resUri': 'http://example.com/p1', 'symbol': 'P1'}]
+        self.assertRaises(AttributeError, Company.bulk_create, rows)
+        self.assertRaises(AttributeError, Company.bulk_create,
+                          ({'symbol': 'SYM%d' % i, 'nosuch': i} for i in range(10)), chunk_size=4)
+        self.assertRaises(AttributeError, Company.bulk_create,
+                          [('IBM', 1)] * 10, fields=['symbol', 'nosuch'], chunk_size=4)
+        # a list for an rdfSingle, as on assignment
+        self.assertRaises(AttributeError, Company.bulk_create, [{'symbol': ['IBM', 'JAVA']}])
+        assert not db.changes
+
+    def test_locale_rows(self):
+        Person.title_fr = rdfLocale(FOAF.title, 'fr')
+        try:
+            Person.bulk_create([{'resUri': '<urn:people:cooper>', 'title_fr': 'Monsieur'}])
+            p = Person(URIRef('urn:people:cooper'))
+            assert p.db.value(p.resUri, FOAF.title) == Literal('Monsieur', lang='fr')
+            assert p.title_fr == 'Monsieur'
+        finally:
+            del Person.title_fr
+
+    def test_tuple_rows(self):
+        rows = [("<urn:company:ibm>", 'IBM', None), ("<urn:company:java>", 'JAVA', 'Sun')]
+        assert Company.bulk_create(rows, fields=['resUri', 'symbol', 'companyName']) == 2
+        assert Company(URIRef("urn:company:java")).companyName == 'Sun'
+        assert Company(URIRef("urn:company:ibm")).companyName is None
+
+    def test_list_rows(self):
+        Person.knows = rdfalchemy.rdfList(FOAF.knows)
+        try:
+            Person.bulk_create([{'last': 'Cooper', 'knows': ['Ben', 'Matt']}])
+            p = Person.get_by(last='Cooper')
+            assert p.knows == ['Ben', 'Matt']
+        finally:
+            del Person.knows
+
+    def test_remote_chunks(self):
+        Company.db = db = RecordingGraph()
+        Company.bulk_create(({'symbol': 'SYM%d' % i} for i in range(10)), chunk_size=4)
+        # a type and a symbol triple per row
+        assert [len(chunk) for chunk in db.inserts] == [4, 4, 4, 4, 4]
+
+    def test_remote_whole_rows(self):
+        Company.db = db = RecordingGraph()
+        rows = ({'symbol': 'SYM%d' % i, 'companyName': 'Company %d' % i} for i in range(5))
+        Company.bulk_create(rows, chunk_size=4)
+        # three triples per row, a row is never split between requests
+        assert [len(chunk) for chunk in db.inserts] == [3, 3, 3, 3, 3]
+        for chunk in db.inserts:
+            assert len({s for s, p, o in chunk}) == 1
+
+    def test_remote_list_rows(self):
+        Person.db = db = RecordingGraph()
+        Person.knows = rdfalchemy.rdfList(FOAF.knows)
+        try:
+            Person.bulk_create([{'last': 'Cooper', 'knows': ['Ben', 'Matt', 'Joe']}], chunk_size=2)
+            # the cells of the list are blank nodes of the same request
+            assert len(db.inserts) == 1
+        finally:
+            del Person.knows
+
+    def test_bnode_groups(self):
+        a, b, c = BNode(), BNode(), BNode()
+        x = URIRef('urn:x')
+        triples = [(a, FOAF.knows, x), (x, FOAF.knows, x), (b, FOAF.knows, c),
+                   (c, FOAF.knows, a), (b, FOAF.name, Literal('b'))]
+        groups = bnode_groups(triples)
+        assert len(groups) == 2
+        assert [(x, FOAF.knows, x)] in groups
+
+
+if __name__ == '__main__':
+    unittest.main()
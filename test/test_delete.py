@@ -2,13 +2,15 @@ import logging
 import sys
 import unittest
 
-from rdflib import ConjunctiveGraph
+from rdflib import BNode, ConjunctiveGraph, Literal, RDF, URIRef
 
 import rdfalchemy
 from rdfalchemy.samples.doap import FOAF
 from rdfalchemy.samples.foaf import Person
 from rdfalchemy.orm import mapper
 
+from recording import EndpointGraph, RecordingGraph
+
 
 class DeleteTest(unittest.TestCase):
     def setUp(self):
@@ -51,3 +53,55 @@ class DeleteTest(unittest.TestCase):
         assert len(Person.db) == 11
         del p1.knows
         assert len(Person.db) == 3
+
+    def test_remove_long_list(self):
+        # deeper than the recursion limit
+        Person.knows = rdfalchemy.rdfList(FOAF.knows)
+        p = Person(last="Cooper")
+        p.knows = [Literal(i) for i in range(sys.getrecursionlimit() + 100)]
+        p._remove()
+        assert len(Person.db) == 0
+
+    def test_remove_shared_bnode(self):
+        p1 = Person(last="Cooper")
+        p2 = Person(last="Smith")
+        address = BNode()
+        Person.db.add((address, RDF.value, Literal("Main Street")))
+        Person.db.add((p1.resUri, FOAF.based_near, address))
+        Person.db.add((p2.resUri, FOAF.based_near, address))
+        p1._remove()
+        # still referenced by p2
+        assert (address, RDF.value, Literal("Main Street")) in Person.db
+        p2._remove()
+        assert len(Person.db) == 0
+
+    def test_remove_diamond(self):
+        # b is referenced twice from inside the deleted tree
+        p = Person(last="Cooper")
+        a, b = BNode(), BNode()
+        for s, o in [(p.resUri, a), (p.resUri, b), (a, b)]:
+            Person.db.add((s, FOAF.knows, o))
+        Person.db.add((b, RDF.value, Literal("b")))
+        p._remove()
+        assert len(Person.db) == 0
+
+    def test_remove_remote(self):
+        db = RecordingGraph(found=False)
+        uri = URIRef("urn:people:cooper")
+        rdfalchemy.rdfSubject(uri)._remove(db=db, object_cascade=True)
+        assert len(db.updates) == 1
+        assert "DELETE WHERE { <urn:people:cooper> ?p ?o }" in db.updates[0]
+
+    def test_remove_remote_bnodes(self):
+        db = EndpointGraph()
+        cooper, smith = URIRef("urn:people:cooper"), URIRef("urn:people:smith")
+        a, b, other = BNode(), BNode(), BNode()
+        for s, p, o in [(cooper, FOAF.based_near, a), (a, RDF.value, Literal("Main Street")),
+                        (a, FOAF.based_near, b), (b, RDF.value, Literal("Springfield")),
+                        (smith, FOAF.based_near, other), (other, RDF.value, Literal("Main Street"))]:
+            db.graph.add((s, p, o))
+        rdfalchemy.rdfSubject(cooper)._remove(db=db)
+        assert len(db.updates) == 1
+        assert "_:" not in db.updates[0]
+        assert set(db.graph) == {(smith, FOAF.based_near, other),
+                                 (other, RDF.value, Literal("Main Street"))}
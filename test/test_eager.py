@@ -0,0 +1,103 @@
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, Literal, RDF, URIRef
+
+import rdfalchemy
+from rdfalchemy import store
+from rdfalchemy.samples.doap import FOAF
+from rdfalchemy.samples.foaf import Person
+from rdfalchemy.orm import mapper
+
+from recording import RecordingGraph
+
+
+class EagerLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Person.db = ConjunctiveGraph()
+        Person.knows = rdfalchemy.rdfMultiple(FOAF.knows, range_type=FOAF.Person)
+        mapper()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        del Person.knows, Person.db
+
+    def test_load_class_instances(self):
+        people = [Person(last="Cooper%d" % i) for i in range(100)]
+        people[0].knows = [people[1], people[2]]
+        found = list(Person.ClassInstances(load=['last', 'knows']))
+        assert len(found) == 100
+        for p in found:
+            assert FOAF.surname in p.__dict__
+            assert FOAF.knows in p.__dict__
+        p0 = [p for p in found if p.last == "Cooper0"][0]
+        assert sorted(k.last for k in p0.knows) == ["Cooper1", "Cooper2"]
+        assert all(isinstance(k, Person) for k in p0.knows)
+
+    def test_load_missing_value(self):
+        Person(last="Cooper")
+        Person(first="Philip")
+        found = list(Person.ClassInstances(load=['first']))
+        assert sorted(str(p.first) for p in found) == ['None', 'Philip']
+
+    def test_load_without_descriptor(self):
+        Person(last="Cooper")
+        with self.assertRaises(AttributeError):
+            list(Person.ClassInstances(load=['nothere']))
+
+    def test_load_streams(self):
+        for i in range(200):
+            Person(last="Cooper%d" % i)
+        sizes = []
+        original = Person.last._prefetch
+
+        def recording(objs):
+            sizes.append(len(objs))
+            return original(objs)
+        Person.last._prefetch = recording
+        size, store.LOCAL_BATCH_SIZE = store.LOCAL_BATCH_SIZE, 150
+        try:
+            found = Person.ClassInstances(load=['last'])
+            assert FOAF.surname in next(found).__dict__
+            # one bounded batch read so far
+            assert sizes == [150]
+            assert len(list(found)) == 199
+        finally:
+            del Person.last._prefetch
+            store.LOCAL_BATCH_SIZE = size
+
+    def test_load_scans_predicate(self):
+        class ScanGraph(ConjunctiveGraph):
+            def __init__(self):
+                super().__init__()
+                self.calls = []
+
+            def objects(self, subject=None, predicate=None, unique=False):
+                self.calls.append(('objects', predicate))
+                return super().objects(subject, predicate, unique)
+
+            def subject_objects(self, predicate=None, unique=False):
+                self.calls.append(('subject_objects', predicate))
+                return super().subject_objects(predicate, unique)
+        Person.db = db = ScanGraph()
+        for i in range(200):
+            # behind the back of the descriptors, nothing cached
+            db.add((URIRef("urn:people:%d" % i), RDF.type, Person.rdf_type))
+            db.add((URIRef("urn:people:%d" % i), FOAF.surname, Literal("Cooper%d" % i)))
+        found = list(Person.ClassInstances(load=['last']))
+        assert sorted(p.last for p in found)[:2] == ["Cooper0", "Cooper1"]
+        assert [c for c in db.calls if c[1] == FOAF.surname] == [('subject_objects', FOAF.surname)]
+
+    def test_load_single_nodes_remote(self):
+        Person.knows = rdfalchemy.rdfMultiple(FOAF.knows)
+        people = [Person(URIRef("urn:people:%d" % i)) for i in range(10)]
+        Person.db = db = RecordingGraph(
+            [(p.resUri, URIRef("urn:people:friend")) for p in people], found=False)
+        Person.knows._prefetch(people)
+        # the values, then the rdf:first and rdf:_1 checks for all of them
+        assert len(db.queries) == 3
@@ -0,0 +1,111 @@
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, RDF, URIRef
+
+import rdfalchemy
+from rdfalchemy import Literal
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.samples.foaf import Person
+
+
+class EventsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Person.db = ObservableGraph(ConjunctiveGraph())
+        self.events = []
+        Person.db.subscribe(lambda event, triple: self.events.append((event, triple)))
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        del Person.db
+
+    def test_events(self):
+        p = Person(last="Cooper")
+        assert ('add', (p.resUri, FOAF.surname, Literal("Cooper"))) in self.events
+
+    def test_change_through_other_instance(self):
+        p1 = Person(last="Cooper")
+        p2 = Person(p1.resUri)
+        assert p1.last == "Cooper" and p2.last == "Cooper"
+        p2.last = "Smith"
+        assert p1.last == "Smith"
+
+    def test_change_through_db(self):
+        p = Person(last="Cooper", first="Philip")
+        assert p.last == "Cooper" and p.first == "Philip"
+        Person.db.set((p.resUri, FOAF.surname, Literal("Smith")))
+        assert p.last == "Smith"
+        # other values stay cached
+        assert p.__dict__['_cache_versions'][FOAF.firstName] == Person.db.version(p.resUri, FOAF.firstName)
+
+    def test_notify(self):
+        p = Person(last="Cooper")
+        assert p.last == "Cooper"
+        Person.db.graph.set((p.resUri, FOAF.surname, Literal("Jones")))
+        assert p.last == "Cooper"
+        Person.db.notify('remove', (p.resUri, None, None))
+        assert p.last == "Jones"
+
+    def test_list_cells(self):
+        Person.knows = rdfalchemy.rdfList(FOAF.knows)
+        try:
+            p = Person(last="Cooper")
+            p.knows = ["a", "b", "c"]
+            assert p.knows == ["a", "b", "c"]
+            # a cell changed through the db, not through (p, knows)
+            cell = Person.db.value(p.resUri, FOAF.knows)
+            Person.db.set((cell, RDF.first, Literal("z")))
+            assert p.knows == ["z", "b", "c"]
+        finally:
+            del Person.knows
+
+    def test_container_members(self):
+        Person.seq = rdfalchemy.rdfContainer(FOAF.seq)
+        try:
+            p = Person(last="Cooper")
+            p.seq = ["a", "b"]
+            seq = Person.db.value(p.resUri, FOAF.seq)
+            Person.db.add((seq, RDF._3, Literal("c")))
+            assert p.seq == ["a", "b", "c"]
+        finally:
+            del Person.seq
+
+    def test_transitive_edges(self):
+        Person.ancestors = rdfalchemy.owlTransitive(FOAF.parent)
+        try:
+            a, b, c = (URIRef("urn:people:%s" % n) for n in "abc")
+            Person.db.add((a, FOAF.parent, b))
+            p = Person(a)
+            assert len(p.ancestors) == 2
+            Person.db.add((b, FOAF.parent, c))
+            assert len(p.ancestors) == 3
+        finally:
+            del Person.ancestors
+
+    def test_bounded_versions(self):
+        Person.db = ObservableGraph(ConjunctiveGraph(), max_versions=10)
+        p = Person(last="Cooper")
+        assert p.last == "Cooper"
+        for i in range(100):
+            Person(last="Other %d" % i)
+        assert len(Person.db._stamps) <= 10
+        Person.db.graph.set((p.resUri, FOAF.surname, Literal("Smith")))
+        # forgotten versions move on, the value is read again
+        assert p.last == "Smith"
+
+    def test_add_n_contexts(self):
+        graph = ConjunctiveGraph()
+        context = graph.get_context(URIRef("urn:context"))
+        Person.db = ObservableGraph(graph)
+        events = []
+        Person.db.subscribe(lambda event, triple: events.append((event, triple)))
+        triple = (URIRef("urn:people:a"), FOAF.surname, Literal("A"))
+        Person.db.addN([triple + (context,)])
+        assert triple in context
+        assert events == [('add', triple)]
@@ -0,0 +1,66 @@
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph
+
+from rdfalchemy import Literal, RDF, URIRef
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.query import plan
+from rdfalchemy.samples.foaf import Person
+
+from recording import RecordingGraph
+
+
+class FilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Person.db = ConjunctiveGraph()
+        for i in range(50):
+            Person(last="Cooper", first="P%d" % (i % 10))
+        Person(last="Smith", first="P1")
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+
+    def test_filter_by(self):
+        assert len(list(Person.filter_by(last="Cooper"))) == 50
+        assert len(list(Person.filter_by(last="Cooper", first="P1"))) == 5
+        assert len(list(Person.filter_by(first="P1", last="Cooper"))) == 5
+        assert len(list(Person.filter_by(first="P1", last="Smith"))) == 1
+        assert list(Person.filter_by(first="P11")) == []
+
+    def test_plan(self):
+        filters = [(FOAF.surname, Literal("Cooper")),
+                   (FOAF.firstName, Literal("P1"))]
+        steps = plan(Person.db, filters)
+        assert [est for est, f in steps] == [6, 50]
+        assert steps[0][1] == filters[1]
+
+
+class RemoteFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self._db = Person.db
+
+    def tearDown(self):
+        Person.db = self._db
+
+    def test_filter_by_single_query(self):
+        Person.db = RecordingGraph([(URIRef('urn:a'),), (URIRef('urn:b'),)])
+        found = list(Person.filter_by(last="Cooper", first="Ben"))
+        assert [p.resUri for p in found] == [URIRef('urn:a'), URIRef('urn:b')]
+        assert len(Person.db.queries) == 1
+        query = Person.db.queries[0]
+        assert query.startswith("SELECT DISTINCT ?s WHERE {")
+        assert '?s %s "Cooper" .' % FOAF.surname.n3() in query
+        assert '?s %s "Ben" .' % FOAF.firstName.n3() in query
+        assert '?s %s %s .' % (RDF.type.n3(), FOAF.Person.n3()) in query
+
+    def test_get_by_limit(self):
+        Person.db = RecordingGraph([(URIRef('urn:a'),)])
+        assert Person.get_by(last="Cooper").resUri == URIRef('urn:a')
+        assert Person.db.queries[0].endswith("LIMIT 1")
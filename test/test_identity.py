@@ -0,0 +1,100 @@
+import gc
+import logging
+import sys
+import unittest
+import weakref
+
+from rdflib import ConjunctiveGraph, Literal, URIRef
+
+from rdfalchemy import rdfSubject
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.identity import identity_map
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.samples.foaf import Person
+from rdfalchemy.session import Session
+
+
+class IdentityTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Person.db = ConjunctiveGraph()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+
+    def test_same_instance(self):
+        p = Person(last="Cooper")
+        assert Person(p.resUri) is p
+        assert Person(p.n3()) is p
+        assert Person(p) is p
+        assert Person.get_by(last="Cooper") is p
+        # another class gets its own instance
+        assert rdfSubject(p) is not p
+
+    def test_kwargs_on_existing(self):
+        p = Person(last="Cooper")
+        Person(p.resUri, first="Philip")
+        assert p.first == "Philip"
+
+    def test_per_graph(self):
+        p = Person(last="Cooper")
+        Person.db = ConjunctiveGraph()
+        assert Person(p.resUri) is not p
+
+    def test_lru(self):
+        identity_map(Person.db).resize(2)
+        uris = [Person(last="Cooper%d" % i).resUri for i in range(4)]
+        gc.collect()
+        assert len(identity_map(Person.db)) == 2
+        # the two most recent are kept
+        assert {p.resUri for p in identity_map(Person.db).values()} == set(uris[-2:])
+        identity_map(Person.db).resize(0)
+        gc.collect()
+        assert len(identity_map(Person.db)) == 0
+        # every instance of the class is gone, a new one is built
+        assert isinstance(Person(uris[0]), Person)
+
+    def test_rewrap_reads_again(self):
+        p = Person(last="Cooper")
+        assert p.last == "Cooper"
+        Person.db.set((p.resUri, FOAF.surname, Literal("Smith")))
+        # a plain graph keeps no versions, the cached value is dropped
+        assert Person(p.resUri) is p
+        assert FOAF.surname not in p.__dict__
+        assert p.last == "Smith"
+
+    def test_rewrap_keeps_versioned_values(self):
+        Person.db = ObservableGraph(ConjunctiveGraph())
+        p = Person(last="Cooper")
+        assert p.last == "Cooper"
+        assert Person(p.resUri).__dict__[FOAF.surname] == "Cooper"
+        Person.db.set((p.resUri, FOAF.surname, Literal("Smith")))
+        assert Person(p.resUri).last == "Smith"
+
+    def test_remove_and_rename(self):
+        p = Person(last="Cooper")
+        p._rename(URIRef("urn:people:cooper"))
+        assert Person(URIRef("urn:people:cooper")) is p
+        p._remove()
+        assert Person(URIRef("urn:people:cooper")) is not p
+
+    def test_graph_freed(self):
+        refs = []
+        for _i in range(5):
+            Person.db = db = ConjunctiveGraph()
+            session = Session(db)
+            # instances holding their graph, held by its identity map
+            rdfSubject(Person(last="Cooper"))
+            rdfSubject(session.get(Person, URIRef("urn:people:cooper")))
+            refs.extend([weakref.ref(db), weakref.ref(session)])
+        Person.db = ConjunctiveGraph()
+        del db, session
+        gc.collect()
+        assert not [ref for ref in refs if ref() is not None]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+import logging
+import random
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, Graph, Literal, Namespace, RDF, RDFS
+
+import rdfalchemy
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.exceptions import RDFAlchemyError
+from rdfalchemy.inference import INFERRED, Reasoner, drop_reasoner, get_reasoner, materialize
+from rdfalchemy.namespaces import OWL
+from rdfalchemy.rdfs_subject import rdfsSubject
+
+NS = Namespace('http://example.com/inference/')
+
+
+class Animal(rdfsSubject):
+    rdf_type = NS.Animal
+    name = rdfalchemy.rdfSingle(NS.name)
+    ancestors = rdfalchemy.owlTransitive(NS.parent)
+
+
+class InferenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        self.db = ObservableGraph(ConjunctiveGraph())
+        self.db.add((NS.Dog, RDFS.subClassOf, NS.Mammal))
+        self.db.add((NS.Mammal, RDFS.subClassOf, NS.Animal))
+        self.db.add((NS.rex, RDF.type, NS.Dog))
+        self.reasoner = materialize(self.db)
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        drop_reasoner(self.db)
+
+    def inferred(self):
+        return set(self.reasoner.inferred)
+
+    def check(self):
+        # the incremental changes end where a rebuild does
+        found = self.inferred()
+        self.reasoner.rebuild()
+        assert found == self.inferred()
+
+    def test_subclass(self):
+        assert (NS.Dog, RDFS.subClassOf, NS.Animal) in self.db
+        assert (NS.rex, RDF.type, NS.Animal) in self.db
+        assert (NS.rex, RDF.type, NS.Animal) in self.reasoner.inferred
+        # asserted triples are not copied
+        assert (NS.rex, RDF.type, NS.Dog) not in self.reasoner.inferred
+        assert materialize(self.db) is self.reasoner
+
+    def test_domain_range(self):
+        self.db.add((NS.owns, RDFS.domain, NS.Person))
+        self.db.add((NS.owns, RDFS.range, NS.Dog))
+        self.db.add((NS.bob, NS.owns, NS.fido))
+        assert (NS.bob, RDF.type, NS.Person) in self.db
+        assert (NS.fido, RDF.type, NS.Animal) in self.db
+        self.db.add((NS.bob, NS.owns, Literal('a bike')))
+        assert not any(isinstance(s, Literal) for s in self.db.subjects(RDF.type, NS.Dog))
+        self.check()
+
+    def test_properties(self):
+        self.db.add((NS.mother, RDFS.subPropertyOf, NS.parent))
+        self.db.add((NS.parent, OWL.inverseOf, NS.child))
+        self.db.add((NS.parent, RDF.type, OWL.TransitiveProperty))
+        self.db.add((NS.sibling, RDF.type, OWL.SymmetricProperty))
+        self.db.add((NS.rex, NS.mother, NS.lassie))
+        self.db.add((NS.lassie, NS.parent, NS.old))
+        self.db.add((NS.rex, NS.sibling, NS.rin))
+        assert (NS.rex, NS.parent, NS.lassie) in self.db
+        assert (NS.rex, NS.parent, NS.old) in self.db
+        assert (NS.old, NS.child, NS.rex) in self.db
+        assert (NS.rin, NS.sibling, NS.rex) in self.db
+        self.check()
+
+    def test_remove(self):
+        self.db.add((NS.Dog, RDFS.subClassOf, NS.Pet))
+        self.db.add((NS.Pet, RDFS.subClassOf, NS.Animal))
+        self.db.remove((NS.Mammal, RDFS.subClassOf, NS.Animal))
+        # still an animal through Pet
+        assert (NS.rex, RDF.type, NS.Animal) in self.db
+        assert (NS.Dog, RDFS.subClassOf, NS.Animal) in self.db
+        self.db.remove((NS.Pet, RDFS.subClassOf, NS.Animal))
+        assert (NS.rex, RDF.type, NS.Animal) not in self.db
+        assert (NS.rex, RDF.type, NS.Mammal) in self.db
+        self.check()
+        self.db.add((NS.Mammal, RDFS.subClassOf, NS.Animal))
+        assert (NS.rex, RDF.type, NS.Animal) in self.db
+        self.check()
+
+    def test_asserted_and_inferred(self):
+        # an inferred triple asserted too stays when its premise goes
+        self.db.add((NS.rex, RDF.type, NS.Mammal))
+        self.db.remove((NS.rex, RDF.type, NS.Dog))
+        assert (NS.rex, RDF.type, NS.Mammal) in self.db
+        assert (NS.rex, RDF.type, NS.Animal) in self.db
+        self.check()
+
+    def test_wildcard_remove(self):
+        Animal.db = self.db
+        try:
+            rex = Animal(NS.rex)
+            self.db.add((NS.name, RDFS.domain, NS.Named))
+            rex.name = 'rex'
+            assert (NS.rex, RDF.type, NS.Named) in self.db
+            # set removes (rex, name, None) then adds
+            rex.name = 'Rex'
+            assert (NS.rex, RDF.type, NS.Named) in self.db
+            del rex.name
+            assert (NS.rex, RDF.type, NS.Named) not in self.db
+            self.check()
+        finally:
+            del Animal.db
+
+    def test_class_instances(self):
+        Animal.db = self.db
+        try:
+            self.db.add((NS.felix, RDF.type, NS.Mammal))
+            self.db.add((NS.rex, RDF.type, NS.Pet))
+            found = [a.resUri for a in Animal.ClassInstances()]
+            assert sorted(found) == [NS.felix, NS.rex]
+        finally:
+            del Animal.db
+
+    def test_owl_transitive(self):
+        Animal.db = self.db
+        try:
+            self.db.add((NS.parent, RDF.type, OWL.TransitiveProperty))
+            self.db.add((NS.rex, NS.parent, NS.lassie))
+            self.db.add((NS.lassie, NS.parent, NS.old))
+            rex = Animal(NS.rex)
+            assert set(a.resUri for a in rex.ancestors) == {NS.rex, NS.lassie, NS.old}
+            self.db.remove((NS.lassie, NS.parent, NS.old))
+            assert set(a.resUri for a in rex.ancestors) == {NS.rex, NS.lassie}
+        finally:
+            del Animal.db
+
+    def test_symmetric_inverse_remove(self):
+        self.db.add((NS.r, RDF.type, OWL.SymmetricProperty))
+        self.db.add((NS.q, OWL.inverseOf, NS.r))
+        self.db.add((NS.a, NS.q, NS.b))
+        self.db.add((NS.c, NS.q, NS.d))
+        self.db.remove((NS.r, RDF.type, OWL.SymmetricProperty))
+        assert (NS.a, NS.r, NS.b) not in self.db
+        self.check()
+
+    def test_random_changes(self):
+        # incremental maintenance of random traces ends where a rebuild does
+        nodes = [NS.a, NS.b, NS.c, NS.d]
+        props = [NS.p, NS.q, NS.r]
+
+        def random_triple(rng):
+            return rng.choice([
+                (rng.choice(nodes), RDFS.subClassOf, rng.choice(nodes)),
+                (rng.choice(props), RDFS.subPropertyOf, rng.choice(props)),
+                (rng.choice(props), RDFS.domain, rng.choice(nodes)),
+                (rng.choice(props), RDFS.range, rng.choice(nodes)),
+                (rng.choice(props), OWL.inverseOf, rng.choice(props)),
+                (rng.choice(props), RDF.type, rng.choice([OWL.SymmetricProperty,
+                                                          OWL.TransitiveProperty])),
+                (rng.choice(nodes), RDF.type, rng.choice(nodes)),
+                (rng.choice(nodes), rng.choice(props), rng.choice(nodes)),
+            ])
+        for seed in range(100):
+            rng = random.Random(seed)
+            drop_reasoner(self.db)
+            self.db = ObservableGraph(ConjunctiveGraph())
+            self.reasoner = materialize(self.db)
+            asserted = []
+            for _i in range(30):
+                if asserted and rng.random() < 0.4:
+                    self.db.remove(asserted.pop(rng.randrange(len(asserted))))
+                else:
+                    triple = random_triple(rng)
+                    if triple not in asserted:
+                        asserted.append(triple)
+                    self.db.add(triple)
+            found = self.inferred()
+            self.reasoner.rebuild()
+            assert found == self.inferred(), f"seed {seed}"
+
+    def test_drop(self):
+        drop_reasoner(self.db)
+        assert get_reasoner(self.db) is None
+        assert len(self.db.graph.get_context(INFERRED)) == 0
+        assert (NS.rex, RDF.type, NS.Animal) not in self.db
+        self.db.add((NS.felix, RDF.type, NS.Dog))
+        assert (NS.felix, RDF.type, NS.Animal) not in self.db
+
+    def test_plain_graph(self):
+        with self.assertRaises(RDFAlchemyError):
+            Reasoner(Graph())
+        db = ConjunctiveGraph()
+        db.add((NS.Dog, RDFS.subClassOf, NS.Animal))
+        db.add((NS.rex, RDF.type, NS.Dog))
+        reasoner = materialize(db)
+        assert (NS.rex, RDF.type, NS.Animal) in db
+        # no events, a rebuild follows the changes
+        db.remove((NS.Dog, RDFS.subClassOf, NS.Animal))
+        reasoner.rebuild()
+        assert (NS.rex, RDF.type, NS.Animal) not in db
+        drop_reasoner(db)
+
+
+if __name__ == '__main__':
+    unittest.main()
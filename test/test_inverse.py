@@ -0,0 +1,70 @@
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, URIRef
+
+import rdfalchemy
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.samples.doap import FOAF
+from rdfalchemy.samples.foaf import Person
+from rdfalchemy.orm import mapper
+
+from recording import RecordingGraph
+
+
+class InverseTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Person.db = ConjunctiveGraph()
+        Person.knows = rdfalchemy.rdfMultiple(FOAF.knows, range_type=FOAF.Person)
+        Person.known_by = rdfalchemy.rdfInverse(FOAF.knows, range_type=FOAF.Person)
+        mapper()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+
+    def test_get(self):
+        ben, matt, phil = (Person(first=n) for n in ["Ben", "Matt", "Philip"])
+        ben.knows = [phil]
+        matt.knows = [phil, ben]
+        assert sorted(p.first for p in phil.known_by) == ["Ben", "Matt"]
+        assert all(isinstance(p, Person) for p in phil.known_by)
+        assert [p.first for p in ben.known_by] == ["Matt"]
+        assert matt.known_by == []
+
+    def test_set(self):
+        ben, matt, phil = (Person(first=n) for n in ["Ben", "Matt", "Philip"])
+        ben.knows = [phil]
+        phil.known_by = [matt]
+        assert list(Person.db.subjects(FOAF.knows, phil.resUri)) == [matt.resUri]
+        del phil.known_by
+        assert len(Person.db) == 6
+        assert phil.known_by == []
+
+    def test_cache_follows_changes(self):
+        Person.db = ObservableGraph(Person.db)
+        ben, phil = Person(first="Ben"), Person(first="Philip")
+        assert phil.known_by == []
+        ben.knows = [phil]
+        assert phil.known_by == [ben]
+        del ben.knows
+        assert phil.known_by == []
+
+    def test_prefetch(self):
+        people = [Person(last="Cooper%d" % i) for i in range(100)]
+        people[0].knows = people[1:3]
+        found = list(Person.ClassInstances(load=['known_by']))
+        assert all("^%s" % FOAF.knows in p.__dict__ for p in found)
+        assert people[1].known_by == [people[0]]
+
+    def test_remote(self):
+        Person.db = db = RecordingGraph([(URIRef("urn:people:ben"),
+                                          URIRef("urn:people:cooper"))])
+        p = Person(URIRef("urn:people:cooper"))
+        assert [k.resUri for k in p.known_by] == [URIRef("urn:people:ben")]
+        assert "?s %s ?o" % FOAF.knows.n3() in db.queries[-1]
+        assert "<urn:people:cooper>" in db.queries[-1]
@@ -0,0 +1,248 @@
+import logging
+import sys
+import unittest
+
+from rdflib import BNode, ConjunctiveGraph, Literal, RDF, URIRef
+
+import rdfalchemy
+from rdfalchemy import store
+from rdfalchemy.descriptors import get_list
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.samples.foaf import Person
+
+from rdfalchemy.session import Session
+
+from recording import EndpointGraph, RecordingGraph
+
+
+class ListTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        self._db = Person.db
+        Person.db = ConjunctiveGraph()
+        Person.knows = rdfalchemy.rdfList(FOAF.knows)
+
+    def tearDown(self):
+        del Person.knows
+        Person.db = self._db
+        self._logger.removeHandler(self._stream_handler)
+
+    def test_long_list(self):
+        p = Person(last="Cooper")
+        values = list(range(2000))
+        p.knows = values
+        Person.knows._drop_cache(p)
+        assert p.knows == values
+        assert [v.toPython() for v in get_list(p, FOAF.knows)] == values
+
+    def reread(self, p):
+        Person.knows._drop_cache(p)
+        return list(p.knows)
+
+    def test_edits(self):
+        p = Person(last="Cooper")
+        p.knows = ["a", "b", "c"]
+        expected = ["a", "b", "c"]
+        for edit in [lambda lst: lst.append("d"),
+                     lambda lst: lst.insert(0, "z"),
+                     lambda lst: lst.insert(2, "y"),
+                     lambda lst: lst.pop(),
+                     lambda lst: lst.pop(0),
+                     lambda lst: lst.__setitem__(1, "x"),
+                     lambda lst: lst.__setitem__(slice(1, 3), ["p", "q", "r"]),
+                     lambda lst: lst.__delitem__(slice(0, 2)),
+                     lambda lst: lst.extend(["e", "f"]),
+                     lambda lst: lst.remove("e"),
+                     lambda lst: lst.sort(),
+                     lambda lst: lst.reverse(),
+                     lambda lst: lst.__setitem__(slice(None, None, 2), ["1", "2"])]:
+            edit(p.knows)
+            edit(expected)
+            assert p.knows == expected
+            assert self.reread(p) == expected
+        p.knows.clear()
+        assert self.reread(p) == []
+        # nothing is left behind
+        assert len(Person.db) == 3
+
+    def test_minimal_writes(self):
+        Person.db = ObservableGraph(ConjunctiveGraph())
+        events = []
+        Person.db.subscribe(lambda event, triple: events.append(event))
+        p = Person(last="Cooper")
+        p.knows = list(range(1000))
+        del events[:]
+        p.knows.append(1000)
+        # one cell (first, rest) and one link moved
+        assert len(events) == 4, events
+        del events[:]
+        p.knows = list(range(1001)) + [1001]
+        assert len(events) == 4, events
+        del events[:]
+        p.knows[500] = "x"
+        assert len(events) == 2, events
+        assert self.reread(p)[499:502] == [499, "x", 501]
+
+    def test_reads_on_observable_graph(self):
+        Person.db = ObservableGraph(ConjunctiveGraph())
+        p = Person(last="Cooper")
+        p.knows = list(range(100))
+        reads = []
+        list_items = store.list_items
+
+        def counting(*args):
+            reads.append(args)
+            return list_items(*args)
+        store.list_items = counting
+        try:
+            for i in range(100, 150):
+                p.knows.append(i)
+            # nothing changed the list in between, the chain is not read again
+            assert not reads
+            # a change behind the back of the proxy is seen
+            Person.db.set((p.knows._cells[-1], RDF.first, Literal("x")))
+            p.knows.append(150)
+            assert len(reads) == 1
+        finally:
+            store.list_items = list_items
+        assert self.reread(p) == list(range(149)) + ["x", 150]
+
+    def test_changed_in_the_store(self):
+        p = Person(last="Cooper")
+        p.knows = ["a", "b", "c"]
+        stale = p.knows
+        # the cells change behind the back of the cached proxy
+        other = Person(p.resUri)
+        Person.knows._drop_cache(other)
+        other.knows.insert(0, "z")
+        other.knows.pop()
+        stale.append("d")
+        assert stale == ["z", "a", "b", "d"]
+        assert self.reread(p) == ["z", "a", "b", "d"]
+        # no cell is left over
+        assert len(Person.db) == 3 + 2 * 4
+        stale[1:3] = ["x"]
+        assert self.reread(p) == ["z", "x", "d"]
+        assert len(Person.db) == 3 + 2 * 3
+
+    def test_bnode_members(self):
+        p = Person(last="Cooper")
+        ben, matt = Person(last="Ben"), Person(last="Matt")
+        p.knows = [ben, matt]
+        p.knows.reverse()
+        assert self.reread(p) == [matt, ben]
+        p.knows.pop()
+        # ben was only referenced from the list
+        assert not list(Person.db.triples((ben.resUri, None, None)))
+
+    def test_not_a_list(self):
+        p = Person(last="Cooper")
+        Person.db.add((p.resUri, FOAF.knows, BNode()))
+        self.assertRaises(AttributeError, lambda: p.knows)
+
+    def test_remote(self):
+        head, cell2 = BNode(), BNode()
+        # rows come back in any order
+        rows = [(head, cell2, Literal("b"), RDF.nil),
+                (head, head, Literal("a"), cell2)]
+        Person.db = db = RecordingGraph(rows)
+        p = Person(URIRef("urn:people:cooper"))
+        assert p.knows == ["a", "b"]
+        assert len(db.queries) == 1
+        assert "<urn:people:cooper> %s ?head" % FOAF.knows.n3() in db.queries[0]
+
+    def remote_edits(self, db, commit=lambda: None):
+        values = ["a", "b", "c", "d", "e"]
+        uris = [URIRef("urn:people:cooper"), URIRef("urn:people:smith")]
+        for uri in uris:
+            cells = [BNode() for _v in values]
+            db.graph.add((uri, RDF.type, Person.rdf_type))
+            db.graph.add((uri, FOAF.knows, cells[0]))
+            for cell, rest, value in zip(cells, cells[1:] + [RDF.nil], values):
+                db.graph.add((cell, RDF.first, Literal(value)))
+                db.graph.add((cell, RDF.rest, rest))
+        other = set(db.graph.triples((uris[1], None, None)))
+        p = Person(uris[0])
+        expected = list(values)
+        for edit in [lambda lst: lst.append("f"),
+                     lambda lst: lst.insert(2, "y"),
+                     lambda lst: lst.pop(),
+                     lambda lst: lst.pop(0),
+                     lambda lst: lst.pop(2),
+                     lambda lst: lst.__setitem__(1, "x"),
+                     lambda lst: lst.__setitem__(slice(3, 5), ["p", "q", "r"]),
+                     lambda lst: lst.reverse()]:
+            edit(p.knows)
+            edit(expected)
+            commit()
+            Person.knows._drop_cache(p)
+            assert p.knows == expected
+        # the other list is left alone, no cell is left over
+        assert set(db.graph.triples((uris[1], None, None))) == other
+        assert len(db.graph) == 2 * len(values) + 2 + 2 * len(expected) + 2
+
+    def test_remote_edits(self):
+        Person.db = db = EndpointGraph()
+        self.remote_edits(db)
+
+    def test_remote_edits_in_session(self):
+        db = EndpointGraph()
+        Person.db = session = Session(db)
+        self.remote_edits(db, session.commit)
+
+
+class ContainerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        self._db = Person.db
+        Person.db = ObservableGraph(ConjunctiveGraph())
+        Person.seq = rdfalchemy.rdfContainer(FOAF.seq)
+        self.events = []
+        Person.db.subscribe(lambda event, triple: self.events.append((event, triple)))
+
+    def tearDown(self):
+        del Person.seq
+        Person.db = self._db
+        self._logger.removeHandler(self._stream_handler)
+
+    def reread(self, p):
+        Person.seq._drop_cache(p)
+        return p.seq
+
+    def test_order(self):
+        p = Person(last="Cooper")
+        p.seq = list(range(20000))
+        # _10 sorts after _9
+        assert self.reread(p) == list(range(20000))
+        assert get_list(p, FOAF.seq)[:11] == [Literal(i) for i in range(11)]
+
+    def test_diff_writes(self):
+        p = Person(last="Cooper")
+        p.seq = list(range(100))
+        del self.events[:]
+        p.seq = list(range(50)) + ["x"] + list(range(51, 100))
+        assert [event for event, _triple in self.events] == ['remove', 'add']
+        del self.events[:]
+        p.seq = list(range(98))
+        assert len(self.events) == 4
+        assert self.reread(p) == list(range(98))
+
+    def test_bnode_members(self):
+        p = Person(last="Cooper")
+        ben, matt = Person(last="Ben"), Person(last="Matt")
+        p.seq = [ben, matt]
+        p.seq = [matt]
+        assert self.reread(p) == [matt]
+        assert not list(Person.db.triples((ben.resUri, None, None)))
+        assert list(Person.db.triples((matt.resUri, None, None)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,8 @@ from rdfalchemy.descriptors import rdfLocale
 from rdfalchemy.samples.doap import Project
 from rdfalchemy.namespaces import DOAP
 
+from recording import RecordingGraph
+
 
 class TestLocale(unittest.TestCase):
     def setUp(self):
@@ -27,9 +29,37 @@ class TestLocale(unittest.TestCase):
     def tearDown(self):
         self._logger.removeHandler(self._stream_handler)
 
-    @unittest.skip
     def test_en_es(self):
         p = Project(DOAP.SVNRepository)
         assert p.len == 'Subversion Repository', p.len
         assert p.les == 'Repositorio Subversion', p.les
         assert p.lfr == 'D\xe9p\xf4t Subversion', p.lfr
+
+    def test_shared_fetch(self):
+        p = Project(DOAP.SVNRepository)
+        p.len
+        # every rdfLocale over rdfs:label reads the same table
+        assert Project.les._get_cache(p) is Project.len._get_cache(p)
+        p.lfr = 'Dépôt'
+        assert p.lfr == 'Dépôt'
+        assert p.len == 'Subversion Repository'
+        del p.lfr
+        assert p.len == 'Subversion Repository'
+
+    def test_prefetch(self):
+        projects = [Project(DOAP.SVNRepository), Project(DOAP.CVSRepository)]
+        Project.les._prefetch(projects)
+        assert projects[0].les == 'Repositorio Subversion'
+
+    def test_remote_prefetch(self):
+        p = Project(DOAP.SVNRepository)
+        Project.les._drop_cache(p)
+        p.db = RecordingGraph([(p.resUri, rdfalchemy.Literal('Repositorio', lang='es'))])
+        try:
+            Project.les._prefetch([p])
+            assert len(p.db.queries) == 1
+            assert 'FILTER(lang(?o) = "es")' in p.db.queries[0]
+            assert p.les == 'Repositorio'
+        finally:
+            del p.db
+            Project.les._drop_cache(p)
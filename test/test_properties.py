@@ -0,0 +1,68 @@
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph, Namespace, RDF, RDFS
+
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.namespaces import OWL
+from rdfalchemy.rdfs_subject import rdfsClass, rdfsProperty, owlObjectProperty
+
+from recording import RecordingGraph
+
+NS = Namespace('http://example.com/schema/')
+
+
+class PropertiesTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        self.saved = rdfsClass.db, rdfsProperty.db
+        db = ObservableGraph(ConjunctiveGraph())
+        rdfsClass.db = rdfsProperty.db = db
+        db.add((NS.Dog, RDFS.subClassOf, NS.Animal))
+        db.add((NS.name, RDF.type, RDF.Property))
+        db.add((NS.name, RDFS.domain, NS.Animal))
+        db.add((NS.owner, RDF.type, OWL.ObjectProperty))
+        db.add((NS.owner, RDFS.domain, NS.Dog))
+        db.add((NS.breed, RDFS.domain, NS.Dog))
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        rdfsClass.db, rdfsProperty.db = self.saved
+
+    def test_properties(self):
+        props = rdfsClass(NS.Dog).properties
+        assert sorted(p.resUri for p in props) == [NS.breed, NS.owner]
+        assert [type(p) for p in props if p.resUri == NS.owner] == [owlObjectProperty]
+        # no rdf:type added to breed
+        assert (NS.breed, RDF.type, RDF.Property) not in rdfsClass.db
+
+    def test_inherited(self):
+        props = rdfsClass(NS.Dog).get_properties(inherited=True)
+        assert sorted(p.resUri for p in props) == [NS.breed, NS.name, NS.owner]
+
+    def test_follows_changes(self):
+        dog = rdfsClass(NS.Dog)
+        assert len(dog.properties) == 2
+        rdfsClass.db.remove((NS.breed, RDFS.domain, NS.Dog))
+        assert len(dog.properties) == 1
+        rdfsClass.db.add((NS.age, RDFS.domain, NS.Dog))
+        assert sorted(p.resUri for p in dog.properties) == [NS.age, NS.owner]
+
+    def test_plain_graph(self):
+        rdfsClass.db = rdfsProperty.db = ConjunctiveGraph()
+        rdfsClass.db.add((NS.size, RDFS.domain, NS.Dog))
+        assert [p.resUri for p in rdfsClass(NS.Dog).properties] == [NS.size]
+        rdfsClass.db.add((NS.color, RDFS.domain, NS.Dog))
+        assert len(rdfsClass(NS.Dog).properties) == 2
+
+    def test_remote(self):
+        rdfsClass.db = rdfsProperty.db = db = RecordingGraph([(NS.owner, NS.Dog)])
+        props = rdfsClass(NS.Dog).properties
+        assert [p.resUri for p in props] == [NS.owner]
+        # the properties of the class only, not every rdfs:domain triple
+        assert "VALUES ?o { %s }" % NS.Dog.n3() in db.queries[0]
+        assert "?s %s ?o" % RDFS.domain.n3() in db.queries[0]
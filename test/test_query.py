@@ -0,0 +1,55 @@
+import logging
+import sys
+import unittest
+
+from rdflib import ConjunctiveGraph
+
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.query import Query, compile_select
+from rdfalchemy.samples.foaf import Person
+
+
+class QueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Person.db = ConjunctiveGraph()
+        for i in range(20):
+            Person(last="Cooper" if i % 2 else "Smith", first="P%02d" % i)
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+
+    def test_count_exists(self):
+        assert Person.count() == 20
+        assert Person.count(last="Cooper") == 10
+        assert Person.exists(last="Smith")
+        assert not Person.exists(last="Jones")
+        assert Person.query.filter_by(last="Cooper").limit(3).count() == 3
+
+    def test_paging(self):
+        query = Person.query.order_by('first')
+        assert isinstance(query, Query)
+        assert [p.first for p in query.limit(3)] == ["P00", "P01", "P02"]
+        assert [p.first for p in query.offset(18)] == ["P18", "P19"]
+        assert [p.first for p in query[5:7]] == ["P05", "P06"]
+        assert query[19].first == "P19"
+        assert [p.first for p in query.order_by(Person.first, reverse=True).limit(2)] == ["P19", "P18"]
+
+    def test_chained_filters(self):
+        query = Person.query.filter_by(last="Cooper").order_by('first')
+        assert query.first().first == "P01"
+        assert len(query.all()) == 10
+        assert Person.query().get_by(first="P03").last == "Cooper"
+
+    def test_get_random(self):
+        assert isinstance(Person.GetRandom(), Person)
+
+    def test_compile(self):
+        query = compile_select([(FOAF.surname, None)], limit=10, offset=20,
+                               order=(FOAF.firstName, True))
+        assert query == (
+            "SELECT DISTINCT ?s WHERE { ?s %s ?o0 . OPTIONAL { ?s %s ?sort } } "
+            "ORDER BY DESC(?sort) LIMIT 10 OFFSET 20" % (FOAF.surname.n3(), FOAF.firstName.n3()))
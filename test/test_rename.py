@@ -0,0 +1,105 @@
+import logging
+import sys
+import unittest
+
+from rdflib import BNode, ConjunctiveGraph, URIRef
+
+from rdfalchemy import Literal
+from rdfalchemy.events import ObservableGraph
+from rdfalchemy.exceptions import RDFAlchemyError
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.samples.foaf import Person
+from rdfalchemy.session import Session
+
+from recording import EndpointGraph, RecordingGraph
+
+
+class RenameTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Person.db = ConjunctiveGraph()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+
+    def test_bulk_rename(self):
+        people = [Person(URIRef("urn:old:%d" % i), last="Cooper%d" % i) for i in range(5)]
+        for p, q in zip(people, people[1:]):
+            Person.db.add((p.resUri, FOAF.knows, q.resUri))
+        Person.db.add((URIRef("urn:other"), FOAF.knows, people[0].resUri))
+        mapping = {p.resUri: URIRef("urn:new:%d" % i) for i, p in enumerate(people)}
+        steps = []
+        Person.bulk_rename(mapping, chunk_size=2, progress=lambda done, total: steps.append((done, total)))
+        assert steps == [(2, 5), (4, 5), (5, 5)]
+        assert not list(Person.db.triples((None, None, URIRef("urn:old:0"))))
+        assert (URIRef("urn:new:0"), FOAF.knows, URIRef("urn:new:1")) in Person.db
+        assert (URIRef("urn:other"), FOAF.knows, URIRef("urn:new:0")) in Person.db
+        # live instances follow
+        assert people[3].resUri == URIRef("urn:new:3")
+        assert Person(URIRef("urn:new:3")) is people[3]
+        assert people[3].last == "Cooper3"
+
+    def test_rename_keeps_other_objects(self):
+        p = Person(URIRef("urn:old"), last="Cooper")
+        other = Person(URIRef("urn:other"))
+        Person.db.add((other.resUri, FOAF.knows, p.resUri))
+        Person.db.add((other.resUri, FOAF.knows, URIRef("urn:third")))
+        p._rename(URIRef("urn:new"))
+        assert set(Person.db.objects(other.resUri, FOAF.knows)) == {
+            URIRef("urn:new"), URIRef("urn:third")}
+        assert Person.db.value(URIRef("urn:new"), FOAF.surname) == Literal("Cooper")
+
+    def test_remote(self):
+        db = RecordingGraph()
+        mapping = {URIRef("urn:old:%d" % i): URIRef("urn:new:%d" % i) for i in range(3)}
+        Person.bulk_rename(mapping, db=db, chunk_size=2)
+        assert len(db.updates) == 2
+        assert "VALUES (?old ?new) { (<urn:old:0> <urn:new:0>) (<urn:old:1> <urn:new:1>) }" in db.updates[0]
+
+    def test_swap(self):
+        a, b, c = URIRef("urn:a"), URIRef("urn:b"), URIRef("urn:c")
+        pa, pb = Person(a, last="A"), Person(b, last="B")
+        Person.db.add((a, FOAF.knows, b))
+        # the pairs of the swap end up in one chunk
+        steps = []
+        Person.bulk_rename({a: b, c: URIRef("urn:d"), b: a}, chunk_size=1,
+                           progress=lambda done, total: steps.append(done))
+        assert steps == [2, 3]
+        assert Person.db.value(a, FOAF.surname) == Literal("B")
+        assert Person.db.value(b, FOAF.surname) == Literal("A")
+        assert set(Person.db.triples((None, FOAF.knows, None))) == {(b, FOAF.knows, a)}
+        assert (pa.resUri, pb.resUri) == (b, a)
+        assert Person(a) is pb
+
+    def test_remote_swap(self):
+        a, b = URIRef("urn:a"), URIRef("urn:b")
+        db = EndpointGraph()
+        db.graph.add((a, FOAF.surname, Literal("A")))
+        db.graph.add((b, FOAF.surname, Literal("B")))
+        db.graph.add((a, FOAF.knows, b))
+        Person.bulk_rename({a: b, b: a}, db=db, chunk_size=1)
+        assert len(db.updates) == 1
+        assert set(db.graph) == {(b, FOAF.surname, Literal("A")), (a, FOAF.surname, Literal("B")),
+                                 (b, FOAF.knows, a)}
+
+    def test_remote_bnode(self):
+        db = RecordingGraph()
+        for mapping in ({BNode(): URIRef("urn:new")}, {URIRef("urn:old"): BNode()}):
+            with self.assertRaises(RDFAlchemyError):
+                Person.bulk_rename(mapping, db=db)
+        assert not db.updates
+
+    def test_remote_wrapped(self):
+        db = RecordingGraph()
+        for wrapper in (ObservableGraph(db), Session(db)):
+            del db.updates[:]
+            Person.bulk_rename({URIRef("urn:old"): URIRef("urn:new")}, db=wrapper)
+            assert len(db.updates) == 1
+            assert "VALUES (?old ?new)" in db.updates[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
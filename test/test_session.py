@@ -0,0 +1,153 @@
+import logging
+import sys
+import unittest
+
+from rdflib import BNode, ConjunctiveGraph
+
+from rdfalchemy import Literal, RDF, URIRef
+from rdfalchemy.namespaces import FOAF
+from rdfalchemy.samples.foaf import Person
+from rdfalchemy.session import Session
+from rdfalchemy.sparql.sesame2 import SesameGraph
+
+from rdfalchemy.exceptions import RDFAlchemyError
+
+from recording import EndpointGraph, RecordingGraph
+
+
+class CountingGraph(ConjunctiveGraph):
+    """
+    ConjunctiveGraph counting the calls that write to it
+    """
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def add(self, triple):
+        self.writes += 1
+        return super().add(triple)
+
+    def addN(self, quads):
+        self.writes += 1
+        return super().addN(quads)
+
+    def remove(self, triple):
+        self.writes += 1
+        return super().remove(triple)
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        self.graph = CountingGraph()
+        Person.db = self.graph
+        self.people = [Person(last="Cooper%d" % i) for i in range(10)]
+        self.graph.writes = 0
+        self.session = Session(self.graph)
+        self.session.bind(Person)
+
+    def tearDown(self):
+        self.session.close()
+        self._logger.removeHandler(self._stream_handler)
+
+    def test_flush_batches_writes(self):
+        for p in Person.ClassInstances():
+            p.first = "Ben"
+            p.first = "Matt"
+        assert self.graph.writes == 0
+        assert self.session.pending
+        # reads see the pending values
+        assert set(self.session.objects(None, FOAF.firstName)) == {Literal("Matt")}
+        self.session.flush()
+        # ten (s, p, None) removes and one addN
+        assert self.graph.writes == 11, self.graph.writes
+        assert set(self.graph.objects(None, FOAF.firstName)) == {Literal("Matt")}
+        assert len(list(self.graph.triples((None, FOAF.firstName, None)))) == 10
+
+    def test_rollback(self):
+        p = self.session.get(Person, self.people[0].resUri)
+        p.last = "Smith"
+        assert p in self.session.dirty
+        self.session.rollback()
+        assert not self.session.pending
+        assert p.last == "Cooper0"
+
+    def test_instances_made_before_bind(self):
+        # made on the graph, writing through the session once bound
+        p = self.people[0]
+        assert p.last == "Cooper0"
+        p.last = "Smith"
+        assert p in self.session.dirty
+        self.session.rollback()
+        assert p.last == "Cooper0"
+
+    def test_class_instances_tracked(self):
+        found = list(Person.ClassInstances())
+        for p in found:
+            p.first = "Ben"
+        assert self.session.dirty >= set(found)
+
+    def test_remote_bnode_removes(self):
+        db = RecordingGraph()
+        session = Session(db)
+        cell = BNode()
+        session.remove((URIRef('urn:a'), FOAF.knows, cell))
+        session.remove((cell, RDF.first, Literal('Ben')))
+        session.remove((URIRef('urn:a'), FOAF.surname, Literal('Cooper')))
+        session.flush()
+        assert len(db.updates) == 1
+        update = db.updates[0]
+        assert ("DELETE { <urn:a> %s ?b0 . ?b0 %s \"Ben\" . } WHERE { <urn:a> %s ?b0 . }" % (
+            FOAF.knows.n3(), RDF.first.n3(), FOAF.knows.n3())) in update
+        assert "DELETE DATA { <urn:a> %s \"Cooper\" . }" % FOAF.surname.n3() in update
+        assert "_:" not in update
+
+    def test_remote_bnode_removes_keep_other_subjects(self):
+        db = EndpointGraph()
+        x = URIRef('urn:x')
+        for name in ('alice', 'bob'):
+            db.graph.add((URIRef('urn:' + name), FOAF.knows, x))
+        alice, cell = URIRef('urn:alice'), BNode()
+        db.graph.add((alice, FOAF.member, cell))
+        db.graph.add((cell, FOAF.knows, x))
+        session = Session(db)
+        session.remove((alice, FOAF.member, cell))
+        session.remove((cell, FOAF.knows, x))
+        session.flush()
+        assert set(db.graph) == {(alice, FOAF.knows, x), (URIRef('urn:bob'), FOAF.knows, x)}
+
+    def test_remote_bnode_removes_refused_without_anchor(self):
+        db = EndpointGraph()
+        db.graph.add((URIRef('urn:alice'), FOAF.knows, URIRef('urn:x')))
+        session = Session(db)
+        session.remove((BNode(), FOAF.knows, URIRef('urn:x')))
+        self.assertRaises(RDFAlchemyError, session.flush)
+        assert not db.updates
+        assert len(db.graph) == 1
+
+    def test_identity_map(self):
+        uri = self.people[0].resUri
+        assert self.session.get(Person, uri) is self.session.get(Person, uri)
+
+    def test_context_manager(self):
+        with Session(self.graph) as session:
+            p = session.add_instance(Person(self.people[0].resUri))
+            p.last = "Smith"
+            assert self.graph.value(p.resUri, FOAF.surname) == Literal("Cooper0")
+        assert self.graph.value(p.resUri, FOAF.surname) == Literal("Smith")
+
+
+class TransactionTest(unittest.TestCase):
+
+    def test_transaction_document(self):
+        g = SesameGraph('http://example.com/repositories/test')
+        doc = g._transaction(
+            removes=[(URIRef('urn:a'), FOAF.surname, None)],
+            adds=[(URIRef('urn:a'), FOAF.surname, Literal('<Cooper>', lang='en')),
+                  (URIRef('urn:a'), RDF.type, FOAF.Person)])
+        assert "<remove><uri>urn:a</uri><uri>%s</uri><null/></remove>" % FOAF.surname in doc
+        assert '<literal xml:lang="en">&lt;Cooper&gt;</literal>' in doc
+        assert doc.count("<add>") == 2
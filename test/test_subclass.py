@@ -5,13 +5,20 @@ subclass.py
 Created by Philip Cooper on 2008-05-14.
 Copyright (c) 2008 Openvest. All rights reserved.
 """
+import gc
 import logging
 import sys
 import unittest
+import weakref
 
+import rdfalchemy
 from rdfalchemy.rdf_subject import rdfSubject
-from rdflib import Namespace
+from rdflib import ConjunctiveGraph, Namespace, RDF, RDFS
+from rdfalchemy.orm import mapper
 from rdfalchemy.rdfs_subject import rdfsSubject
+from rdfalchemy.registry import type_registry
+
+from recording import RecordingGraph
 
 NS = Namespace('http://example.com/project123/')
 
@@ -107,3 +114,157 @@ class SubclassInferenceTest(unittest.TestCase):
         assert len(list(Bs.ClassInstances())) == 6, len(list(Bs.ClassInstances()))
         assert len(list(Cs.ClassInstances())) == 4, len(list(Cs.ClassInstances()))
         assert len(list(Ds.ClassInstances())) == 3, len(list(Ds.ClassInstances()))
+
+
+class RegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        rdfsSubject.db = ConjunctiveGraph()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        del rdfsSubject.db
+
+    def _typed(self, name, *types):
+        node = NS[name]
+        for t in types:
+            rdfsSubject.db.add((node, RDF.type, t))
+        return node
+
+    def test_registered(self):
+        assert Cs in type_registry.classes_for(NS.Cs)
+        assert type_registry.resolve(Bs, [NS.Ds]) is Ds
+        assert type_registry.resolve(Cs, [NS.As]) is Cs
+
+    def test_dispatch(self):
+        assert type(Bs(self._typed('r1', NS.Cs))) is Cs
+
+    def test_multiple_types(self):
+        assert type(Bs(self._typed('r2', NS.Bs, NS.Ds, NS.Cs))) is Ds
+        # unrelated classes: the smallest type IRI, whatever the order
+        assert type(rdfsSubject(self._typed('r3', NS.Bs, NS.As))) is As
+        assert type(rdfsSubject(self._typed('r4', NS.As, NS.Bs))) is As
+
+    def test_known_types(self):
+        before = len(rdfsSubject.db)
+        obj = rdfsSubject(NS.r5, rdf_types=[NS.Cs])
+        assert type(obj) is Cs
+        assert len(rdfsSubject.db) == before
+
+    def test_mapper_picks_up_rdf_type(self):
+        class Late(rdfsSubject):
+            pass
+        Late.rdf_type = NS.Late
+        assert type_registry.resolve(rdfsSubject, [NS.Late]) is rdfsSubject
+        mapper(Late)
+        assert type_registry.resolve(rdfsSubject, [NS.Late]) is Late
+
+    def test_class_freed(self):
+        class Temp(rdfsSubject):
+            rdf_type = NS.Temp
+
+        class TempBase(rdfsSubject):
+            pass
+        assert type_registry.resolve(rdfsSubject, [NS.Temp]) is Temp
+        assert type_registry.resolve(TempBase, [NS.Temp]) is TempBase
+        refs = [weakref.ref(Temp), weakref.ref(TempBase)]
+        del Temp, TempBase
+        gc.collect()
+        # the resolved classes are not kept alive
+        assert [ref() for ref in refs] == [None, None]
+        assert type_registry.resolve(rdfsSubject, [NS.Temp]) is rdfsSubject
+
+    def test_wrap_many(self):
+        nodes = [self._typed('w%d' % i, [NS.Bs, NS.Cs, NS.Ds][i % 3]) for i in range(99)]
+        objs = Bs.wrap_many(nodes)
+        assert [type(o) for o in objs[:3]] == [Bs, Cs, Ds]
+        assert [o.resUri for o in objs] == nodes
+        assert objs[5] is Bs(nodes[5])
+
+    def test_wrap_many_remote(self):
+        nodes = [NS.remote1, NS.remote2]
+        Bs.db = db = RecordingGraph([(nodes[0], NS.Cs), (nodes[1], NS.Ds)])
+        try:
+            objs = Bs.wrap_many(nodes)
+        finally:
+            del Bs.db
+        assert [type(o) for o in objs] == [Cs, Ds]
+        assert len(db.queries) == 1
+        assert "VALUES ?s" in db.queries[0]
+
+
+class ClassInstancesTest(unittest.TestCase):
+
+    def setUp(self):
+        self._stream_handler = logging.StreamHandler(sys.stdout)
+        self._logger = logging.getLogger()
+        self._logger.addHandler(self._stream_handler)
+        Bs.db = ConjunctiveGraph()
+
+    def tearDown(self):
+        self._logger.removeHandler(self._stream_handler)
+        del Bs.db
+
+    def test_db_subclass(self):
+        # a subclass known to the db only
+        Bs.db.add((NS.Es, RDFS.subClassOf, NS.Cs))
+        Bs.db.add((NS.e1, RDF.type, NS.Es))
+        Bs(), Cs(), Ds()
+        found = list(Bs.ClassInstances())
+        assert len(found) == 4
+        assert NS.e1 in [o.resUri for o in found]
+        assert sorted(type(o).__name__ for o in found) == ['Bs', 'Bs', 'Cs', 'Ds']
+
+    def test_each_once(self):
+        for i in range(100):
+            for t in [NS.Bs, NS.Cs, NS.Ds][:i % 3 + 1]:
+                Bs.db.add((NS['m%d' % i], RDF.type, t))
+        found = list(Bs.ClassInstances())
+        assert len(found) == 100
+        assert len(list(Cs.ClassInstances())) == 66
+        assert all(type(o) is Ds for o in Ds.ClassInstances())
+
+    def test_load(self):
+        Bs.label = rdfalchemy.rdfSingle(RDFS.label)
+        Cs(label="c")
+        found = list(Bs.ClassInstances(load=['label']))
+        assert RDFS.label in found[0].__dict__
+
+    def test_count(self):
+        Bs.label = rdfalchemy.rdfSingle(RDFS.label)
+        Bs(label="b")
+        c, d = Cs(label="c"), Ds(label="c")
+        Bs.db.add((NS.Es, RDFS.subClassOf, NS.Cs))
+        Bs.db.add((NS.e1, RDF.type, NS.Es))
+        assert Bs.count() == len(list(Bs.ClassInstances())) == 4
+        assert Bs.count(label="c") == 2
+        assert Cs.query.filter_by(label="b").count() == 0
+        assert Ds.exists() and not Ds.exists(label="b")
+        assert {type(o) for o in Bs.query} == {Bs, Cs, Ds}
+        found = {Cs.GetRandom().resUri for _i in range(50)}
+        assert found == {c.resUri, d.resUri, NS.e1}
+
+    def test_count_remote(self):
+        Bs.db = db = RecordingGraph([(2,)])
+        assert Bs.count() == 2
+        assert "COUNT(DISTINCT ?s)" in db.queries[0]
+        assert "VALUES ?root { %s %s %s }" % (NS.Bs.n3(), NS.Cs.n3(), NS.Ds.n3()) in db.queries[0]
+        assert "?t %s* ?root" % RDFS.subClassOf.n3() in db.queries[0]
+
+    def test_remote(self):
+        class TypedGraph(RecordingGraph):
+            def query(self, str_or_query, *args, **kwargs):
+                super().query(str_or_query)
+                if str_or_query.startswith("SELECT DISTINCT"):
+                    return iter([(NS.x1,), (NS.x2,)])
+                return iter([(NS.x1, NS.Bs), (NS.x2, NS.Ds)])
+        Bs.db = db = TypedGraph([])
+        found = list(Bs.ClassInstances())
+        assert [type(o) for o in found] == [Bs, Ds]
+        # the instances, then their types
+        assert len(db.queries) == 2
+        assert "VALUES ?root { %s %s %s }" % (NS.Bs.n3(), NS.Cs.n3(), NS.Ds.n3()) in db.queries[0]
+        assert "?t %s* ?root" % RDFS.subClassOf.n3() in db.queries[0]